@@ -0,0 +1,101 @@
+# Account number allocators.
+# Every allocator hands out `width` digit numbers plus one Luhn check digit,
+# so a mistyped account number can be rejected before any lookup.
+# Allocation is O(1): a counter is turned into the number, so there is no
+# retry loop that slows down (or spins forever) as the number space fills.
+
+import secrets
+
+
+class AllocatorExhausted(Exception):
+    pass
+
+
+# digit -> digit doubled with its two digits summed (7 -> 14 -> 5)
+_DOUBLED = str.maketrans('0123456789', '0246813579')
+
+
+def luhn_check_digit(digits):
+    # the check digit is appended on the right, so doubling starts at the
+    # rightmost digit of the body
+    reversed_digits = digits[::-1]
+    total = sum(map(int, reversed_digits[0::2].translate(_DOUBLED))) + sum(map(int, reversed_digits[1::2]))
+    return str(-total % 10)
+
+
+def luhn_valid(number):
+    return len(number) > 1 and number.isdigit() and luhn_check_digit(number[:-1]) == number[-1]
+
+
+class SequentialAllocator:
+    def __init__(self, width=6, start=0):
+        if width < 1:
+            raise ValueError("width must be at least 1")
+        self.width = width
+        self.capacity = 10 ** width
+        self.counter = start
+
+    def allocate(self):
+        if self.counter >= self.capacity:
+            raise AllocatorExhausted(f"All {self.capacity} account numbers are in use")
+        body = str(self.map(self.counter)).zfill(self.width)
+        self.counter += 1
+        return body + luhn_check_digit(body)
+
+    def map(self, n):
+        return n
+
+    def validate(self, account_number):
+        return len(account_number) == self.width + 1 and luhn_valid(account_number)
+
+
+class PermutedAllocator(SequentialAllocator):
+    # Same counter, pushed through a keyed Feistel permutation of
+    # [0, 10**width) so consecutive accounts don't get consecutive numbers.
+    rounds = 4
+
+    def __init__(self, width=6, start=0, key=None):
+        super().__init__(width, start)
+        if key is None:
+            key = secrets.randbits(63)
+        self.key = key
+        bits = (self.capacity - 1).bit_length()
+        self._half = (bits + 1) // 2
+        self._mask = (1 << self._half) - 1
+        self._round_keys = [(key >> (16 * i)) & 0xFFFFFFFF | (i << 32) for i in range(self.rounds)]
+
+    def _round(self, right, round_key):
+        x = (right ^ round_key) * 0x45D9F3B & 0xFFFFFFFF
+        x ^= x >> 16
+        x = x * 0x45D9F3B & 0xFFFFFFFF
+        x ^= x >> 16
+        return x & self._mask
+
+    def _permute(self, n):
+        left, right = n >> self._half, n & self._mask
+        for round_key in self._round_keys:
+            left, right = right, left ^ self._round(right, round_key)
+        return (left << self._half) | right
+
+    def map(self, n):
+        # cycle-walk: the Feistel network works on a power-of-two domain, so
+        # keep applying it until the result falls inside [0, 10**width).
+        # On average this takes less than 4 steps.
+        n = self._permute(n)
+        while n >= self.capacity:
+            n = self._permute(n)
+        return n
+
+
+ALLOCATORS = {
+    'sequential': SequentialAllocator,
+    'permuted': PermutedAllocator,
+}
+
+
+def make_allocator(kind='permuted', **options):
+    try:
+        allocator_class = ALLOCATORS[kind]
+    except KeyError:
+        raise ValueError(f"Unknown allocator: {kind}") from None
+    return allocator_class(**options)
@@ -0,0 +1,283 @@
+# Append-only receipt archive.
+# Rendered receipts are appended to segment files instead of being saved
+# one PNG per file, and an offset index maps (account number, transaction
+# id) to where each receipt's bytes are. A lookup is one dict access and a
+# slice of the segment's mmap, so get() costs the same with ten receipts
+# or ten million and hands back a memoryview without copying the PNG.
+# The transaction id is the receipt's index in the account's history, so
+# two receipts never share a key the way two same-second file names did.
+#
+# Once the active segment reaches segment_size a new one is started.
+# compact() applies the retention policy: receipts older than
+# retention_days are dropped, segments with nothing left in them are
+# deleted, and sealed segments that are mostly dead space (old copies of
+# re-archived receipts, expired receipts) have their live receipts copied
+# forward before they are deleted. The index is then rewritten.
+#
+# Receipts can always be rendered again from the transaction history, so
+# the archive doesn't fsync; a torn record at the end of the last segment
+# (crash mid-write) is cut off when the archive is opened, and receipts
+# that made it into the segment but not the index are indexed again.
+#
+# Files (little endian):
+#   NNNNNNNN.seg  SEGMENT_MAGIC, then records: RECORD header, PNG bytes
+#   index         INDEX_MAGIC, then one INDEX_ENTRY per archived receipt;
+#                 a later entry for the same key replaces an earlier one.
+#                 An entry with an empty account number is a mark instead:
+#                 its segment was scanned up to its offset, and records
+#                 before that which the index doesn't list (receipts that
+#                 compact() expired) must not be indexed again on open
+#
+# Run: python archive.py [directory] [--compact] [--retention-days N]
+
+import argparse
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+ARCHIVE_DIR = "./data/receipts"
+SEGMENT_SIZE = 64 << 20
+MIN_LIVE = 0.5  # sealed segments with less live data than this are rewritten
+SEGMENT_MAGIC = b'ATMRSEG\x01'
+INDEX_MAGIC = b'ATMRIDX\x01'
+# data length, crc32 of data, timestamp ns, account number, transaction id
+RECORD = struct.Struct('<IIq16sQ')
+# account number, transaction id, segment, data offset, data length, timestamp ns
+INDEX_ENTRY = struct.Struct('<16sQIQIq')
+DAY_NS = 86_400 * 1_000_000_000
+
+
+def _segment_name(number):
+    return f"{number:08d}.seg"
+
+
+class ReceiptArchive:
+    def __init__(self, directory=ARCHIVE_DIR, segment_size=SEGMENT_SIZE, retention_days=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_size = segment_size
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._entries = {}  # (account number, transaction id) -> (segment, offset, length, timestamp ns)
+        self._maps = {}     # segment -> (mmap, mapped size)
+        self._scanned = {}  # segment -> offset its records are accounted for up to
+        self._index = self._load_index()
+        segments = sorted(int(name[:-4]) for name in os.listdir(directory) if name.endswith('.seg'))
+        self._active = segments[-1] if segments else 0
+        self._file = self._open_segment(self._active)
+        self._recover()
+
+    def _load_index(self):
+        path = os.path.join(self.directory, 'index')
+        index = open(path, 'a+b')
+        size = index.seek(0, os.SEEK_END)
+        if size == 0:
+            index.write(INDEX_MAGIC)
+            index.flush()
+            return index
+        index.seek(0)
+        if index.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+            index.close()
+            raise ValueError(f"{path} is not a receipt archive index")
+        data = index.read()
+        count = len(data) // INDEX_ENTRY.size
+        for account, transaction_id, segment, offset, length, timestamp_ns in INDEX_ENTRY.iter_unpack(
+                data[:count * INDEX_ENTRY.size]):
+            if not account.rstrip(b'\0'):
+                self._scanned[segment] = max(self._scanned.get(segment, 0), offset)
+                continue
+            self._entries[account.rstrip(b'\0').decode('ascii'), transaction_id] = (
+                segment, offset, length, timestamp_ns)
+        # drop a partly written entry
+        index.truncate(len(INDEX_MAGIC) + count * INDEX_ENTRY.size)
+        index.seek(0, os.SEEK_END)
+        return index
+
+    def _open_segment(self, number):
+        path = os.path.join(self.directory, _segment_name(number))
+        segment = open(path, 'a+b')
+        if segment.seek(0, os.SEEK_END) == 0:
+            segment.write(SEGMENT_MAGIC)
+            segment.flush()
+        return segment
+
+    def _recover(self):
+        # index the records written to the active segment after its last
+        # indexed one, and cut off a torn record at its end
+        end = max(len(SEGMENT_MAGIC), self._scanned.get(self._active, 0))
+        for segment, offset, length, _ in self._entries.values():
+            if segment == self._active:
+                end = max(end, offset + length)
+        size = self._file.seek(0, os.SEEK_END)
+        self._file.seek(end)
+        while end + RECORD.size <= size:
+            length, crc, timestamp_ns, account, transaction_id = RECORD.unpack(self._file.read(RECORD.size))
+            data = self._file.read(length)
+            if len(data) < length or zlib.crc32(data) != crc:
+                break
+            end += RECORD.size + length
+            self._index_entry(account.rstrip(b'\0').decode('ascii'), transaction_id,
+                              self._active, end - length, length, timestamp_ns)
+        if end < size:
+            self._file.truncate(end)
+        self._file.seek(0, os.SEEK_END)
+        self._index.flush()
+
+    def _index_entry(self, account_number, transaction_id, segment, offset, length, timestamp_ns):
+        self._entries[account_number, transaction_id] = (segment, offset, length, timestamp_ns)
+        self._index.write(INDEX_ENTRY.pack(account_number.encode('ascii'), transaction_id,
+                                           segment, offset, length, timestamp_ns))
+
+    def _append(self, account_number, transaction_id, data, timestamp_ns):
+        # writes one record to the active segment and returns its index
+        # entry; caller holds self._lock
+        offset = self._file.tell()
+        if offset > len(SEGMENT_MAGIC) and offset + RECORD.size + len(data) > self.segment_size:
+            self._rotate()
+            offset = self._file.tell()
+        self._file.write(RECORD.pack(len(data), zlib.crc32(data), timestamp_ns,
+                                     account_number.encode('ascii'), transaction_id))
+        self._file.write(data)
+        return self._active, offset + RECORD.size, len(data), timestamp_ns
+
+    def _rotate(self):
+        self._file.close()
+        self._active += 1
+        self._file = self._open_segment(self._active)
+
+    def put(self, account_number, transaction_id, data, timestamp_ns=None):
+        # archives a receipt; putting the same key again replaces it
+        if timestamp_ns is None:
+            timestamp_ns = time.time_ns()
+        with self._lock:
+            self._index_entry(account_number, transaction_id,
+                              *self._append(account_number, transaction_id, data, timestamp_ns))
+            self._file.flush()
+            self._index.flush()
+
+    def _map(self, segment, end):
+        # mapping of a segment covering at least `end` bytes; segments are
+        # only ever appended to, so an old mapping stays valid for old views
+        mm, mapped = self._maps.get(segment, (None, 0))
+        if mapped < end:
+            path = os.path.join(self.directory, _segment_name(segment))
+            with open(path, 'rb') as f:
+                mapped = os.fstat(f.fileno()).st_size
+                mm = mmap.mmap(f.fileno(), mapped, access=mmap.ACCESS_READ)
+            self._maps[segment] = (mm, mapped)
+        return mm
+
+    def get(self, account_number, transaction_id, timestamp_ns=None):
+        # the receipt's PNG bytes as a read-only memoryview, or None; with
+        # timestamp_ns, also None if the receipt archived under this key was
+        # for a different transaction
+        with self._lock:
+            entry = self._entries.get((account_number, transaction_id))
+            if entry is None or timestamp_ns is not None and entry[3] != timestamp_ns:
+                return None
+            segment, offset, length, _ = entry
+            if segment == self._active:
+                self._file.flush()
+            return memoryview(self._map(segment, offset + length))[offset:offset + length]
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def segments(self):
+        return sorted(int(name[:-4]) for name in os.listdir(self.directory) if name.endswith('.seg'))
+
+    def compact(self, now_ns=None):
+        # applies the retention policy; returns (receipts dropped,
+        # segments deleted, bytes reclaimed)
+        now_ns = time.time_ns() if now_ns is None else now_ns
+        with self._lock:
+            dropped = 0
+            if self.retention_days is not None:
+                cutoff = now_ns - self.retention_days * DAY_NS
+                expired = [key for key, entry in self._entries.items() if entry[3] < cutoff]
+                for key in expired:
+                    del self._entries[key]
+                dropped = len(expired)
+
+            live = {}
+            for key, (segment, _, length, _) in self._entries.items():
+                live.setdefault(segment, []).append(key)
+            sealed = [number for number in self.segments() if number != self._active]
+            sizes = {number: os.path.getsize(os.path.join(self.directory, _segment_name(number)))
+                     for number in sealed}
+            doomed = [number for number in sealed
+                      if sum(self._entries[key][2] + RECORD.size for key in live.get(number, ()))
+                      < MIN_LIVE * (sizes[number] - len(SEGMENT_MAGIC))]
+
+            # copy the live receipts of the doomed segments forward, then
+            # swap in a rewritten index before deleting anything
+            for number in doomed:
+                for key in live.get(number, ()):
+                    segment, offset, length, timestamp_ns = self._entries[key]
+                    data = self._map(segment, offset + length)[offset:offset + length]
+                    self._entries[key] = self._append(*key, data, timestamp_ns)
+            self._file.flush()
+            path = os.path.join(self.directory, 'index')
+            with open(path + '.tmp', 'wb') as index:
+                index.write(INDEX_MAGIC)
+                index.write(b''.join(INDEX_ENTRY.pack(account_number.encode('ascii'), transaction_id, *entry)
+                                     for (account_number, transaction_id), entry in self._entries.items()))
+                # the active segment may still hold receipts that just
+                # expired; mark them as seen so opening doesn't revive them
+                index.write(INDEX_ENTRY.pack(b'', 0, self._active, self._file.tell(), 0, 0))
+            self._index.close()
+            os.replace(path + '.tmp', path)
+            self._index = open(path, 'ab')
+
+            for number in doomed:
+                # views handed out earlier keep their own mapping alive
+                self._maps.pop(number, None)
+                os.remove(os.path.join(self.directory, _segment_name(number)))
+            return dropped, len(doomed), sum(sizes[number] for number in doomed)
+
+    def stats(self):
+        with self._lock:
+            self._file.flush()
+            numbers = self.segments()
+            size = sum(os.path.getsize(os.path.join(self.directory, _segment_name(number))) for number in numbers)
+            live = sum(length + RECORD.size for _, _, length, _ in self._entries.values())
+            return {'receipts': len(self._entries), 'segments': len(numbers), 'bytes': size, 'live_bytes': live}
+
+    def close(self):
+        with self._lock:
+            self._maps.clear()
+            self._file.close()
+            self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Receipt archive statistics and compaction")
+    parser.add_argument('directory', nargs='?', default=ARCHIVE_DIR)
+    parser.add_argument('--compact', action='store_true', help="apply the retention policy")
+    parser.add_argument('--retention-days', type=int, help="drop receipts older than this")
+    args = parser.parse_args()
+
+    with ReceiptArchive(args.directory, retention_days=args.retention_days) as archive:
+        if args.compact:
+            dropped, deleted, reclaimed = archive.compact()
+            print(f"Dropped {dropped:,} receipt(s), deleted {deleted:,} segment(s), "
+                  f"reclaimed {reclaimed / 2**20:.1f} MiB")
+        stats = archive.stats()
+        print(f"{stats['receipts']:,} receipt(s) in {stats['segments']:,} segment(s), "
+              f"{stats['bytes'] / 2**20:.1f} MiB ({stats['live_bytes'] / 2**20:.1f} MiB live)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# Benchmark: account number allocation rate as the number space fills up.
+# Run: python bench_allocator.py [millions_to_allocate]
+
+import random
+import sys
+import time
+from allocator import make_allocator
+
+def legacy_allocate(used, space):
+    # the old generate_account_number: random draw + retry until unused
+    while True:
+        acc_num = random.randint(1, space)
+        if acc_num not in used:
+            used.add(acc_num)
+            return acc_num
+
+def main():
+    millions = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    chunk = 1_000_000
+
+    print("legacy random-retry, space of 100,000 numbers (set lookup, no list scan):")
+    used = set()
+    for fill in (0.5, 0.9, 0.99):
+        start = time.perf_counter()
+        count = 0
+        while len(used) < fill * 100_000:
+            legacy_allocate(used, 100_000)
+            count += 1
+        elapsed = time.perf_counter() - start
+        print(f"  up to {fill:.0%} full: {elapsed / count * 1e6:8.2f} us/number")
+
+    for kind in ('sequential', 'permuted'):
+        allocator = make_allocator(kind, width=9)
+        print(f"{kind} allocator, width 9:")
+        for i in range(millions):
+            start = time.perf_counter()
+            for _ in range(chunk):
+                allocator.allocate()
+            elapsed = time.perf_counter() - start
+            print(f"  million #{i + 1}: {elapsed / chunk * 1e6:8.3f} us/number")
+
+    numbers = [allocator.allocate() for _ in range(chunk)]
+    start = time.perf_counter()
+    for acc_num in numbers:
+        allocator.validate(acc_num)
+    elapsed = time.perf_counter() - start
+    print(f"check-digit validation: {elapsed / chunk * 1e6:.3f} us/number")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# Benchmark for http_api.py: single-operation requests against /batch.
+# Starts the API in a child process with a journal in a temporary
+# directory, then each client logs in on its own keep-alive connection and
+# sends deposits and withdrawals, first one per request (one fsync each),
+# then as /batch requests of --batch-size operations (one fsync per batch).
+# Reports operations/s and requests/s for both.
+# Run: python bench_api.py [--clients N] [--operations N] [--batch-size N] [--port PORT]
+
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+def call(conn, method, path, body=None, token=None):
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f"Bearer {token}"
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    conn.request(method, path, data, headers)
+    response = conn.getresponse()
+    reply = json.loads(response.read())
+    if response.status != 200:
+        raise RuntimeError(f"{method} {path}: {reply}")
+    return reply
+
+
+def login(port, seed):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    account = call(conn, 'POST', '/accounts', {'name': f"Client {seed}", 'pin': "1234", 'initial_deposit': "1000"})
+    token = call(conn, 'POST', '/login', {'account_number': account['account_number'], 'pin': "1234"})['token']
+    return conn, token
+
+
+def operation(i):
+    return {'op': 'deposit', 'amount': "5.00"} if i % 2 == 0 else {'op': 'withdraw', 'amount': "2.50"}
+
+
+def single(conn, token, operations, batch_size):
+    for i in range(operations):
+        op = operation(i)
+        call(conn, 'POST', '/' + op['op'], op, token)
+    return operations
+
+
+def batched(conn, token, operations, batch_size):
+    requests = 0
+    for first in range(0, operations, batch_size):
+        ops = [operation(i) for i in range(first, min(operations, first + batch_size))]
+        results = call(conn, 'POST', '/batch', ops, token)['results']
+        assert not any('error' in result for result in results)
+        requests += 1
+    return requests
+
+
+def run(clients, worker, operations, batch_size):
+    requests = []
+
+    def client(conn, token):
+        requests.append(worker(conn, token, operations, batch_size))
+
+    threads = [threading.Thread(target=client, args=c) for c in clients]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, sum(requests)
+
+
+def wait_for_server(port, timeout=10.0):
+    end = time.monotonic() + timeout
+    while True:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port)
+            conn.request('GET', '/balance')
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            if time.monotonic() > end:
+                raise
+            time.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP API single vs batch benchmark")
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--operations', type=int, default=500, help="operations per client")
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--port', type=int, default=8081)
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        server = subprocess.Popen([sys.executable, os.path.join(here, "http_api.py"), "--port", str(args.port),
+                                   "--journal", os.path.join(tmp, "bench.journal")],
+                                  cwd=here, stdout=subprocess.DEVNULL)
+        try:
+            wait_for_server(args.port)
+            clients = [login(args.port, seed) for seed in range(args.clients)]
+            total = args.clients * args.operations
+            print(f"clients: {args.clients}, operations: {total:,}, batch size: {args.batch_size}")
+            for label, worker in (("single", single), ("batch", batched)):
+                elapsed, requests = run(clients, worker, args.operations, args.batch_size)
+                print(f"{label:>6}: {total / elapsed:10,.0f} operations/s  "
+                      f"{requests / elapsed:8,.0f} requests/s  ({elapsed:.2f} s)")
+            for conn, _ in clients:
+                conn.close()
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# Benchmark: a flat directory of receipt PNGs vs. the receipt archive.
+# Stores N receipts (the same rendered PNG, keyed by account and
+# transaction id) as one file each and in a ReceiptArchive, then reads
+# random receipts back from both. Reports stores/s, read latency, how
+# many files each leaves behind and how long a compaction takes after
+# half the receipts have expired.
+# Run: python bench_archive.py [receipts]
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+from archive import DAY_NS, ReceiptArchive
+from latency import LatencyLog
+from money import Money
+from receipt import png_bytes, receipt_lines, render_receipt
+from records import Account
+
+ACCOUNTS = 1000
+
+
+def main():
+    receipts = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    account = Account("1000000", "Juan Dela Cruz", "1234", Money(100000))
+    data = png_bytes(render_receipt(receipt_lines("DEPOSIT", account, Money(100))))
+    keys = [(f"{1_000_000 + i % ACCOUNTS}", i // ACCOUNTS) for i in range(receipts)]
+    rng = random.Random(3)
+    lookups = rng.sample(keys, min(5000, receipts))
+    log = LatencyLog()
+
+    with tempfile.TemporaryDirectory() as directory:
+        flat = os.path.join(directory, "receipts")
+        os.makedirs(flat)
+        start = time.perf_counter()
+        for account_number, transaction_id in keys:
+            with open(os.path.join(flat, f"{account_number}_{transaction_id}.png"), 'wb') as f:
+                f.write(data)
+        flat_rate = receipts / (time.perf_counter() - start)
+        for account_number, transaction_id in lookups:
+            with log.measure("flat read"):
+                with open(os.path.join(flat, f"{account_number}_{transaction_id}.png"), 'rb') as f:
+                    f.read()
+
+        archive = ReceiptArchive(os.path.join(directory, "archive"), retention_days=30)
+        start = time.perf_counter()
+        for i, (account_number, transaction_id) in enumerate(keys):
+            archive.put(account_number, transaction_id, data, timestamp_ns=i * 60 * DAY_NS // receipts)
+        archive_rate = receipts / (time.perf_counter() - start)
+        for key in lookups:
+            with log.measure("archive read"):
+                view = archive.get(*key)
+            assert len(view) == len(data)
+
+        stats = archive.stats()
+        start = time.perf_counter()
+        dropped, deleted, reclaimed = archive.compact(now_ns=60 * DAY_NS)
+        compacted = time.perf_counter() - start
+        archive.close()
+
+    print(f"{receipts:,} receipts of {len(data):,} bytes")
+    print(f"flat directory: {flat_rate:,.0f} stores/s, {receipts:,} files")
+    print(f"archive:        {archive_rate:,.0f} stores/s, {stats['segments']} segment(s) + index "
+          f"({stats['bytes'] / 2**20:.0f} MiB)")
+    print(log.summary())
+    print(f"compaction after 60 days with 30 days retention: {dropped:,} dropped, {deleted} segment(s) "
+          f"deleted, {reclaimed / 2**20:.0f} MiB reclaimed in {compacted:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
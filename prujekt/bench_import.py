@@ -0,0 +1,68 @@
+# Benchmark for importer.py.
+# Writes a CSV (or JSONL) file of generated accounts, about 1% of them
+# invalid, then imports it into a journaled registry and reports rows/s,
+# the rejected row count and the peak memory of the process. Each chunk
+# size given is imported into a fresh registry.
+# Run: python bench_import.py [rows] [--format csv|jsonl] [--chunk-sizes 1,100,1000]
+
+import argparse
+import json
+import os
+import random
+import resource
+import tempfile
+
+from allocator import make_allocator
+from importer import import_accounts
+from registry import AccountRegistry
+
+FIRST_NAMES = ["Juan", "Maria", "Jose", "Ana", "Pedro", "Rosa", "Carlos", "Liza"]
+LAST_NAMES = ["Santos", "Reyes", "Cruz", "Bautista", "Garcia", "Mendoza", "Ramos"]
+
+
+def write_rows(path, rows, file_format):
+    rng = random.Random(42)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        if file_format == 'csv':
+            f.write("name,pin,initial_deposit\n")
+        for i in range(rows):
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            pin = f"{rng.randrange(10000):04d}"
+            amount = f"{rng.randrange(100, 100000)}.{rng.randrange(100):02d}"
+            if i % 100 == 99:
+                pin = pin[:3]  # invalid
+            if file_format == 'csv':
+                f.write(f"{name},{pin},{amount}\n")
+            else:
+                f.write(json.dumps({'name': name, 'pin': pin, 'initial_deposit': amount}) + "\n")
+
+
+def peak_mib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="account import benchmark")
+    parser.add_argument('rows', type=int, nargs='?', default=1_000_000)
+    parser.add_argument('--format', choices=('csv', 'jsonl'), default='csv')
+    parser.add_argument('--chunk-sizes', default="1,1000")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "accounts." + args.format)
+        write_rows(path, args.rows, args.format)
+        print(f"{args.rows:,} rows, {os.path.getsize(path) / 2**20:.1f} MiB {args.format}; "
+              f"peak memory before import {peak_mib():.0f} MiB")
+        for chunk_size in (int(size) for size in args.chunk_sizes.split(',')):
+            registry = AccountRegistry(allocator=make_allocator('permuted', width=8))
+            registry.attach_journal(os.path.join(directory, f"import{chunk_size}.journal"))
+            with open(path, newline='', encoding='utf-8') as stream:
+                result = import_accounts(registry, stream, args.format, chunk_size=chunk_size)
+            registry.journal.close()
+            print(f"chunk size {chunk_size:>6}: {result.imported:,} imported, {result.rejected:,} rejected "
+                  f"in {result.seconds:.2f} s, {result.rows_per_second:,.0f} rows/s, "
+                  f"peak memory {peak_mib():.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# Benchmark: journal throughput with an fsync per record versus group commit.
+# Run: python bench_journal.py [records] [threads]
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from journal import Journal, OP_TRANSACTION, encode
+from records import TxType
+
+def record(i):
+    return encode(OP_TRANSACTION, TxType.DEPOSIT, 10000 + i, 500000 + i, time.time_ns(),
+                  "1234567", None)
+
+def run(path, count, threads, wait, **options):
+    journal = Journal(path, **options)
+    per_thread = count // threads
+
+    def worker():
+        for i in range(per_thread):
+            journal.append(record(i), wait=wait)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    journal.close()
+    elapsed = time.perf_counter() - start
+    return per_thread * threads / elapsed, journal.fsyncs
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    cases = [
+        ("fsync per record", 1, False, dict(sync='always')),
+        (f"fsync per record, {threads} threads", threads, False, dict(sync='always')),
+        (f"group commit, {threads} threads waiting", threads, True, dict(sync='group')),
+        ("group commit, no wait", 1, False, dict(sync='group')),
+        ("group commit, 1ms window", 1, False, dict(sync='group', group_window=0.001)),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, (label, n_threads, wait, options) in enumerate(cases):
+            rate, fsyncs = run(os.path.join(tmp, f"{i}.journal"), count, n_threads, wait, **options)
+            print(f"{label:<36} {rate:12,.0f} records/s  {fsyncs:8,} fsyncs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# Benchmark: showing one page of a long history from a memory-mapped ledger
+# versus decoding the whole history into Transaction records first.
+# Run: python bench_ledger.py [transactions] [page_size]
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from ledger import ROW, HEADER_SIZE, MAGIC, Ledger
+from records import TxType
+
+def build(path, count):
+    with open(path, 'wb', buffering=1 << 20) as f:
+        f.write(MAGIC)
+        for i in range(count):
+            f.write(ROW.pack(i, 10000, 100000 + i, TxType.DEPOSIT, b''))
+
+def measure(label, action):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = action()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed * 1000:10.2f} ms  {peak / 1024:10.1f} KiB peak")
+    return result
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    page_size = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "archive.ledger")
+        build(path, count)
+        print(f"transactions: {count:,}, file size {HEADER_SIZE + count * ROW.size:,} bytes")
+        with Ledger(path) as ledger:
+            measure("decode all, show last page", lambda: list(ledger)[-page_size:])
+        with Ledger(path) as ledger:
+            last_page = (count - 1) // page_size
+            measure("ledger.page(last)", lambda: ledger.page(last_page, page_size))
+            measure("ledger.page(0)", lambda: ledger.page(0, page_size))
+
+if __name__ == "__main__":
+    main()
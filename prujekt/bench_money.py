@@ -0,0 +1,64 @@
+# Benchmark: Money (integer centavos) against float and Decimal.
+# Run: python bench_money.py [operations]
+
+import sys
+import time
+from itertools import repeat
+from decimal import Decimal
+from money import Money, as_array, parse_many, total
+
+def timed(label, func, count):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {elapsed / count * 1e9:8.1f} ns/op")
+    return result
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    texts = [f"{i % 100000}.{i % 100:02d}" for i in range(count)]
+
+    print("parse:")
+    floats = timed("float()", lambda: [float(t) for t in texts], count)
+    decimals = timed("Decimal()", lambda: [Decimal(t) for t in texts], count)
+    monies = timed("Money.parse()", lambda: [Money.parse(t) for t in texts], count)
+    cents = timed("parse_many() -> array", lambda: parse_many(texts), count)
+
+    print("format with ',.2f':")
+    timed("float", lambda: [f"{x:,.2f}" for x in floats], count)
+    timed("Decimal", lambda: [f"{x:,.2f}" for x in decimals], count)
+    timed("Money", lambda: [f"{x:,.2f}" for x in monies], count)
+
+    print("balance += amount, one at a time:")
+    def accumulate(values, start):
+        balance = start
+        for value in values:
+            balance += value
+        return balance
+    float_total = timed("float", lambda: accumulate(floats, 0.0), count)
+    decimal_total = timed("Decimal", lambda: accumulate(decimals, Decimal(0)), count)
+    money_total = timed("Money", lambda: accumulate(monies, Money(0)), count)
+
+    print("bulk total over a column:")
+    timed("sum(list of float)", lambda: sum(floats), count)
+    timed("sum(list of Decimal)", lambda: sum(decimals), count)
+    column = as_array(cents)
+    bulk_total = timed("money.total(column)", lambda: total(column), count)
+
+    print("totals of the parsed amounts:")
+    print(f"  float   {float_total:,.6f}  (off by {Decimal(float_total) - decimal_total:.2e})")
+    print(f"  Decimal {decimal_total:,.6f}")
+    print(f"  Money   {money_total:,.2f}  (bulk {bulk_total:,.2f})")
+
+    # 0.10 has no exact binary float, so every float addition rounds and
+    # the error piles up; ten centavos are exact in Money
+    print(f"drift, adding 0.10 {count:,} times:")
+    tenth_float = accumulate(repeat(0.10, count), 0.0)
+    tenth_money = accumulate(repeat(Money.parse("0.10"), count), Money(0))
+    exact = Decimal("0.10") * count
+    print(f"  float   {tenth_float:,.10f}  (off by {Decimal(tenth_float) - exact:.2e})")
+    print(f"  Money   {tenth_money:,.2f}  (off by {tenth_money.pesos() - exact:.2e})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+# Benchmark: time to the first screen of history with HistoryCursor versus
+# formatting the whole history, for growing history lengths.
+# Run: python bench_pages.py [max_transactions]
+
+import sys
+import time
+from money import Money
+from records import Transaction, TxType
+from timeline import HistoryCursor
+
+def render(transactions):
+    return [f"{t['type']} ₱{t['amount']:.2f} {t['timestamp']:%Y-%m-%d %H:%M:%S} ₱{t['balance_after']:.2f}"
+            for t in transactions]
+
+def timed(action, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        action()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main():
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    history = []
+    count = 1000
+    print(f"{'transactions':>12} {'whole history':>15} {'first page':>12}")
+    while count <= limit:
+        history.extend(Transaction(TxType.DEPOSIT, Money(100), None, Money(100 * i), timestamp_ns=i)
+                       for i in range(len(history), count))
+        whole = timed(lambda: render(history), repeat=1)
+        first = timed(lambda: render(HistoryCursor(history).page()))
+        print(f"{count:>12,} {whole:>12.2f} ms {first:>9.3f} ms")
+        count *= 10
+
+if __name__ == "__main__":
+    main()
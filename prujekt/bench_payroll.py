@@ -0,0 +1,70 @@
+# Benchmark: paying N employees one transfer at a time vs one payroll batch.
+# Both runs use a fresh registry with a journal in a temporary directory,
+# and both end with everything durable (the single transfers commit once
+# per transfer, the way an interactive ATM does; the batch commits once).
+# Receipts go to memory: a one-line note per transfer, full receipts for
+# the batch.
+# Run: python bench_payroll.py [employees]
+
+import io
+import os
+import sys
+import tempfile
+import time
+
+from allocator import make_allocator
+from money import Money
+from payroll import pay, read_payroll, write_receipts
+from records import Account
+from registry import AccountRegistry
+from session import Session
+
+
+def setup(directory, employees):
+    registry = AccountRegistry(allocator=make_allocator('permuted', width=7))
+    registry.attach_journal(os.path.join(directory, "bench.journal"))
+    source = registry.new_account_number()
+    registry.append(Account(source, "Employer", "1234", Money.parse("1000000000")))
+    numbers = []
+    for i in range(employees):
+        acc_num = registry.new_account_number()
+        registry.append(Account(acc_num, f"Employee {i}", "1234", Money(0)))
+        numbers.append(acc_num)
+    registry.commit()
+    csv_text = "recipient,amount\n" + "".join(f"{acc_num},{1000 + i % 500}.25\n" for i, acc_num in enumerate(numbers))
+    return registry, source, csv_text
+
+
+def single(registry, source, csv_text):
+    session = Session(registry)
+    session.login(source, "1234")
+    receipts = io.StringIO()
+    for _, recipient, amount in read_payroll(io.StringIO(csv_text)):
+        session.transfer(recipient, Money.parse(amount))
+        registry.commit()
+        receipts.write(f"{recipient} {amount}\n")
+    return session.balance()
+
+
+def batch(registry, source, csv_text):
+    receipts = io.StringIO()
+    result = pay(registry, source, read_payroll(io.StringIO(csv_text)), all_or_nothing=True)
+    write_receipts(receipts, registry, result)
+    return result.source['balance']
+
+
+def main():
+    employees = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    print(f"employees: {employees:,}")
+    for label, run in (("one transfer each", single), ("payroll batch", batch)):
+        with tempfile.TemporaryDirectory() as directory:
+            registry, source, csv_text = setup(directory, employees)
+            start = time.perf_counter()
+            balance = run(registry, source, csv_text)
+            elapsed = time.perf_counter() - start
+            registry.journal.close()
+        print(f"{label:>18}: {elapsed:7.2f} s  {employees / elapsed:10,.0f} payments/s  (balance left ₱{balance:,.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Benchmark: receipts as a PNG per transaction vs. rendered on demand.
+# Records N deposits two ways: saving every receipt as a PNG file (the old
+# GUI behaviour) and keeping only the transaction, then views receipts the
+# way someone browsing history would: mostly the latest few, now and then
+# an older one. Reports time per transaction, the disk used for receipts,
+# and view latency with the cache missing and hitting.
+# Run: python bench_receipt_cache.py [transactions] [views]
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+from latency import LatencyLog
+from money import Money
+from receipt import ReceiptCache, load_fonts, save_receipt
+from records import Account
+from registry import AccountRegistry
+from session import Session
+
+
+def disk_usage(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+def main():
+    transactions = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    views = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    load_fonts()
+    registry = AccountRegistry()
+    registry.append(Account(registry.new_account_number(), "Juan Dela Cruz", "1234", Money(100000)))
+    session = Session(registry)
+    session.account_index = 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        for i in range(transactions):
+            session.deposit(Money(100))
+            # one file per transaction; the index keeps the names unique
+            save_receipt(f"DEPOSIT{i}", session.account, Money(100), directory=directory)
+        per_file = (time.perf_counter() - start) / transactions
+        used = disk_usage(directory)
+
+    start = time.perf_counter()
+    for _ in range(transactions):
+        session.deposit(Money(100))
+    per_record = (time.perf_counter() - start) / transactions
+    print(f"{transactions:,} deposits: {per_file * 1e3:.2f} ms each with a PNG file "
+          f"({used / 2**20:.1f} MiB of receipts), {per_record * 1e3:.3f} ms each without")
+
+    account = session.account
+    last = len(account['transaction_history']) - 1
+    rng = random.Random(7)
+    cache = ReceiptCache(256)
+    log = LatencyLog()
+    for _ in range(views):
+        index = last - int(rng.paretovariate(1.2)) + 1 if rng.random() < 0.9 else rng.randrange(last + 1)
+        index = max(0, index)
+        misses = cache.misses
+        started = time.perf_counter()
+        cache.png(account, index, registry)
+        log.record("view (miss)" if cache.misses > misses else "view (hit)", time.perf_counter() - started)
+    print(f"{views:,} receipt views, hit rate {cache.hits / views:.0%}, {len(cache)} cached:")
+    print(log.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# Benchmark: console receipts printed field by field vs. the receipt model.
+# "print" is the old generate_receipt (a dozen print() calls, each
+# formatting its field and calling datetime.now()); "model" builds a
+# receipt_model.Receipt from the committed transaction and writes it with
+# one call; "batch" is a ReceiptPrinter in batch mode. Output goes to a
+# line-buffered stream on os.devnull, like a terminal, which also counts
+# the write() calls.
+# Run: python bench_receipt_model.py [receipts]
+
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+
+from money import Money
+from receipt_model import ReceiptPrinter, TextSink, latest
+from records import Account
+from registry import AccountRegistry
+from session import Session
+
+
+class CountingStream(io.TextIOWrapper):
+    writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        return super().write(text)
+
+
+def print_receipt(transaction_type, account, amount=None, recipient=None):
+    print("\n" + "=" * 40)
+    print(f"{'TRANSACTION RECEIPT':^40}")
+    print("=" * 40)
+    print(f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Transaction Type: {transaction_type}")
+    print(f"Account Number: {account['account_number']}")
+    print(f"Account Holder: {account['name']}")
+    if amount is not None:
+        print(f"Amount: ₱{amount:.2f}")
+    if recipient:
+        print(f"Recipient Account: {recipient['account_number']}")
+        print(f"Recipient Name: {recipient['name']}")
+    print(f"Current Balance: ₱{account['balance']:.2f}")
+    print("=" * 40)
+    print("Thank you for banking with us!")
+    print("=" * 40 + "\n")
+
+
+def main():
+    receipts = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    registry = AccountRegistry()
+    registry.append(Account(registry.new_account_number(), "Juan Dela Cruz", "1234", Money(100000)))
+    registry.append(Account(registry.new_account_number(), "Maria Santos", "1234", Money(0)))
+    session = Session(registry)
+    session.account_index = 0
+    session.transfer(registry[1]['account_number'], Money(100))
+    account, recipient, transaction = session.account, registry[1], latest(session.account)
+
+    with open(os.devnull, 'wb') as devnull:
+        stream = CountingStream(devnull, encoding='utf-8', line_buffering=True)
+        runs = [
+            ("print", lambda: print_receipt("TRANSFER", account, Money(100), recipient)),
+            ("model", lambda: model.print("TRANSFER", account, Money(100), recipient, transaction)),
+            ("batch", lambda: batch.print("TRANSFER", account, Money(100), recipient, transaction)),
+        ]
+        model = ReceiptPrinter(TextSink(stream), batch=False)
+        batch = ReceiptPrinter(TextSink(stream), batch=True)
+        for name, run in runs:
+            stream.writes = 0
+            with redirect_stdout(stream):
+                start = time.perf_counter()
+                for _ in range(receipts):
+                    run()
+                elapsed = time.perf_counter() - start
+            print(f"{name}: {elapsed / receipts * 1e6:6.2f} us/receipt, "
+                  f"{stream.writes / receipts:.0f} write call(s) per receipt")
+        stream.detach()
+
+
+if __name__ == "__main__":
+    main()
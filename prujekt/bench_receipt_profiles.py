@@ -0,0 +1,45 @@
+# Benchmark: receipt output profiles.
+# Encodes the same rendered receipts with every profile in
+# receipt.PROFILES (and every zlib level for the smallest one) and reports
+# the encode time and the bytes per receipt, then bundles them into one
+# multi-page PDF per image mode.
+# Run: python bench_receipt_profiles.py [receipts]
+
+import io
+import sys
+import time
+
+from money import Money
+from receipt import PROFILES, load_fonts, png_bytes, receipt_lines, render_receipt, write_pdf
+from records import Account
+
+
+def main():
+    receipts = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    load_fonts()
+    account = Account("1000000", "Juan Dela Cruz", "1234", Money(100000))
+    recipient = Account("1000001", "Maria Santos", "1234", Money(0))
+    images = [render_receipt(receipt_lines("TRANSFER", account, Money(100 + i * 137), recipient))
+              for i in range(receipts)]
+
+    runs = [(profile, None) for profile in PROFILES] + [('mono', level) for level in range(0, 10, 3)]
+    print(f"{receipts:,} receipts, {images[0].width}x{images[0].height}")
+    print(f"{'profile':>12} {'level':>5} {'ms/receipt':>10} {'bytes/receipt':>13}")
+    for profile, level in runs:
+        start = time.perf_counter()
+        size = sum(len(png_bytes(image, profile, level)) for image in images)
+        elapsed = time.perf_counter() - start
+        shown = PROFILES[profile][1] if level is None else level
+        print(f"{profile:>12} {shown:>5} {elapsed / receipts * 1e3:>10.2f} {size / receipts:>13,.0f}")
+
+    print("multi-page PDF:")
+    for profile in ('rgb', 'gray', 'palette', 'mono'):
+        stream = io.BytesIO()
+        start = time.perf_counter()
+        write_pdf(stream, images, profile)
+        elapsed = time.perf_counter() - start
+        print(f"{profile:>12} {elapsed / receipts * 1e3:>16.2f} {len(stream.getvalue()) / receipts:>13,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# Benchmark: how long a GUI transaction keeps the Tk thread busy, with the
+# receipt saved inline (the old way) and handed to ReceiptWorker.
+# Each "click" does a deposit through a Session and produces a receipt;
+# the latency is measured up to the point where the GUI would open its
+# confirmation, with the same LatencyLog the GUI uses. For the worker the
+# time until every receipt is on disk is reported as well.
+# Run: python bench_receipt_worker.py [transactions]
+
+import sys
+import tempfile
+import time
+
+from latency import LatencyLog
+from money import Money
+from receipt import ReceiptWorker, load_fonts, save_receipt
+from records import Account
+from registry import AccountRegistry
+from session import Session
+
+
+def main():
+    transactions = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    load_fonts()
+    registry = AccountRegistry()
+    registry.append(Account(registry.new_account_number(), "Juan Dela Cruz", "1234", Money(100000)))
+    session = Session(registry)
+    session.account_index = 0
+    log = LatencyLog()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for _ in range(transactions):
+            with log.measure("inline"):
+                session.deposit(Money(100))
+                save_receipt("DEPOSIT", session.account, Money(100), directory=directory)
+
+        worker = ReceiptWorker(directory)
+        start = time.perf_counter()
+        for _ in range(transactions):
+            with log.measure("worker"):
+                session.deposit(Money(100))
+                worker.submit("DEPOSIT", session.account, Money(100))
+            # the user reads the confirmation before the next click
+            time.sleep(0.01)
+            worker.poll()
+        worker.close()
+        written = time.perf_counter() - start
+
+    print(f"{transactions:,} deposits, time until the confirmation would open:")
+    print(log.summary())
+    print(f"worker: all receipts written {written:.2f} s after the first click")
+
+
+if __name__ == "__main__":
+    main()
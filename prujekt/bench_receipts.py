@@ -0,0 +1,73 @@
+# Benchmark: receipt images per second, the old way and with receipt.py.
+# "inline" is what ATMGui.generate_receipt_image used to do for every
+# receipt: look up arial.ttf twice (falling back to the default font when
+# it isn't installed) and draw the whole receipt. "cached" uses the cached
+# fonts and stamps the values onto a pre-rendered template. Both are timed
+# rendering only and rendering plus PNG encoding.
+# Run: python bench_receipts.py [receipts]
+
+import io
+import sys
+import time
+from datetime import datetime
+
+from PIL import Image, ImageDraw, ImageFont
+
+from money import Money
+from receipt import HEIGHT, WIDTH, load_fonts, receipt_lines, render_receipt
+from records import Account
+
+
+def inline_receipt(lines):
+    image = Image.new('RGB', (WIDTH, HEIGHT), 'white')
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.truetype("arial.ttf", 16)
+        title_font = ImageFont.truetype("arial.ttf", 24)
+    except OSError:
+        font = ImageFont.load_default()
+        title_font = ImageFont.load_default()
+    y = 20
+    draw.text((WIDTH // 2, y), "TRANSACTION RECEIPT", font=title_font, fill='black', anchor='mm')
+    y += 40
+    draw.line([(40, y), (WIDTH - 40, y)], fill='black', width=2)
+    y += 30
+    for label, value in lines:
+        draw.text((50, y), label + str(value), font=font, fill='black')
+        y += 30
+    y += 10
+    draw.line([(40, y), (WIDTH - 40, y)], fill='black', width=2)
+    y += 30
+    draw.text((WIDTH // 2, y), "Thank you for banking with us!", font=font, fill='black', anchor='mm')
+    return image
+
+
+def run(render, receipts, encode):
+    account = Account("1234567", "Juan Dela Cruz", "1234", Money(1234567))
+    recipient = Account("7654321", "Maria Santos", "1234", Money(0))
+    start = time.perf_counter()
+    for i in range(receipts):
+        if i % 2:
+            lines = receipt_lines("DEPOSIT", account, Money(10000 + i), when=datetime.now())
+        else:
+            lines = receipt_lines("TRANSFER", account, Money(500 + i), recipient, when=datetime.now())
+        image = render(lines)
+        if encode:
+            image.save(io.BytesIO(), 'PNG')
+    return receipts / (time.perf_counter() - start)
+
+
+def main():
+    receipts = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    start = time.perf_counter()
+    load_fonts()
+    print(f"font lookup at startup: {(time.perf_counter() - start) * 1000:.1f} ms")
+    for encode in (False, True):
+        label = "render + PNG" if encode else "render only"
+        inline = run(inline_receipt, receipts, encode)
+        cached = run(render_receipt, receipts, encode)
+        print(f"{label:>13}: inline {inline:8,.0f} receipts/s, cached {cached:8,.0f} receipts/s ({cached / inline:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
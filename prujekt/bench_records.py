@@ -0,0 +1,44 @@
+# Memory report: bytes per transaction for the old dict + datetime records
+# versus the slotted Transaction record.
+# Run: python bench_records.py [transactions]
+
+import sys
+import tracemalloc
+from datetime import datetime
+from records import Transaction
+
+TYPES = ["DEPOSIT", "WITHDRAWAL", "TRANSFER (SENT)", "TRANSFER (RECEIVED)"]
+
+def old_transaction(i):
+    return {
+        'type': TYPES[i % 4],
+        'amount': float(i % 5000) + 0.25,
+        'timestamp': datetime.now(),
+        'recipient': None if i % 4 < 2 else str(1000000 + i % 997),
+        'balance_after': float(i) + 0.75
+    }
+
+def new_transaction(i):
+    return Transaction(TYPES[i % 4], float(i % 5000) + 0.25,
+                       None if i % 4 < 2 else str(1000000 + i % 997), float(i) + 0.75)
+
+def measure(build, count):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    history = [build(i) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del history
+    return (after - before) / count
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    old = measure(old_transaction, count)
+    new = measure(new_transaction, count)
+    print(f"transactions: {count:,}")
+    print(f"dict + datetime:    {old:8.1f} bytes/transaction")
+    print(f"slotted Transaction: {new:7.1f} bytes/transaction")
+    print(f"saved: {1 - new / old:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# Benchmark: login/transfer lookup latency, linear scan vs AccountRegistry.
+# Run: python bench_registry.py [max_accounts]
+
+import sys
+import time
+from registry import AccountRegistry
+
+def make_account(n):
+    return {
+        'account_number': str(n),
+        'name': f"User {n}",
+        'pin': "1234",
+        'balance': 1000.0,
+        'transaction_history': []
+    }
+
+def linear_login(accounts, account_number, pin):
+    for i, account in enumerate(accounts):
+        if account['account_number'] == account_number and account['pin'] == pin:
+            return i
+    return None
+
+def linear_find(accounts, account_number):
+    for i, account in enumerate(accounts):
+        if account['account_number'] == account_number:
+            return i
+    return None
+
+def time_per_op(func, targets):
+    start = time.perf_counter()
+    for target in targets:
+        func(target)
+    return (time.perf_counter() - start) / len(targets) * 1e6
+
+def main():
+    max_accounts = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    linear_limit = 100_000  # the linear scan gets too slow to time past this
+
+    print(f"{'accounts':>10} {'scan login':>12} {'scan xfer':>12} {'index login':>12} {'index xfer':>12}   (us/op)")
+    size = 10
+    while size <= max_accounts:
+        plain = [make_account(n) for n in range(1, size + 1)]
+        registry = AccountRegistry(plain)
+        # worst case for the scan: the last account in the list
+        worst = str(size)
+        targets = [worst] * (200 if size <= linear_limit else 1)
+        lookups = [str(n) for n in range(1, size + 1, max(1, size // 1000))]
+
+        if size <= linear_limit:
+            scan_login = f"{time_per_op(lambda t: linear_login(plain, t, '1234'), targets):12.2f}"
+            scan_xfer = f"{time_per_op(lambda t: linear_find(plain, t), targets):12.2f}"
+        else:
+            scan_login = scan_xfer = f"{'-':>12}"
+        index_login = time_per_op(lambda t: registry.authenticate(t, '1234'), lookups)
+        index_xfer = time_per_op(registry.find, lookups)
+
+        print(f"{size:>10} {scan_login} {scan_xfer} {index_login:12.3f} {index_xfer:12.3f}")
+        size *= 10
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# Benchmark for main_gui.py: screen switch latency.
+# Logs a customer in and cycles through the main menu, login, banking menu,
+# deposit and history screens, timing each switch up to the point where Tk
+# has laid the screen out (update_idletasks). "rebuild" destroys every
+# screen before each switch, like the old clear_frames(); "cached" keeps
+# the screens that show_screen() built and only hides and shows them.
+# Needs a display; on a headless machine run it under Xvfb.
+# Run: xvfb-run -a python bench_screens.py [switches]
+
+import sys
+import tkinter as tk
+
+import main_gui
+from latency import LatencyLog
+from money import Money
+from records import Account
+
+SCREENS = ('main_menu', 'login', 'banking_menu', 'deposit', 'history')
+
+
+def switch(gui, name):
+    if name == 'deposit':
+        gui.show_transaction('deposit')
+    else:
+        getattr(gui, 'show_' + name)()
+
+
+def drop_screens(gui):
+    for frame in gui.screens.values():
+        frame.destroy()
+    gui.screens.clear()
+    gui.current_screen = None
+
+
+def main():
+    switches = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        sys.exit(f"bench_screens needs a display ({e}); run it under xvfb-run")
+    gui = main_gui.ATMGui(root)
+    accounts = main_gui.accounts
+    accounts.append(Account(accounts.new_account_number(), "Juan Dela Cruz", "1234", Money(100000)))
+    gui.session.account_index = 0
+    for _ in range(50):
+        gui.session.deposit(Money(100))
+
+    for mode in ('rebuild', 'cached'):
+        latency = LatencyLog()
+        for i in range(switches):
+            name = SCREENS[i % len(SCREENS)]
+            if mode == 'rebuild':
+                drop_screens(gui)
+            with latency.measure(name):
+                switch(gui, name)
+                root.update_idletasks()
+        print(f"{mode}:")
+        print(latency.summary())
+    gui.receipts.close()
+    root.destroy()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# Load generator for server.py.
+# Opens many client connections, each one a terminal with its own account,
+# and sends a random mix of requests (waiting for each reply before sending
+# the next) for a fixed time. Reports requests/s and latency percentiles.
+# Without --connect it starts a server in a child process on localhost.
+# Run: python bench_server.py [--clients N] [--seconds S] [--unix] [--connect HOST:PORT]
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+
+async def request(reader, writer, line):
+    writer.write(line.encode('utf-8') + b"\n")
+    await writer.drain()
+    reply = await reader.readline()
+    if reply.startswith(b"OK ") and line.startswith("HISTORY"):
+        for _ in range(int(reply.split()[1])):
+            await reader.readline()
+    return reply
+
+
+async def open_connection(address):
+    if isinstance(address, str):
+        return await asyncio.open_unix_connection(address)
+    return await asyncio.open_connection(*address)
+
+
+async def terminal(address, seed, deadline, numbers, latencies, errors):
+    rng = random.Random(seed)
+    reader, writer = await open_connection(address)
+    acc_num = (await request(reader, writer, f"CREATE 1234 1000 Terminal {chr(65 + seed % 26)}")).split()[1].decode()
+    numbers.append(acc_num)
+    await request(reader, writer, f"LOGIN {acc_num} 1234")
+    while time.perf_counter() < deadline:
+        action = rng.random()
+        if action < 0.3:
+            line = "DEPOSIT 5.00"
+        elif action < 0.5:
+            line = "WITHDRAW 2.50"
+        elif action < 0.7:
+            line = "BALANCE"
+        elif action < 0.9 and len(numbers) > 1:
+            recipient = rng.choice(numbers)
+            line = f"TRANSFER {recipient} 1.00" if recipient != acc_num else "BALANCE"
+        else:
+            line = "HISTORY"
+        start = time.perf_counter()
+        reply = await request(reader, writer, line)
+        latencies.append(time.perf_counter() - start)
+        if not reply.startswith(b"OK"):
+            errors[reply.strip().decode()] = errors.get(reply.strip().decode(), 0) + 1
+    await request(reader, writer, "QUIT")
+    writer.close()
+
+
+async def load(address, clients, seconds):
+    numbers, latencies, errors = [], [], {}
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    await asyncio.gather(*(terminal(address, seed, deadline, numbers, latencies, errors)
+                           for seed in range(clients)))
+    return time.perf_counter() - start, latencies, errors
+
+
+def wait_for_server(address, timeout=10.0):
+    async def probe():
+        reader, writer = await open_connection(address)
+        await request(reader, writer, "PING")
+        writer.close()
+
+    end = time.monotonic() + timeout
+    while True:
+        try:
+            asyncio.run(probe())
+            return
+        except OSError:
+            if time.monotonic() > end:
+                raise
+            time.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ATM server load generator")
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--unix', action='store_true', help="use a Unix socket")
+    parser.add_argument('--connect', help="HOST:PORT or socket path of a running server")
+    args = parser.parse_args()
+
+    server = None
+    tmp = tempfile.TemporaryDirectory()
+    if args.connect:
+        host, _, port = args.connect.rpartition(':')
+        address = (host, int(port)) if port.isdigit() else args.connect
+    else:
+        here = os.path.dirname(os.path.abspath(__file__))
+        command = [sys.executable, os.path.join(here, "server.py"), "--journal", os.path.join(tmp.name, "bench.journal"),
+                   "--max-connections", str(args.clients + 10)]
+        if args.unix:
+            address = os.path.join(tmp.name, "atm.sock")
+            command += ["--unix", address]
+        else:
+            address = ("127.0.0.1", 8023)
+            command += ["--port", "8023"]
+        server = subprocess.Popen(command, cwd=here, stdout=subprocess.DEVNULL)
+    try:
+        wait_for_server(address)
+        elapsed, latencies, errors = asyncio.run(load(address, args.clients, args.seconds))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        tmp.cleanup()
+
+    latencies.sort()
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+    print(f"clients: {args.clients}, requests: {len(latencies):,} in {elapsed:.1f} s")
+    print(f"{len(latencies) / elapsed:,.0f} requests/s")
+    print(f"latency p50 {percentile(0.50):.2f} ms, p99 {percentile(0.99):.2f} ms, max {latencies[-1] * 1000:.2f} ms")
+    for reply, count in sorted(errors.items()):
+        print(f"  {count:,} x {reply}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Benchmark: thousands of customers logged in at once in one process.
+# Every simulated customer is an asyncio task with its own Session; tasks
+# yield to each other between operations, so all sessions are open at the
+# same time. Checks at the end that no money was created or lost.
+# Run: python bench_sessions.py [sessions] [operations_per_session]
+
+import asyncio
+import random
+import sys
+import time
+import tracemalloc
+from allocator import make_allocator
+from money import Money
+from records import Account
+from registry import AccountRegistry
+from session import InsufficientFunds, Session
+
+OPENING_BALANCE = Money(1_000_000)
+
+async def customer(registry, acc_num, numbers, operations, seed, totals):
+    rng = random.Random(seed)
+    session = Session(registry)
+    if not session.login(acc_num, '1234'):
+        raise RuntimeError(f"login failed for {acc_num}")
+    await asyncio.sleep(0)
+    for _ in range(operations):
+        amount = Money(rng.randrange(100, 50_000))
+        action = rng.random()
+        try:
+            if action < 0.4:
+                session.deposit(amount)
+                totals['deposits'] += amount
+            elif action < 0.7:
+                session.withdraw(amount)
+                totals['withdrawals'] += amount
+            elif action < 0.9:
+                recipient = rng.choice(numbers)
+                if recipient != acc_num:
+                    session.transfer(recipient, amount)
+            else:
+                session.history().page()
+        except InsufficientFunds:
+            pass
+        await asyncio.sleep(0)
+    session.logout()
+
+async def run(registry, numbers, operations, totals):
+    await asyncio.gather(*(customer(registry, acc_num, numbers, operations, seed, totals)
+                           for seed, acc_num in enumerate(numbers)))
+
+def main():
+    n_sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    registry = AccountRegistry(allocator=make_allocator('permuted', width=7))
+    numbers = []
+    for _ in range(n_sessions):
+        acc_num = registry.new_account_number()
+        registry.append(Account(acc_num, "Bench User", "1234", OPENING_BALANCE))
+        numbers.append(acc_num)
+
+    totals = {'deposits': Money(0), 'withdrawals': Money(0)}
+    tracemalloc.start()
+    start = time.perf_counter()
+    asyncio.run(run(registry, numbers, operations, totals))
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    expected = OPENING_BALANCE * n_sessions + totals['deposits'] - totals['withdrawals']
+    actual = sum((account['balance'] for account in registry), Money(0))
+    print(f"sessions: {n_sessions:,}, operations: {n_sessions * operations:,}")
+    print(f"{n_sessions * operations / elapsed:,.0f} operations/s, {elapsed:.2f} s, "
+          f"peak memory {peak / n_sessions:,.0f} bytes/session (with tracemalloc)")
+    print(f"balances {'ok' if actual == expected else 'MISMATCH'}: ₱{actual:,.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Benchmark: cold start from the journal alone versus snapshot + journal tail.
+# Both starts end up with every account's full history in memory.
+# Run: python bench_snapshot.py [accounts] [transactions] [tail]
+# The defaults (100k accounts, 5M transactions) write a few hundred MB to a temp dir.
+
+import os
+import random
+import sys
+import tempfile
+import time
+from array import array
+from allocator import make_allocator
+from journal import OP_CREATE, OP_TRANSACTION, encode
+from money import Money
+from records import Account, TxType
+from registry import AccountRegistry
+from snapshot import write_snapshot
+
+def build(tmp, n_accounts, n_transactions, tail):
+    journal_path = os.path.join(tmp, "atm.journal")
+    allocator = make_allocator('sequential', width=7)
+    numbers = [allocator.allocate() for _ in range(n_accounts)]
+    # the registry the snapshot is taken of, kept up to date until then
+    registry = AccountRegistry(allocator=make_allocator('sequential', width=7), columnar_history=True)
+    for acc_num in numbers:
+        registry.append(Account(acc_num, "Bench User", "1234", Money(100000)), log=False)
+    registry.allocator.counter = n_accounts
+    balances = array('q', [100000]) * n_accounts
+    rng = random.Random(1)
+    with open(journal_path, 'wb', buffering=1 << 20) as f:
+        for acc_num in numbers:
+            f.write(encode(OP_CREATE, 0, 0, 100000, 0, acc_num, None, "Bench User", "1234"))
+        for i in range(n_transactions):
+            if i == n_transactions - tail:
+                f.flush()
+                for account, balance in zip(registry, balances):
+                    account['balance'] = Money(balance)
+                write_snapshot(registry, journal_path + '.snapshot', f.tell())
+                registry = None
+            k = rng.randrange(n_accounts)
+            balances[k] += 100
+            f.write(encode(OP_TRANSACTION, TxType.DEPOSIT, 100, balances[k], i, numbers[k]))
+            if registry is not None:
+                registry[k]['transaction_history'].append_row(TxType.DEPOSIT, 100, balances[k], i)
+    return journal_path
+
+def cold_start(journal_path, use_snapshot):
+    snapshot_path = journal_path + '.snapshot'
+    hidden = snapshot_path + '.hidden'
+    if not use_snapshot:
+        os.rename(snapshot_path, hidden)
+    try:
+        start = time.perf_counter()
+        registry = AccountRegistry(allocator=make_allocator('sequential', width=7))
+        registry.attach_journal(journal_path, sync='none').close()
+        return time.perf_counter() - start, len(registry), sum(len(a['transaction_history']) for a in registry)
+    finally:
+        if not use_snapshot:
+            os.rename(hidden, snapshot_path)
+
+def main():
+    n_accounts = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    n_transactions = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000_000
+    tail = int(sys.argv[3]) if len(sys.argv) > 3 else 100_000
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        journal_path = build(tmp, n_accounts, n_transactions, tail)
+        print(f"built {n_accounts:,} accounts / {n_transactions:,} transactions in "
+              f"{time.perf_counter() - start:.1f}s, journal {os.path.getsize(journal_path) / 1e6:,.0f} MB, "
+              f"snapshot {os.path.getsize(journal_path + '.snapshot') / 1e6:,.1f} MB")
+        for label, use_snapshot in ((f"snapshot + {tail:,} record tail", True), ("full journal replay", False)):
+            elapsed, count, history = cold_start(journal_path, use_snapshot)
+            print(f"{label:<28} {elapsed:8.2f}s ({count:,} accounts, {history:,} transactions)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# Benchmark: several ATM processes sharing one SQLite database.
+# Each process attaches its own registry to the same file and makes random
+# deposits; afterwards the total balance is checked against what was deposited.
+# Run: python bench_sqlite.py [accounts] [deposits_per_process]
+
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from allocator import make_allocator
+from money import Money
+from records import Transaction, TxType
+from registry import AccountRegistry
+from storage import SQLiteStorage
+
+def setup(path, n_accounts):
+    storage = SQLiteStorage(path)
+    registry = AccountRegistry(allocator=make_allocator('permuted', key=7))
+    registry.attach_storage(storage)
+    numbers = []
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("BEGIN")
+    for _ in range(n_accounts):
+        acc_num = registry.allocator.allocate()
+        conn.execute("INSERT INTO accounts VALUES (?, ?, ?, ?)", (acc_num, "Bench User", "1234", 100000))
+        numbers.append(acc_num)
+    conn.execute("COMMIT")
+    conn.close()
+    storage.close()
+    return numbers
+
+def worker(path, numbers, count, batch_size, seed):
+    registry = AccountRegistry(allocator=make_allocator('permuted', key=7))
+    storage = registry.attach_storage(SQLiteStorage(path, batch_size=batch_size))
+    rng = random.Random(seed)
+    for _ in range(count):
+        index = registry.find(rng.choice(numbers))
+        balance, = registry.change_balances(((index, Money(100)),))
+        registry.record(index, Transaction(TxType.DEPOSIT, Money(100), None, balance))
+    storage.close()
+
+def total_balance(path):
+    conn = sqlite3.connect(path)
+    total = conn.execute("SELECT SUM(balance) FROM accounts").fetchone()[0]
+    conn.close()
+    return total
+
+def main():
+    n_accounts = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    with tempfile.TemporaryDirectory() as tmp:
+        for batch_size in (1, 100):
+            for processes in (1, 2, 4, 8):
+                path = os.path.join(tmp, f"atm_{batch_size}_{processes}.sqlite3")
+                numbers = setup(path, n_accounts)
+                before = total_balance(path)
+                workers = [multiprocessing.Process(target=worker, args=(path, numbers, count, batch_size, seed))
+                           for seed in range(processes)]
+                start = time.perf_counter()
+                for p in workers:
+                    p.start()
+                for p in workers:
+                    p.join()
+                elapsed = time.perf_counter() - start
+                deposited = processes * count * 100
+                ok = total_balance(path) - before == deposited
+                print(f"batch {batch_size:>3}, {processes} processes: "
+                      f"{processes * count / elapsed:10,.0f} deposits/s  balances {'ok' if ok else 'MISMATCH'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# Benchmark for statement.py: export a long ledger-backed history.
+# Builds an account whose history is a ledger file of N transactions, then
+# exports it to CSV and to JSON Lines and reports rows/s and how much the
+# process's peak memory grew during each export (it should stay flat no
+# matter how many rows there are).
+# Run: python bench_statement.py [rows]
+
+import mmap
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from ledger import Ledger
+from money import Money
+from records import Account, TxType
+from statement import account_rows, export_file
+
+
+def peak_mib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    with tempfile.TemporaryDirectory() as directory:
+        ledger = Ledger(os.path.join(directory, "bench.ledger"))
+        balance, now = 0, time.time_ns() - rows * 1_000_000_000
+        for i in range(rows):
+            amount = 100 + i % 10_000
+            balance += amount if i % 3 else -amount
+            ledger.append_row(TxType.DEPOSIT if i % 3 else TxType.WITHDRAWAL, amount, balance,
+                              now + i * 1_000_000_000)
+        ledger.flush()
+        account = Account("1000000", "Bench User", "1234", Money(balance), ledger)
+        # touch every page of the mapping first, so the file's pages (which
+        # count towards the process's memory) aren't charged to the export
+        sum(ledger.view()[::mmap.PAGESIZE])
+        print(f"{rows:,} transactions; peak memory before export {peak_mib():.0f} MiB")
+
+        for file_format in ('csv', 'jsonl'):
+            path = os.path.join(directory, "statement." + file_format)
+            before = peak_mib()
+            start = time.perf_counter()
+            count = export_file(path, account_rows(account), file_format)
+            elapsed = time.perf_counter() - start
+            print(f"{file_format:>5}: {count:,} rows in {elapsed:.2f} s, {count / elapsed:,.0f} rows/s, "
+                  f"{os.path.getsize(path) / 2**20:.0f} MiB written, peak memory +{peak_mib() - before:.0f} MiB")
+        ledger.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# Stress test and benchmark: random transfers from many threads at once.
+# Every thread picks a random sender and recipient for each transfer, so
+# threads constantly contend for the same accounts in both directions.
+# At the end the total money supply must be exactly what it started with.
+# Run: python bench_threads.py [transfers] [accounts]
+
+import random
+import sys
+import threading
+import time
+from allocator import make_allocator
+from money import Money
+from records import Account
+from registry import AccountRegistry
+from session import InsufficientFunds, Session
+
+def worker(sessions, numbers, count, seed, counts):
+    rng = random.Random(seed)
+    done = failed = 0
+    for _ in range(count):
+        session = rng.choice(sessions)
+        recipient = rng.choice(numbers)
+        if recipient == session.account['account_number']:
+            continue
+        try:
+            session.transfer(recipient, Money(rng.randrange(1, 100_000)))
+            done += 1
+        except InsufficientFunds:
+            failed += 1
+    counts.append((done, failed))
+
+def run(n_threads, transfers, n_accounts):
+    registry = AccountRegistry(allocator=make_allocator('permuted', width=7))
+    numbers = []
+    for _ in range(n_accounts):
+        acc_num = registry.new_account_number()
+        registry.append(Account(acc_num, "Bench User", "1234", Money(1_000_000)))
+        numbers.append(acc_num)
+    sessions = []
+    for acc_num in numbers:
+        session = Session(registry)
+        session.login(acc_num, "1234")
+        sessions.append(session)
+    supply = sum((account['balance'] for account in registry), Money(0))
+
+    counts = []
+    threads = [threading.Thread(target=worker, args=(sessions, numbers, transfers // n_threads, seed, counts))
+               for seed in range(n_threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    done = sum(d for d, _ in counts)
+    failed = sum(f for _, f in counts)
+    total = sum((account['balance'] for account in registry), Money(0))
+    history_ok = sum(len(account['transaction_history']) for account in registry) == 2 * done
+    ok = total == supply and history_ok and all(account['balance'] >= 0 for account in registry)
+    print(f"{n_threads:>2} threads: {done:>9,} transfers ({failed:,} refused) "
+          f"{(done + failed) / elapsed:>9,.0f}/s  supply {'conserved' if ok else 'BROKEN'}")
+    return ok
+
+def main():
+    transfers = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    n_accounts = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000
+    # a short switch interval makes threads interleave as often as possible
+    sys.setswitchinterval(1e-5)
+    results = [run(n_threads, transfers, n_accounts) for n_threads in (1, 2, 4, 8, 16)]
+    sys.exit(0 if all(results) else 1)
+
+if __name__ == "__main__":
+    main()
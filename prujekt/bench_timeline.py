@@ -0,0 +1,48 @@
+# Benchmark: balance-at-time and date-range queries by binary search over
+# the timestamp column versus scanning the whole history.
+# Run: python bench_timeline.py [transactions] [queries]
+
+import random
+import sys
+import time
+from history import ColumnarHistory
+from money import Money
+from records import Account, Transaction, TxType
+from timeline import balance_at, transactions_between
+
+def scan_balance_at(account, when):
+    balance = None
+    for transaction in account['transaction_history']:
+        if transaction.timestamp_ns > when:
+            break
+        balance = transaction.balance_after
+    return balance
+
+def scan_between(history, start, end):
+    return [t for t in history if start <= t.timestamp_ns < end]
+
+def run(label, queries, action):
+    start = time.perf_counter()
+    for query in queries:
+        action(*query)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed / len(queries) * 1e6:12.1f} µs/query")
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    transactions = [Transaction(TxType.DEPOSIT, Money(100), None, Money(100 * (i + 1)),
+                                timestamp_ns=i * 1_000_000_000) for i in range(count)]
+    rng = random.Random(1)
+    points = [rng.randrange(count) * 1_000_000_000 for _ in range(n_queries)]
+    ranges = [(t, t + 500 * 1_000_000_000) for t in points]
+    print(f"transactions: {count:,}")
+    for name, history in (("list", transactions), ("columnar", ColumnarHistory(transactions))):
+        account = Account('0000125', 'Bench User', '1234', Money(0), history)
+        run(f"{name}: scan balance at", [(account, t) for t in points], scan_balance_at)
+        run(f"{name}: bisect balance at", [(account, t) for t in points], balance_at)
+        run(f"{name}: scan range", [(history, *r) for r in ranges], scan_between)
+        run(f"{name}: bisect range", [(history, *r) for r in ranges], transactions_between)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# Columnar transaction history.
+# Instead of a list of Transaction objects, a ColumnarHistory keeps one
+# array per field (amount, balance_after, timestamp, type code, counterparty)
+# so reports can slice and reduce whole columns without building rows.
+# It still behaves like the old list: append(), len(), indexing and
+# iteration all work and hand back Transaction records.
+
+from array import array
+from money import Money
+from records import Transaction
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, the array views work without it
+    np = None
+
+
+class ColumnarHistory:
+    # column name -> array typecode
+    COLUMNS = {
+        'amount': 'q',  # centavos
+        'balance_after': 'q',
+        'timestamp_ns': 'q',
+        'code': 'H',
+        'counterparty': 'i',  # index into self.counterparties, -1 for none
+    }
+
+    def __init__(self, transactions=(), capacity=16):
+        self._capacity = max(1, capacity)
+        self._len = 0
+        self._columns = {name: array(typecode, bytes(array(typecode).itemsize * self._capacity))
+                         for name, typecode in self.COLUMNS.items()}
+        # account numbers repeat a lot, so each one is stored once
+        self.counterparties = []
+        self._counterparty_ids = {}
+        for transaction in transactions:
+            self.append(transaction)
+
+    @classmethod
+    def from_columns(cls, columns, counterparties=()):
+        # a history holding copies of already filled columns: a bytes-like
+        # object per name in COLUMNS, all with the same number of rows, and
+        # the account numbers the counterparty column refers to
+        history = cls()
+        rows = {}
+        for name, typecode in cls.COLUMNS.items():
+            rows[name] = array(typecode)
+            rows[name].frombytes(columns[name])
+        count = len(rows['code'])
+        if count:
+            history._columns, history._len, history._capacity = rows, count, count
+        history.counterparties = list(counterparties)
+        history._counterparty_ids = {number: i for i, number in enumerate(history.counterparties)}
+        return history
+
+    def _grow(self):
+        # double the capacity by copying into fresh arrays; growing the old
+        # arrays in place would fail while a view of them is still alive
+        self._capacity *= 2
+        for name, old in self._columns.items():
+            new = array(old.typecode, bytes(old.itemsize * self._capacity))
+            new[:self._len] = old[:self._len]
+            self._columns[name] = new
+
+    def _counterparty_id(self, recipient):
+        if recipient is None:
+            return -1
+        counterparty_id = self._counterparty_ids.get(recipient)
+        if counterparty_id is None:
+            counterparty_id = len(self.counterparties)
+            self.counterparties.append(recipient)
+            self._counterparty_ids[recipient] = counterparty_id
+        return counterparty_id
+
+    def append(self, transaction):
+        self.append_row(transaction.code, transaction.amount, transaction.balance_after,
+                        transaction.timestamp_ns, transaction.recipient)
+
+    def append_row(self, code, amount, balance_after, timestamp_ns, recipient=None):
+        if self._len == self._capacity:
+            self._grow()
+        i = self._len
+        columns = self._columns
+        columns['amount'][i] = amount
+        columns['balance_after'][i] = balance_after
+        columns['timestamp_ns'][i] = timestamp_ns
+        columns['code'][i] = code
+        columns['counterparty'][i] = self._counterparty_id(recipient)
+        self._len += 1
+
+    def _row(self, i):
+        columns = self._columns
+        counterparty = columns['counterparty'][i]
+        return Transaction(columns['code'][i], Money(columns['amount'][i]),
+                           None if counterparty < 0 else self.counterparties[counterparty],
+                           Money(columns['balance_after'][i]), columns['timestamp_ns'][i])
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._row(i) for i in range(*index.indices(self._len))]
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("history index out of range")
+        return self._row(index)
+
+    def truncate(self, rows):
+        # keep only the first rows
+        self._len = min(self._len, rows)
+
+    def __iter__(self):
+        for i in range(self._len):
+            yield self._row(i)
+
+    def view(self, name):
+        # zero-copy memoryview over the filled part of one column; it stays
+        # valid after later appends but won't see them
+        return memoryview(self._columns[name])[:self._len]
+
+    def views(self):
+        return {name: self.view(name) for name in self.COLUMNS}
+
+    def numpy(self, name):
+        if np is None:
+            raise RuntimeError("numpy is not installed")
+        return np.frombuffer(self.view(name), dtype=self.view(name).format)
+
+    def totals_by_type(self):
+        codes = self.view('code')
+        amounts = self.view('amount')
+        if np is not None:
+            code_array = np.frombuffer(codes, dtype=np.uint16)
+            amount_array = np.frombuffer(amounts, dtype=np.int64)
+            return {code: Money(int(amount_array[code_array == code].sum()))
+                    for code in np.unique(code_array).tolist()}
+        totals = {}
+        for code, amount in zip(codes, amounts):
+            totals[code] = totals.get(code, 0) + amount
+        return {code: Money(amount) for code, amount in totals.items()}
+
+
+def enable_columnar(account):
+    # switch one account over, keeping whatever history it already has
+    history = account['transaction_history']
+    if not isinstance(history, ColumnarHistory):
+        account['transaction_history'] = ColumnarHistory(history)
+    return account['transaction_history']
@@ -0,0 +1,345 @@
+# HTTP/JSON API for the ATM, using only the standard library.
+# Offers the same operations as the console, TUI and GUI programs. Requests
+# and replies are JSON objects. Amounts are decimal strings ("12.50") or
+# numbers, and balances come back as strings with two decimals.
+# Connections are kept alive (HTTP/1.1), so a client can send many
+# requests over one connection.
+#
+#   POST /accounts   {"name", "pin", "initial_deposit"}   {"account_number"}
+#   POST /login      {"account_number", "pin"}            {"token", "name"}
+#   POST /logout                                          {}
+#   GET  /balance                                         {"balance"}
+#   POST /deposit    {"amount"}                           {"balance"}
+#   POST /withdraw   {"amount"}                           {"balance"}
+#   POST /transfer   {"recipient", "amount"}              {"balance"}
+#   GET  /history?page=N                                  {"page", "pages", "transactions"}
+#   POST /pin        {"current_pin", "new_pin"}           {}
+#   POST /batch      [{"op": "deposit", "amount": ...}, ...]   {"results": [...]}
+#
+# Everything except /accounts and /login needs the login token in an
+# "Authorization: Bearer <token>" header. Errors are returned as
+# {"error": message} with a 4xx status.
+#
+# Each request that changes an account is made durable before the reply
+# is sent: one journal fsync (and storage flush) per request. /batch runs
+# a list of operations for the logged-in account in one round trip. It
+# takes the locks of every account in the batch once, in index order, and
+# commits once at the end. Each operation in a batch gets its own result,
+# either the reply object or {"error": message}, and a failed operation
+# doesn't stop the ones after it.
+#
+# Run: python http_api.py [--host HOST] [--port PORT] [--journal PATH]
+
+import argparse
+import json
+import secrets
+import sys
+import threading
+import time
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from journal import JournalInUse
+from money import MAX_CENTAVOS, Money
+from records import Account
+from registry import SNAPSHOT_EVERY, AccountRegistry
+from session import (AccountNotFound, InsufficientFunds, InvalidAmount, InvalidPin,
+                     NotLoggedIn, SameAccount, Session, SessionError, valid_amount, valid_name, valid_pin)
+
+JOURNAL_PATH = "./data/api.journal"
+MAX_BODY = 1 << 20
+
+
+class APIError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+ERRORS = [
+    (NotLoggedIn, 401, "not logged in"),
+    (InvalidAmount, 400, "invalid amount"),
+    (InsufficientFunds, 409, "insufficient funds"),
+    (AccountNotFound, 404, "recipient account not found"),
+    (SameAccount, 400, "cannot transfer to your own account"),
+    (InvalidPin, 400, "PIN must be 4 digits"),
+]
+
+
+def error_reply(error):
+    # (status, message) for an exception raised by an operation
+    if isinstance(error, APIError):
+        return error.status, str(error)
+    for kind, status, message in ERRORS:
+        if isinstance(error, kind):
+            return status, message
+    return 400, str(error)
+
+
+def parse_amount(value):
+    if isinstance(value, bool) or not isinstance(value, (str, int, Decimal)):
+        raise APIError("invalid amount")
+    try:
+        amount = Money.parse(str(value))
+    except ValueError:
+        raise APIError("invalid amount") from None
+    if abs(amount) > MAX_CENTAVOS:
+        raise APIError("invalid amount")
+    return amount
+
+
+def field(body, name):
+    if not isinstance(body, dict) or name not in body:
+        raise APIError(f"missing field {name}")
+    return body[name]
+
+
+def transaction_json(transaction):
+    return {
+        'type': transaction['type'],
+        'amount': f"{transaction['amount']:.2f}",
+        'timestamp': f"{transaction['timestamp']:%Y-%m-%d %H:%M:%S}",
+        'balance_after': f"{transaction['balance_after']:.2f}",
+        'recipient': transaction['recipient'],
+    }
+
+
+class ATMService:
+    # The operations behind the HTTP handler, kept apart from HTTP so they
+    # can be called directly. Logged-in sessions are kept by token and
+    # dropped after session_timeout seconds without a request.
+    def __init__(self, registry, session_timeout=900.0):
+        self.registry = registry
+        self.session_timeout = session_timeout
+        self._sessions = {}  # token -> [Session, last used]
+        self._lock = threading.Lock()
+        self.operations = {
+            'balance': self.balance,
+            'deposit': self.deposit,
+            'withdraw': self.withdraw,
+            'transfer': self.transfer,
+            'history': self.history,
+            'pin': self.change_pin,
+        }
+        self.writes = {'deposit', 'withdraw', 'transfer', 'pin'}
+
+    def create_account(self, body):
+        name, pin = str(field(body, 'name')).strip(), str(field(body, 'pin'))
+        amount = parse_amount(field(body, 'initial_deposit'))
+        if not valid_name(name):
+            raise APIError("invalid name")
+        if not valid_pin(pin):
+            raise InvalidPin(pin)
+        if not valid_amount(amount):
+            raise InvalidAmount(amount)
+        account = Account(self.registry.new_account_number(), name, pin, amount)
+        self.registry.append(account)
+        self.registry.commit()
+        return {'account_number': account['account_number']}
+
+    def login(self, body):
+        session = Session(self.registry)
+        if not session.login(str(field(body, 'account_number')), str(field(body, 'pin'))):
+            raise APIError("invalid account number or PIN", 401)
+        token = secrets.token_urlsafe(24)
+        now = time.monotonic()
+        with self._lock:
+            for old, (_, last_used) in list(self._sessions.items()):
+                if now - last_used > self.session_timeout:
+                    del self._sessions[old]
+            self._sessions[token] = [session, now]
+        return {'token': token, 'name': session.account['name']}
+
+    def logout(self, token):
+        with self._lock:
+            self._sessions.pop(token, None)
+        return {}
+
+    def session(self, token):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(token)
+            if entry is None or now - entry[1] > self.session_timeout:
+                self._sessions.pop(token, None)
+                raise NotLoggedIn("You are not logged in")
+            entry[1] = now
+            return entry[0]
+
+    def run(self, session, op, body):
+        # one operation, made durable before returning
+        result = self._run(session, op, body)
+        if op in self.writes:
+            self.registry.commit()
+        return result
+
+    def _run(self, session, op, body):
+        operation = self.operations.get(op)
+        if operation is None:
+            raise APIError(f"unknown operation {op}", 404)
+        return operation(session, body if body is not None else {})
+
+    def batch(self, session, operations):
+        # runs every operation under one lock acquisition and one commit
+        if not isinstance(operations, list):
+            raise APIError("batch must be a list of operations")
+        session.account  # raises NotLoggedIn
+        indices = [session.account_index]
+        for operation in operations:
+            if isinstance(operation, dict) and operation.get('op') == 'transfer':
+                index = self.registry.find(str(operation.get('recipient')))
+                if index is not None:
+                    indices.append(index)
+        results = []
+        with self.registry.locked(*indices):
+            for operation in operations:
+                try:
+                    results.append(self._run(session, field(operation, 'op'), operation))
+                except (APIError, SessionError) as e:
+                    results.append({'error': error_reply(e)[1]})
+                except ValueError:
+                    results.append({'error': "invalid request"})
+        self.registry.commit()
+        return {'results': results}
+
+    def balance(self, session, body):
+        return {'balance': f"{session.balance():.2f}"}
+
+    def deposit(self, session, body):
+        return {'balance': f"{session.deposit(parse_amount(field(body, 'amount'))):.2f}"}
+
+    def withdraw(self, session, body):
+        return {'balance': f"{session.withdraw(parse_amount(field(body, 'amount'))):.2f}"}
+
+    def transfer(self, session, body):
+        session.transfer(str(field(body, 'recipient')), parse_amount(field(body, 'amount')))
+        return {'balance': f"{session.balance():.2f}"}
+
+    def history(self, session, body):
+        page = body.get('page', 0)
+        if isinstance(page, str) and page.isdigit():
+            page = int(page)
+        if isinstance(page, bool) or not isinstance(page, int) or page < 0:
+            raise APIError("invalid page")
+        cursor = session.history()
+        return {'page': page, 'pages': cursor.page_count,
+                'transactions': [transaction_json(t) for t in cursor.page(page)]}
+
+    def change_pin(self, session, body):
+        if str(field(body, 'current_pin')) != session.account['pin']:
+            raise APIError("incorrect current PIN", 403)
+        session.change_pin(str(field(body, 'new_pin')))
+        return {}
+
+
+class APIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    # headers and body go out in separate writes; without TCP_NODELAY the
+    # body waits for the client's delayed ACK on every reply
+    disable_nagle_algorithm = True
+    service = None  # set by make_server
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def _handle(self, method):
+        url = urlsplit(self.path)
+        route = url.path.strip('/')
+        try:
+            body = self._read_body()
+            if method == 'GET':
+                if route not in ('balance', 'history'):
+                    raise APIError(f"no such endpoint {url.path}", 404)
+                body = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            status, reply = 200, self._route(route, body)
+        except (APIError, SessionError) as e:
+            status, message = error_reply(e)
+            reply = {'error': message}
+        except ValueError:
+            # a value the journal or storage can't hold; it is rejected
+            # before anything changes
+            status, reply = 400, {'error': "invalid request"}
+        self._send(status, reply)
+
+    def _route(self, route, body):
+        service = self.service
+        if route == 'accounts':
+            return service.create_account(body)
+        if route == 'login':
+            return service.login(body)
+        token = self._token()
+        if route == 'logout':
+            return service.logout(token)
+        session = service.session(token)
+        if route == 'batch':
+            return service.batch(session, body)
+        if route not in service.operations:
+            raise APIError(f"no such endpoint /{route}", 404)
+        return service.run(session, route, body)
+
+    def _token(self):
+        scheme, _, token = self.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not token:
+            raise NotLoggedIn("You are not logged in")
+        return token.strip()
+
+    def _read_body(self):
+        length = self.headers.get('Content-Length')
+        if not length:
+            return None
+        if not length.isdigit() or int(length) > MAX_BODY:
+            self.close_connection = True
+            raise APIError("request body too large", 413)
+        data = self.rfile.read(int(length))
+        try:
+            return json.loads(data, parse_float=Decimal) if data else None
+        except ValueError:
+            raise APIError("request body is not valid JSON") from None
+
+    def _send(self, status, reply):
+        data = json.dumps(reply).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(registry, host='127.0.0.1', port=8080, **options):
+    handler = type('Handler', (APIHandler,), {'service': ATMService(registry, **options)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ATM HTTP/JSON API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--session-timeout', type=float, default=900.0)
+    parser.add_argument('--journal', default=JOURNAL_PATH)
+    args = parser.parse_args()
+
+    accounts = AccountRegistry()
+    try:
+        accounts.attach_journal(args.journal, snapshot_every=SNAPSHOT_EVERY)
+    except JournalInUse as e:
+        sys.exit(str(e))
+    server = make_server(accounts, args.host, args.port, session_timeout=args.session_timeout)
+    print(f"ATM API listening on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# Streaming bulk account import from CSV or JSON Lines.
+# Each row describes one new account: name, pin and initial_deposit (CSV
+# with a header row, or one JSON object per line). The import is a chain
+# of generators:
+#
+#   read_csv / read_jsonl -> validate -> allocate -> chunks -> registry.extend
+#
+# so only one chunk of accounts is held by the pipeline at a time and the
+# input file is never read into memory as a whole; the accounts themselves
+# of course end up in the registry. Rows are checked the way the account
+# creation screens check them (name rules, 4-digit PIN, positive initial
+# deposit), and names and amounts must fit in the journal. Rejected rows don't stop the import: each one is written to
+# the error report (CSV: line, reason, row) as soon as it is found.
+#
+# Run: python importer.py <accounts.csv|accounts.jsonl|-> [--format csv|jsonl]
+#                         [--errors FILE] [--chunk-size N] [--journal PATH]
+
+import argparse
+import csv
+import json
+import sys
+import time
+from decimal import Decimal
+from itertools import islice
+
+from journal import MAX_FIELD_BYTES, JournalInUse
+from money import MAX_CENTAVOS, Money
+from records import Account
+from registry import SNAPSHOT_EVERY, AccountRegistry
+from session import valid_name, valid_pin
+
+JOURNAL_PATH = "./data/atm.journal"
+CHUNK_SIZE = 1000
+FIELDS = ('name', 'pin', 'initial_deposit')
+
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.rejected = 0
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        return (self.imported + self.rejected) / self.seconds if self.seconds else 0.0
+
+
+class ErrorReport:
+    # writes rejected rows to a CSV stream (or just counts them)
+    def __init__(self, stream=None):
+        self.count = 0
+        self._writer = None
+        if stream is not None:
+            self._writer = csv.writer(stream)
+            self._writer.writerow(('line', 'reason', 'row'))
+
+    def reject(self, line, reason, row):
+        self.count += 1
+        if self._writer is not None:
+            self._writer.writerow((line, reason, row if isinstance(row, str) else json.dumps(row, default=str)))
+
+
+def read_csv(stream):
+    # yields (line number, row dict)
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_jsonl(stream, errors):
+    # yields (line number, row dict); lines that aren't a JSON object are
+    # reported and skipped
+    for line, text in enumerate(stream, 1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text, parse_float=Decimal)
+        except ValueError:
+            errors.reject(line, "invalid JSON", text.rstrip('\n'))
+            continue
+        if not isinstance(row, dict):
+            errors.reject(line, "not a JSON object", text.rstrip('\n'))
+            continue
+        yield line, row
+
+
+def validate(rows, errors):
+    # yields (name, pin, initial deposit) for the rows that are valid
+    for line, row in rows:
+        missing = [field for field in FIELDS if row.get(field) in (None, '')]
+        if missing:
+            errors.reject(line, f"missing {', '.join(missing)}", row)
+            continue
+        name = str(row['name']).strip()
+        pin = str(row['pin']).strip()
+        if len(name.encode('utf-8')) > MAX_FIELD_BYTES:
+            errors.reject(line, "name too long", row)
+            continue
+        if not valid_name(name):
+            errors.reject(line, "invalid name", row)
+            continue
+        if not valid_pin(pin):
+            errors.reject(line, "PIN must be 4 digits", row)
+            continue
+        amount = row['initial_deposit']
+        try:
+            if isinstance(amount, (bool, float)):
+                raise ValueError(amount)
+            amount = Money.parse(str(amount))
+        except ValueError:
+            errors.reject(line, "invalid initial deposit", row)
+            continue
+        if amount <= 0:
+            errors.reject(line, "initial deposit must be positive", row)
+            continue
+        if amount > MAX_CENTAVOS:
+            errors.reject(line, "initial deposit too large", row)
+            continue
+        yield name, pin, amount
+
+
+def allocate(registry, rows):
+    # yields new Account records, each with a freshly allocated number
+    new_number = registry.new_account_number
+    for name, pin, amount in rows:
+        yield Account(new_number(), name, pin, amount)
+
+
+def chunks(items, size):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def import_accounts(registry, stream, file_format='csv', errors=None, chunk_size=CHUNK_SIZE, progress=None):
+    # imports every valid row; progress(result) is called after each chunk
+    errors = errors if errors is not None else ErrorReport()
+    result = ImportResult()
+    if file_format == 'csv':
+        rows = read_csv(stream)
+    elif file_format == 'jsonl':
+        rows = read_jsonl(stream, errors)
+    else:
+        raise ValueError(f"unknown format {file_format!r}")
+    start = time.perf_counter()
+    for chunk in chunks(allocate(registry, validate(rows, errors)), chunk_size):
+        registry.extend(chunk)
+        result.imported += len(chunk)
+        result.rejected = errors.count
+        result.seconds = time.perf_counter() - start
+        if progress is not None:
+            progress(result)
+    registry.commit()
+    result.rejected = errors.count
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import accounts from CSV or JSON Lines")
+    parser.add_argument('file', help="input file, or - for stdin")
+    parser.add_argument('--format', choices=('csv', 'jsonl'),
+                        help="default: from the file extension, csv for stdin")
+    parser.add_argument('--errors', help="write rejected rows to this CSV file")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--journal', default=JOURNAL_PATH)
+    args = parser.parse_args()
+
+    file_format = args.format or ('jsonl' if args.file.endswith(('.jsonl', '.ndjson')) else 'csv')
+    accounts = AccountRegistry()
+    try:
+        accounts.attach_journal(args.journal, snapshot_every=SNAPSHOT_EVERY)
+    except JournalInUse as e:
+        sys.exit(str(e))
+    stream = sys.stdin if args.file == '-' else open(args.file, newline='', encoding='utf-8')
+    error_file = open(args.errors, 'w', newline='', encoding='utf-8') if args.errors else None
+
+    def progress(result):
+        print(f"\r{result.imported:,} imported, {result.rejected:,} rejected, "
+              f"{result.rows_per_second:,.0f} rows/s", end='', file=sys.stderr)
+
+    try:
+        result = import_accounts(accounts, stream, file_format, ErrorReport(error_file), args.chunk_size, progress)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        if error_file is not None:
+            error_file.close()
+    print(file=sys.stderr)
+    print(f"Imported {result.imported:,} account(s) in {result.seconds:.2f} s "
+          f"({result.rows_per_second:,.0f} rows/s)")
+    if result.rejected:
+        print(f"{result.rejected:,} row(s) rejected" + (f", see {args.errors}" if args.errors else ""))
+    accounts.journal.close()
+
+
+if __name__ == "__main__":
+    main()
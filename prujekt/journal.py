@@ -0,0 +1,286 @@
+# Append-only transaction journal (write-ahead log).
+# Every account creation and every transaction (deposit, withdrawal, both
+# sides of a transfer, PIN change) is appended as one small binary record,
+# so the accounts can be rebuilt after the program exits.
+#
+# Record layout (little endian):
+#   header   <II   payload length, crc32 of payload
+#   payload  <BHqqq op, transaction code, amount, balance, timestamp ns
+#            then account number, counterparty, name and pin, each as a
+#            one-byte length followed by utf-8 bytes ('' when not used,
+#            so a name is kept as it was, '' included, and a missing
+#            counterparty reads back as None)
+# encode() raises ValueError for a string over MAX_FIELD_BYTES or a number
+# outside int64, so callers can encode before changing anything.
+#
+# sync modes:
+#   'always'  fsync after every record (safest, slowest)
+#   'group'   a background thread fsyncs every group_window seconds or
+#             once group_size records are pending, whichever comes first;
+#             callers that append with wait=True are fsynced right away,
+#             together with everyone else who arrived during the last fsync
+#   'none'    leave flushing to the OS
+#
+# Only one program may append to a journal at a time: Journal takes an
+# exclusive lock on the file and raises JournalInUse if another program
+# holds it. A second writer would move the end of the file under the
+# first one, whose next snapshot would then point into the middle of a
+# record.
+
+import atexit
+import fcntl
+import os
+import struct
+import threading
+import time
+import zlib
+
+from money import Money
+from records import Account, Transaction, TxType
+
+HEADER = struct.Struct('<II')
+FIELDS = struct.Struct('<BHqqq')
+
+OP_CREATE = 1
+OP_TRANSACTION = 2
+
+SYNC_MODES = ('always', 'group', 'none')
+MAX_FIELD_BYTES = 255
+MAX_PAYLOAD = FIELDS.size + 4 * (1 + MAX_FIELD_BYTES)
+
+
+class JournalInUse(Exception):
+    pass
+
+
+def _pack_str(value):
+    data = (value or '').encode('utf-8')
+    if len(data) > MAX_FIELD_BYTES:
+        raise ValueError(f"Journal field too long: {value!r}")
+    return bytes((len(data),)) + data
+
+
+def encode(op, code, amount, balance, timestamp_ns, account_number, counterparty=None, name=None, pin=None):
+    try:
+        fields = FIELDS.pack(op, code, amount, balance, timestamp_ns)
+    except struct.error:
+        raise ValueError(f"Journal field out of range: amount {amount}, balance {balance}") from None
+    payload = b''.join((fields, _pack_str(account_number), _pack_str(counterparty),
+                        _pack_str(name), _pack_str(pin)))
+    return HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decode(payload):
+    op, code, amount, balance, timestamp_ns = FIELDS.unpack_from(payload)
+    strings = []
+    pos = FIELDS.size
+    for _ in range(4):
+        size = payload[pos]
+        strings.append(bytes(payload[pos + 1:pos + 1 + size]).decode('utf-8'))
+        pos += 1 + size
+    account_number, counterparty, name, pin = strings
+    return op, code, amount, balance, timestamp_ns, account_number, counterparty or None, name, pin
+
+
+def create_record(account):
+    return encode(OP_CREATE, 0, 0, account['balance'], time.time_ns(),
+                  account['account_number'], None, account['name'], account['pin'])
+
+
+def transaction_record(account, transaction):
+    pin = account['pin'] if transaction.code == TxType.PIN_CHANGE else None
+    return encode(OP_TRANSACTION, transaction.code, transaction.amount, transaction.balance_after,
+                  transaction.timestamp_ns, account['account_number'], transaction.recipient, None, pin)
+
+
+def read_records(path, offset=0):
+    # yields (end_offset, record) for every complete record after offset;
+    # a torn or corrupt record at the tail (crash mid-write) ends the scan
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while True:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            size, crc = HEADER.unpack(header)
+            payload = f.read(size)
+            if len(payload) < size or zlib.crc32(payload) != crc:
+                return
+            offset += HEADER.size + size
+            yield offset, decode(payload)
+
+
+def torn_tail(path, offset):
+    # True if the data after offset (where read_records() stopped) is one
+    # record cut short by a crash, running to the end of the file. Anything
+    # else there (a bad record with more data after it, or an offset that
+    # isn't on a record boundary) is damage that truncating would make worse.
+    with open(path, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(offset)
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return True
+    length, _ = HEADER.unpack(header)
+    return length <= MAX_PAYLOAD and offset + HEADER.size + length >= size
+
+
+def apply_record(registry, record):
+    op, code, amount, balance, timestamp_ns, account_number, counterparty, name, pin = record
+    if op == OP_CREATE:
+        registry.append(Account(account_number, name, pin, Money(balance)), log=False)
+        return
+    index = registry.index_of(account_number)
+    if index is None:
+        return
+    account = registry[index]
+    account['balance'] = Money(balance)
+    if code == TxType.PIN_CHANGE:
+        account['pin'] = pin
+    registry.restore(index, Transaction(code, Money(amount), counterparty, Money(balance), timestamp_ns))
+
+
+def replay(registry, path, offset=0):
+    # applies every record after offset, returns the offset to resume from
+    for offset, record in read_records(path, offset):
+        apply_record(registry, record)
+    return offset
+
+
+class Journal:
+    def __init__(self, path, sync='group', group_window=0.005, group_size=256):
+        if sync not in SYNC_MODES:
+            raise ValueError(f"sync must be one of {SYNC_MODES}")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.sync_mode = sync
+        self.group_window = group_window
+        self.group_size = group_size
+        self._file = open(path, 'ab')
+        try:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._file.close()
+            raise JournalInUse(f"{path} is in use by another program") from None
+        self._lock = threading.Lock()
+        self._synced = threading.Condition(self._lock)
+        self.written = self._file.tell()  # offset after the last record
+        self.durable = self.written       # offset known to be on disk
+        self._pending = 0
+        self._waiters = 0
+        self.fsyncs = 0
+        self._closed = False
+        self._flusher = None
+        if sync == 'group':
+            self._flusher = threading.Thread(target=self._group_commit, daemon=True)
+            self._flusher.start()
+        atexit.register(self.close)
+
+    def append(self, record, wait=False):
+        # returns the offset just after the record; with wait=True it only
+        # returns once that offset is on disk
+        return self._append(record, 1, wait)
+
+    def append_many(self, records, wait=False):
+        # several records in one write, e.g. all the rows of a batch
+        records = list(records)
+        return self._append(b''.join(records), len(records), wait)
+
+    def _append(self, data, count, wait):
+        with self._lock:
+            if self._closed:
+                raise ValueError("Journal is closed")
+            self._file.write(data)
+            self.written += len(data)
+            lsn = self.written
+            if self.sync_mode == 'always':
+                self._fsync()
+            elif self.sync_mode == 'group':
+                self._pending += count
+                if self._pending >= self.group_size:
+                    self._synced.notify_all()
+                if wait:
+                    self._waiters += 1
+                    self._synced.notify_all()
+                    while self.durable < lsn:
+                        self._synced.wait()
+                    self._waiters -= 1
+            else:
+                self._file.flush()
+        return lsn
+
+    def truncate(self, offset):
+        # cuts the file back to offset, e.g. to drop a torn record at the tail
+        with self._lock:
+            self._file.flush()
+            os.ftruncate(self._file.fileno(), offset)
+            self.written = self.durable = offset
+
+    def log_create(self, account, wait=False):
+        return self.append(create_record(account), wait)
+
+    def log_transaction(self, account, transaction, wait=False):
+        return self.append(transaction_record(account, transaction), wait)
+
+    def _fsync(self):
+        # caller holds self._lock
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.fsyncs += 1
+        self.durable = self.written
+        self._pending = 0
+        self._synced.notify_all()
+
+    def _group_commit(self):
+        with self._lock:
+            while not self._closed:
+                idle = self.written == self.durable
+                if idle or (not self._waiters and self._pending < self.group_size):
+                    self._synced.wait(self.group_window)
+                if self._closed or self.written == self.durable:
+                    continue
+                # fsync without holding the lock so appends can keep
+                # filling the next group meanwhile
+                target = self.written
+                self._file.flush()
+                self._pending = 0
+                self._lock.release()
+                try:
+                    os.fsync(self._file.fileno())
+                finally:
+                    self._lock.acquire()
+                self.fsyncs += 1
+                self.durable = max(self.durable, target)
+                self._synced.notify_all()
+
+    def sync(self):
+        # returns once everything appended so far is on disk; in 'group'
+        # mode concurrent callers share the flusher's next fsync
+        with self._lock:
+            if self._closed or self.written <= self.durable:
+                return
+            if self.sync_mode != 'group':
+                self._fsync()
+                return
+            lsn = self.written
+            self._waiters += 1
+            self._synced.notify_all()
+            while self.durable < lsn:
+                self._synced.wait()
+            self._waiters -= 1
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._synced.notify_all()
+        if self._flusher is not None:
+            self._flusher.join()
+        with self._lock:
+            if self.written > self.durable:
+                self._fsync()
+            self._file.close()
+        atexit.unregister(self.close)
@@ -0,0 +1,37 @@
+# UI latency log.
+# The GUI records how long each action keeps the Tk main thread busy
+# before the customer gets an answer: from the moment the action starts
+# (after the form is validated) until just before the confirmation dialog
+# is opened. The dialog is modal, so the time it stays open is the
+# customer's, not the GUI's, and isn't counted. This lets changes that
+# move work off the main thread be measured. summary() gives the count,
+# median, 99th percentile and worst case per action.
+
+import time
+from contextlib import contextmanager
+
+
+class LatencyLog:
+    def __init__(self):
+        self.samples = {}  # action -> list of seconds
+
+    def record(self, action, seconds):
+        self.samples.setdefault(action, []).append(seconds)
+
+    @contextmanager
+    def measure(self, action):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(action, time.perf_counter() - start)
+
+    def summary(self):
+        lines = []
+        for action, samples in sorted(self.samples.items()):
+            samples = sorted(samples)
+            p50 = samples[len(samples) // 2]
+            p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+            lines.append(f"{action:>12}: {len(samples):6,} x  p50 {p50 * 1000:7.2f} ms  "
+                         f"p99 {p99 * 1000:7.2f} ms  max {samples[-1] * 1000:7.2f} ms")
+        return "\n".join(lines)
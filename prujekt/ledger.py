@@ -0,0 +1,196 @@
+# Memory-mapped ledger files for long transaction histories.
+# A ledger keeps one account's history on disk as fixed-width rows, so row
+# i always starts at HEADER_SIZE + i * ROW.size. Reads go straight to the
+# mmap with struct.unpack_from and only the rows asked for are turned into
+# Transaction records; showing one page of a 500,000 entry history touches
+# one page worth of the file.
+# A Ledger behaves like the history list (append, len, indexing, slicing,
+# iteration), so it can be used as an account's transaction_history.
+# Ledgers outlive the program: an account restored from the journal, a
+# snapshot or a storage reopens its ledger and only appends the rows the
+# file is missing.
+# An open ledger holds two file descriptors (its file and its mapping), so
+# at most MAX_OPEN ledgers are open at a time; the least recently used one
+# is closed when another has to be opened, and reopened when it's next used.
+#
+# File layout (little endian):
+#   MAGIC
+#   rows   timestamp ns, amount, balance after, transaction code,
+#          counterparty account number (ascii, zero padded)
+
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+from money import Money
+from records import Transaction
+
+MAGIC = b'ATMLEDG\x01'
+HEADER_SIZE = len(MAGIC)
+ROW = struct.Struct('<qqqH16s')
+TIMESTAMP = struct.Struct('<q')  # first field of ROW
+MAX_OPEN = 128
+
+# every ledger with an open file, least recently used first; the lock
+# guards this and all opening, closing, writing and mapping of ledger files
+_open = OrderedDict()
+_lock = threading.RLock()
+
+
+class Ledger:
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._file = None
+        self._mm = None
+        self._mapped = 0  # rows covered by the current mapping
+        with _lock:
+            f = self._open_file()
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                f.write(MAGIC)
+                f.flush()
+                size = HEADER_SIZE
+            else:
+                f.seek(0)
+                if f.read(HEADER_SIZE) != MAGIC:
+                    self.close()
+                    raise ValueError(f"{path} is not a ledger file")
+            # drop a partly written row at the end so new rows stay aligned
+            self._len = (size - HEADER_SIZE) // ROW.size
+            if size > HEADER_SIZE + self._len * ROW.size:
+                f.truncate(HEADER_SIZE + self._len * ROW.size)
+
+    def _open_file(self):
+        # the ledger's file, reopened if it was closed to make room for
+        # others; caller holds _lock
+        if self._file is not None:
+            _open.move_to_end(self)
+            return self._file
+        self._file = open(self.path, 'a+b')
+        _open[self] = None
+        if len(_open) > MAX_OPEN:
+            oldest, _ = _open.popitem(last=False)
+            oldest._release()
+        return self._file
+
+    def _release(self):
+        # caller holds _lock; views of the old mapping keep it alive
+        self._file.close()
+        self._file = None
+        self._mm = None
+        self._mapped = 0
+
+    def _map(self):
+        # (re)map the file once rows were appended after the last mapping;
+        # the old mapping is left to close itself once no view uses it
+        with _lock:
+            f = self._open_file()
+            if self._mapped < self._len:
+                f.flush()
+                self._mm = mmap.mmap(f.fileno(), HEADER_SIZE + self._len * ROW.size, access=mmap.ACCESS_READ)
+                self._mapped = self._len
+            return self._mm
+
+    def append(self, transaction):
+        self.append_row(transaction.code, transaction.amount, transaction.balance_after,
+                        transaction.timestamp_ns, transaction.recipient)
+
+    def append_row(self, code, amount, balance_after, timestamp_ns, recipient=None):
+        with _lock:
+            self._open_file().write(ROW.pack(timestamp_ns, amount, balance_after, code,
+                                             (recipient or '').encode('ascii')))
+            self._len += 1
+
+    def truncate(self, rows):
+        # keep only the first rows
+        with _lock:
+            if rows < self._len:
+                self._open_file().truncate(HEADER_SIZE + rows * ROW.size)
+                self._len = rows
+                self._mm = None
+                self._mapped = 0
+
+    def _row(self, mm, i):
+        timestamp_ns, amount, balance_after, code, counterparty = ROW.unpack_from(mm, HEADER_SIZE + i * ROW.size)
+        counterparty = counterparty.rstrip(b'\0')
+        return Transaction(code, Money(amount), counterparty.decode('ascii') if counterparty else None,
+                           Money(balance_after), timestamp_ns)
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            rows = range(*index.indices(self._len))
+            if not rows:
+                return []
+            mm = self._map()
+            return [self._row(mm, i) for i in rows]
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("ledger index out of range")
+        return self._row(self._map(), index)
+
+    def __iter__(self):
+        # decodes one row at a time instead of building the whole list
+        if not self._len:
+            return
+        mm = self._map()
+        for i in range(self._len):
+            yield self._row(mm, i)
+
+    def page(self, number, size=10):
+        # rows [number * size, (number + 1) * size)
+        start = number * size
+        return self[start:start + size]
+
+    def timestamp_ns(self, index):
+        # one field of one row, for searching by time without decoding rows
+        return TIMESTAMP.unpack_from(self._map(), HEADER_SIZE + index * ROW.size)[0]
+
+    def view(self):
+        # zero-copy memoryview over the raw rows
+        if not self._len:
+            return memoryview(b'')
+        return memoryview(self._map())[HEADER_SIZE:HEADER_SIZE + self._len * ROW.size]
+
+    def flush(self):
+        with _lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        # a closed ledger is reopened if it is used again
+        with _lock:
+            if self._file is not None:
+                del _open[self]
+                self._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def enable_ledger(account, path, reopen=True):
+    # move one account's history into a ledger file. With reopen (an
+    # account restored from the journal, a snapshot or a storage) the file
+    # an earlier run left is kept and only the rows it lacks are appended;
+    # otherwise (a new account) any old file is replaced.
+    history = account['transaction_history']
+    if not isinstance(history, Ledger):
+        if not reopen and os.path.exists(path):
+            os.remove(path)
+        ledger = Ledger(path)
+        for transaction in history[len(ledger):]:
+            ledger.append(transaction)
+        ledger.flush()
+        account['transaction_history'] = ledger
+    return account['transaction_history']
@@ -20,61 +20,54 @@ Make sure po to run this installation sa kahit anong terminal, before running th
 # Nicolas, Yangel Mica P.
 # San Jose, Laurice Ann DC.
 
-import random, os, sys, time
+import base64, os, sys, time
 import tkinter as tk
 import ttkbootstrap as tbs
-from tkinter import ttk, messagebox
-from datetime import datetime
-from PIL import Image, ImageDraw, ImageFont
+from tkinter import ttk, messagebox, filedialog
 from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
 from rich.align import Align
 from rich.text import Text
-from rich.prompt import Prompt, FloatPrompt
+from rich.prompt import Prompt, PromptBase
 from rich.style import Style
+from registry import SNAPSHOT_EVERY, AccountRegistry
+from journal import JournalInUse
+from money import Money
+from records import Account, TxType
+from session import AccountNotFound, InsufficientFunds, InvalidAmount, SameAccount, Session, valid_amount, valid_name, valid_pin
+from timeline import balance_at, day_range, parse_date, to_ns
+from statement import FORMATS, account_rows, export_file, statement_path
+from storage import SQLiteStorage
+from receipt_model import ReceiptPrinter, RichSink, TextSink, latest
+from receipt import ReceiptCache, ReceiptWorker, load_fonts, receipt_filename
+from archive import ReceiptArchive
+from latency import LatencyLog
 
 # --- Shared Data and Functions ---
-accounts = []
-current_account_index = None
+class MoneyPrompt(PromptBase):
+    # like FloatPrompt, but returns exact centavos
+    response_type = Money
+    validate_error_message = "[prompt.invalid]Please enter a valid amount"
+
+accounts = AccountRegistry()
+JOURNAL_PATH = "./data/atm.journal"
+RECEIPT_POLL_MS = 100
+# receipts aren't kept as files; the ones viewed are cached as PNG bytes
+# and archived (see archive.py) so each is rendered only once
+receipt_cache = ReceiptCache(256)
+RECEIPT_ARCHIVE_DIR = "./data/receipts"
+DATABASE_PATH = "./data/atm.sqlite3"
+STORAGE_BACKEND = "journal"  # "sqlite" lets several ATM programs share the same accounts
+# console receipts; none at all in batch mode (ATM_BATCH=1)
+receipts = ReceiptPrinter(TextSink())
 
 def generate_account_number():
-    while True:
-        acc_num = str(random.randint(1, 20))
-        if not any(account['account_number'] == acc_num for account in accounts):
-            return acc_num
-
-def add_transaction(account_index, transaction_type, amount, recipient=None):
-    timestamp = datetime.now()
-    transaction = {
-        'type': transaction_type,
-        'amount': amount,
-        'timestamp': timestamp,
-        'recipient': recipient,
-        'balance_after': accounts[account_index]['balance']
-    }
-    accounts[account_index]['transaction_history'].append(transaction)
-
-def generate_receipt(transaction_type, account, amount=None, recipient=None):
-    print("\n" + "=" * 40)
-    print(f"{'TRANSACTION RECEIPT':^40}")
-    print("=" * 40)
-    print(f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"Transaction Type: {transaction_type}")
-    print(f"Account Number: {account['account_number']}")
-    print(f"Account Holder: {account['name']}")
+    return accounts.new_account_number()
 
-    if amount is not None:
-        print(f"Amount: ₱{amount:.2f}")
-
-    if recipient:
-        print(f"Recipient Account: {recipient['account_number']}")
-        print(f"Recipient Name: {recipient['name']}")
-
-    print(f"Current Balance: ₱{account['balance']:.2f}")
-    print("=" * 40)
-    print("Thank you for banking with us!")
-    print("=" * 40 + "\n")
+def generate_receipt(transaction_type, account, amount=None, recipient=None, transaction=None):
+    # transaction: the one the operation just committed, if any
+    receipts.print(transaction_type, account, amount, recipient, transaction)
 
 
 # --- (Rich) CUI Interface or TUI (Text-based User Interface) ---
@@ -104,73 +97,112 @@ def run_tui():
             console.print(Panel(message))
         time.sleep(1.5)
 
-    def generate_receipt_tui(transaction_type, account, amount=None, recipient=None):
-        receipt = Table(show_header=False, border_style="blue")
-        receipt.add_column("Key", style="cyan")
-        receipt.add_column("Value", style="yellow")
+    receipts_tui = ReceiptPrinter(RichSink(console))
 
-        receipt.add_row("TRANSACTION RECEIPT", "")
-        receipt.add_row("Date", datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-        receipt.add_row("Transaction Type", transaction_type)
-        receipt.add_row("Account Number", account['account_number'])
-        receipt.add_row("Account Holder", account['name'])
+    def generate_receipt_tui(transaction_type, account, amount=None, recipient=None, transaction=None):
+        if receipts_tui.print(transaction_type, account, amount, recipient, transaction) is not None:
+            input("\nPress Enter to continue...")
 
-        if amount is not None:
-            receipt.add_row("Amount", f"₱{amount:,.2f}")
+    def view_transaction_history_tui(session):
+        if not session.logged_in:
+            display_message("You are not logged in.", "error")
+            return
 
-        if recipient:
-            receipt.add_row("Recipient Account", recipient['account_number'])
-            receipt.add_row("Recipient Name", recipient['name'])
+        clear_screen()
+        display_header("Transaction History")
 
-        receipt.add_row("Current Balance", f"₱{account['balance']:,.2f}")
+        account = session.account
+        console.print("[blue]Enter a date range (YYYY-MM-DD), or leave blank to show everything.")
+        try:
+            start_date = parse_date(Prompt.ask("[blue]From date", default="", show_default=False))
+            end_date = parse_date(Prompt.ask("[blue]To date", default="", show_default=False))
+        except ValueError:
+            display_message("Invalid date. Please use YYYY-MM-DD.", "error")
+            return
+        start, end = day_range(start_date, end_date)
+        cursor = session.history(start, end)
 
-        console.print(Panel(receipt, title="Receipt", border_style="blue", padding=(1, 2)))
-        input("\nPress Enter to continue...")
+        while True:
+            table = Table(show_header=True, header_style="bold magenta")
+            table.add_column("Type")
+            table.add_column("Amount")
+            table.add_column("Date")
+            table.add_column("Balance After")
+            table.add_column("Recipient")
+
+            # newest first, one page at a time
+            for transaction in cursor.page():
+                table.add_row(
+                    transaction['type'],
+                    f"₱{transaction['amount']:,.2f}",
+                    transaction['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
+                    f"₱{transaction['balance_after']:,.2f}",
+                    transaction['recipient'] if transaction['recipient'] else "-"
+                )
+
+            caption = f"Page {cursor.page_number + 1} of {cursor.page_count}"
+            if end is not None:
+                caption += f" | Balance at end of {end_date}: ₱{balance_at(account, to_ns(end) - 1):,.2f}"
+            table.caption = caption
+
+            clear_screen()
+            display_header("Transaction History")
+            console.print(Panel(table, border_style="blue", padding=(1, 2)))
+            if cursor.page_count == 1:
+                input("\nPress Enter to continue...")
+                return
+
+            choice = Prompt.ask("[blue]N = next page, P = previous page, Enter = back",
+                                default="", show_default=False).strip().upper()
+            if choice == "N":
+                cursor.next()
+            elif choice == "P":
+                cursor.previous()
+            elif choice == "":
+                return
 
-    def view_transaction_history_tui():
-        if current_account_index is None:
+    def export_statement_tui(session):
+        if not session.logged_in:
             display_message("You are not logged in.", "error")
             return
 
         clear_screen()
-        display_header("Transaction History")
+        display_header("Export Statement")
 
-        table = Table(show_header=True, header_style="bold magenta")
-        table.add_column("Type")
-        table.add_column("Amount")
-        table.add_column("Date")
-        table.add_column("Balance After")
-        table.add_column("Recipient")
-
-        for transaction in accounts[current_account_index]['transaction_history']:
-            table.add_row(
-                transaction['type'],
-                f"₱{transaction['amount']:,.2f}",
-                transaction['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
-                f"₱{transaction['balance_after']:,.2f}",
-                transaction['recipient'] if transaction['recipient'] else "-"
-            )
-
-        console.print(Panel(table, border_style="blue", padding=(1, 2)))
-        input("\nPress Enter to continue...")
+        account = session.account
+        console.print("[blue]Enter a date range (YYYY-MM-DD), or leave blank to export everything.")
+        try:
+            start_date = parse_date(Prompt.ask("[blue]From date", default="", show_default=False))
+            end_date = parse_date(Prompt.ask("[blue]To date", default="", show_default=False))
+        except ValueError:
+            display_message("Invalid date. Please use YYYY-MM-DD.", "error")
+            return
+        file_format = Prompt.ask("[blue]Format", choices=list(FORMATS), default="csv")
+        start, end = day_range(start_date, end_date)
+        path = statement_path(account, file_format)
+        try:
+            with console.status("Exporting..."):
+                count = export_file(path, account_rows(account, start, end), file_format)
+        except OSError as e:
+            display_message(f"Could not write the statement: {e}", "error")
+            return
+        display_message(f"Exported {count:,} transaction(s) to {path}", "success")
 
     def login_tui():
-        global current_account_index
+        # returns the new Session, or None if the login failed
         clear_screen()
         display_header("Login")
 
         account_number = Prompt.ask("[blue]Enter account number")
         pin = Prompt.ask("[blue]Enter PIN", password=True)
 
-        for i, account in enumerate(accounts):
-            if account['account_number'] == account_number and account['pin'] == pin:
-                current_account_index = i
-                display_message(f"Welcome, {account['name']}!", "success")
-                return True
+        session = Session(accounts)
+        if session.login(account_number, pin):
+            display_message(f"Welcome, {session.account['name']}!", "success")
+            return session
 
         display_message("Invalid account number or PIN.", "error")
-        current_account_index = None
-        return False
+        return None
 
     def display_menu(title, options):
         clear_screen()
@@ -205,11 +237,14 @@ def run_tui():
             if '..' in name or '  ' in name:
                 display_message("Name cannot contain consecutive dots or spaces.", "error")
                 continue
+            if not valid_name(name):
+                display_message("Name is too long.", "error")
+                continue
             break
 
         while True:
             pin = Prompt.ask("[blue]Create a 4-digit PIN [red](hidden)", password=True)
-            if len(pin) != 4 or not pin.isdigit():
+            if not valid_pin(pin):
                 display_message("Invalid PIN. Please enter 4 digits.", "error")
                 continue
                 
@@ -220,34 +255,29 @@ def run_tui():
             break
 
         while True:
-            initial_deposit = FloatPrompt.ask("[blue]Enter initial deposit amount (₱)")
-            if initial_deposit > 0:
+            initial_deposit = MoneyPrompt.ask("[blue]Enter initial deposit amount (₱)")
+            if valid_amount(initial_deposit):
                 break
-            else: 
+            elif initial_deposit <= 0:
                 display_message("Initial deposit must be positive", "error")
-                continue
+            else:
+                display_message("Initial deposit is too large", "error")
 
-        account = {
-            'account_number': generate_account_number(),
-            'name': name,
-            'pin': pin,
-            'balance': initial_deposit,
-            'transaction_history': []
-        }
+        account = Account(generate_account_number(), name, pin, initial_deposit)
 
         accounts.append(account)
         display_message(f"Account created successfully!\nYour account number is: {account['account_number']} \nMake sure to remember this!", "success")
         generate_receipt_tui("ACCOUNT CREATION", account, initial_deposit)
 
-    def check_balance_tui():
-        if current_account_index is None:
+    def check_balance_tui(session):
+        if not session.logged_in:
             display_message("You are not logged in.", "error")
             return
 
         clear_screen()
         display_header("Balance Inquiry")
 
-        account = accounts[current_account_index]
+        account = session.account
         balance_table = Table(show_header=False, border_style="blue")
         balance_table.add_column("Key", style="cyan")
         balance_table.add_column("Value", style="yellow")
@@ -259,47 +289,47 @@ def run_tui():
         console.print(Panel(balance_table, border_style="blue", padding=(1, 2)))
         input("\nPress Enter to continue...")
 
-    def deposit_tui():
-        if current_account_index is None:
+    def deposit_tui(session):
+        if not session.logged_in:
             display_message("You are not logged in.", "error")
             return
 
         clear_screen()
         display_header("Deposit")
 
-        amount = FloatPrompt.ask("[blue]Enter deposit amount (₱)")
-        if amount <= 0:
+        amount = MoneyPrompt.ask("[blue]Enter deposit amount (₱)")
+        try:
+            session.deposit(amount)
+        except InvalidAmount:
             display_message("Invalid amount.", "error")
             return
 
-        accounts[current_account_index]['balance'] += amount
-        add_transaction(current_account_index, "DEPOSIT", amount)
-        display_message(f"Deposit successful.\nNew balance: ₱{accounts[current_account_index]['balance']:,.2f}", "success")
-        generate_receipt_tui("DEPOSIT", accounts[current_account_index], amount)
+        display_message(f"Deposit successful.\nNew balance: ₱{session.account['balance']:,.2f}", "success")
+        generate_receipt_tui("DEPOSIT", session.account, amount, transaction=latest(session.account))
 
-    def withdraw_tui():
-        if current_account_index is None:
+    def withdraw_tui(session):
+        if not session.logged_in:
             display_message("You are not logged in.", "error")
             return
 
         clear_screen()
         display_header("Withdrawal")
 
-        amount = FloatPrompt.ask("[blue]Enter withdrawal amount (₱)")
-        if amount <= 0:
+        amount = MoneyPrompt.ask("[blue]Enter withdrawal amount (₱)")
+        try:
+            session.withdraw(amount)
+        except InvalidAmount:
             display_message("Invalid amount.", "error")
             return
-        if amount > accounts[current_account_index]['balance']:
+        except InsufficientFunds:
             display_message("Insufficient funds.", "error")
             return
 
-        accounts[current_account_index]['balance'] -= amount
-        add_transaction(current_account_index, "WITHDRAWAL", amount)
-        display_message(f"Withdrawal successful.\nNew balance: ₱{accounts[current_account_index]['balance']:,.2f}", "success")
-        generate_receipt_tui("WITHDRAWAL", accounts[current_account_index], amount)
+        display_message(f"Withdrawal successful.\nNew balance: ₱{session.account['balance']:,.2f}", "success")
+        generate_receipt_tui("WITHDRAWAL", session.account, amount, transaction=latest(session.account))
 
-    def transfer_tui():
-        if current_account_index is None:
+    def transfer_tui(session):
+        if not session.logged_in:
             display_message("You are not logged in.", "error")
             return
 
@@ -307,49 +337,39 @@ def run_tui():
         display_header("Transfer")
 
         recipient_acc = Prompt.ask("[blue]Enter recipient's account number")
-        recipient_index = None
-
-        if recipient_acc == accounts[current_account_index]['account_number']:
+        if recipient_acc == session.account['account_number']:
             display_message("Can't be transferred in own account", "error")
             return
 
-        for i, account in enumerate(accounts):
-            if account['account_number'] == recipient_acc:
-                recipient_index = i
-                break
-
-        if recipient_index is None:
+        if accounts.find(recipient_acc) is None:
             display_message("Recipient account not found.", "error")
             return
 
-        amount = FloatPrompt.ask("[blue]Enter transfer amount (₱)")
-        if amount <= 0:
+        amount = MoneyPrompt.ask("[blue]Enter transfer amount (₱)")
+        try:
+            recipient = session.transfer(recipient_acc, amount)
+        except InvalidAmount:
             display_message("Invalid amount.", "error")
             return
-        if amount > accounts[current_account_index]['balance']:
+        except InsufficientFunds:
             display_message("Insufficient funds.", "error")
             return
+        except SameAccount:
+            display_message("Can't be transferred in own account", "error")
+            return
 
-        # Perform transfer
-        accounts[current_account_index]['balance'] -= amount
-        accounts[recipient_index]['balance'] += amount
-
-        # Record transactions for both accounts
-        add_transaction(current_account_index, "TRANSFER", amount, recipient_acc)
-        add_transaction(recipient_index, "TRANSFER RECEIVED", amount, accounts[current_account_index]['account_number'])
-
-        display_message(f"Transfer successful.\nNew balance: ₱{accounts[current_account_index]['balance']:,.2f}", "success")
-        generate_receipt_tui("TRANSFER", accounts[current_account_index], amount, accounts[recipient_index])
+        display_message(f"Transfer successful.\nNew balance: ₱{session.account['balance']:,.2f}", "success")
+        generate_receipt_tui("TRANSFER", session.account, amount, recipient, transaction=latest(session.account))
 
-    def change_pin_tui():
-        if current_account_index is None:
+    def change_pin_tui(session):
+        if not session.logged_in:
             display_message("You are not logged in.", "error")
             return
 
         clear_screen()
         display_header("Change PIN")
 
-        account = accounts[current_account_index]
+        account = session.account
         current_pin = Prompt.ask("[blue]Enter your current PIN", password=True)
 
         if current_pin != account['pin']:
@@ -358,7 +378,7 @@ def run_tui():
 
         while True:
             new_pin = Prompt.ask("[blue]Enter your new 4-digit PIN", password=True)
-            if len(new_pin) != 4 or not new_pin.isdigit():
+            if not valid_pin(new_pin):
                 display_message("Invalid PIN. Please enter 4 digits.", "error")
                 continue
 
@@ -368,10 +388,9 @@ def run_tui():
                 continue
             break
 
-        account['pin'] = new_pin
-        add_transaction(current_account_index, "PIN CHANGE", 0)
+        session.change_pin(new_pin)
         display_message("PIN changed successfully.", "success")
-        generate_receipt_tui("PIN CHANGE", account)
+        generate_receipt_tui("PIN CHANGE", account, transaction=latest(account))
 
 
     while True:
@@ -386,7 +405,8 @@ def run_tui():
         if choice == "1":
             create_account_tui()
         elif choice == "2":
-            if login_tui():
+            session = login_tui()
+            if session:
                 while True:
                     logged_in_options = {
                         "1": "Check Balance",
@@ -395,26 +415,28 @@ def run_tui():
                         "4": "Transfer",
                         "5": "Transaction History",
                         "6": "Change PIN",
-                        "7": "Logout"
+                        "7": "Export Statement",
+                        "8": "Logout"
                     }
 
                     operation = display_menu("Main Menu", logged_in_options)
 
                     if operation == "1":
-                        check_balance_tui()
+                        check_balance_tui(session)
                     elif operation == "2":
-                        deposit_tui()
+                        deposit_tui(session)
                     elif operation == "3":
-                        withdraw_tui()
+                        withdraw_tui(session)
                     elif operation == "4":
-                        transfer_tui()
+                        transfer_tui(session)
                     elif operation == "5":
-                        view_transaction_history_tui()
+                        view_transaction_history_tui(session)
                     elif operation == "6":
-                        change_pin_tui()
+                        change_pin_tui(session)
                     elif operation == "7":
-                        global current_account_index
-                        current_account_index = None
+                        export_statement_tui(session)
+                    elif operation == "8":
+                        session.logout()
                         display_message("Logged out successfully.", "success")
                         break
             else:
@@ -431,6 +453,15 @@ class ATMGui:
         self.root.geometry("600x600")
         self.center_window()
 
+        # each window serves its own customer
+        self.session = Session(accounts)
+        # find the receipt fonts now rather than on the first receipt
+        load_fonts()
+        # receipts are rendered and saved on a background thread; the Tk
+        # thread picks up the finished ones in poll_receipts()
+        self.receipts = ReceiptWorker()
+        self.latency = LatencyLog()  # ATM_UI_LATENCY=1 prints it on exit
+
         self.button_pady = 7.5
         
         self.main_frame = ttk.Frame(root, padding="10")
@@ -453,7 +484,17 @@ class ATMGui:
                              font=('Segoe UI Variable Text Semibold', 9))
         self.style.map("TButton", background=[('active', '#75D1C5')])
 
-        self.init_frames()
+        self.status_label = ttk.Label(root, text="")
+        self.status_label.grid(row=1, column=0, pady=5)
+        self.root.after(RECEIPT_POLL_MS, self.poll_receipts)
+
+        # screens are built on first use and kept (see show_screen)
+        self.screens = {}
+        self.screen_fields = {}
+        self.current_screen = None
+        self._fields = []
+        self.welcome_var = tk.StringVar(root)
+        self.balance_var = tk.StringVar(root)
         self.show_main_menu()
 
     def center_window(self):
@@ -463,108 +504,80 @@ class ATMGui:
         y = (screen_height - 600) // 2
         self.root.geometry(f"600x600+{x}+{y}")
 
-    def clear_frames(self):
-        for frame in [self.main_menu_frame, self.login_frame, self.create_account_frame,
-                      self.banking_menu_frame, self.transaction_frame]:
-            for widget in frame.winfo_children():
-                widget.destroy()
-            frame.grid_forget()
-
-        for widget in self.main_frame.winfo_children():
-            if widget not in [self.main_menu_frame, self.login_frame, self.create_account_frame,
-                               self.banking_menu_frame, self.transaction_frame]:
-                widget.destroy()
-
-    def init_frames(self):
-        self.main_menu_frame = ttk.Frame(self.main_frame)
-        self.login_frame = ttk.Frame(self.main_frame)
-        self.create_account_frame = ttk.Frame(self.main_frame)
-        self.banking_menu_frame = ttk.Frame(self.main_frame)
-        self.transaction_frame = ttk.Frame(self.main_frame)
-
-        for frame in [self.main_menu_frame, self.login_frame, self.create_account_frame,
-                      self.banking_menu_frame, self.transaction_frame]:
+    def show_screen(self, name, build):
+        # every screen is built once, by build(frame), and after that only
+        # shown and hidden; its entry fields are emptied each time it is
+        # shown again. Returns the screen's frame.
+        frame = self.screens.get(name)
+        if frame is None:
+            frame = self.screens[name] = ttk.Frame(self.main_frame)
             frame.grid_columnconfigure(0, weight=1)
-            frame.grid_remove()
+            self._fields = self.screen_fields[name] = []
+            build(frame)
+        else:
+            for field in self.screen_fields[name]:
+                field.set("")
+        if self.current_screen is not frame:
+            if self.current_screen is not None:
+                self.current_screen.grid_remove()
+            frame.grid(row=0, column=0)
+            self.current_screen = frame
+        return frame
+
+    def entry(self, parent, **options):
+        # an Entry backed by a StringVar that show_screen() resets
+        field = tk.StringVar(parent)
+        self._fields.append(field)
+        return ttk.Entry(parent, textvariable=field, **options)
+
+    def receipt_saved(self, filename, error):
+        if error is None:
+            self.status_label.config(text=f"Receipt saved as: {filename}")
+        else:
+            self.status_label.config(text=f"Could not save the receipt: {error}")
 
-    def generate_receipt_image(self, transaction_type, account, amount=None, recipient=None):
-        img_width = 500
-        img_height = 400
-        image = Image.new('RGB', (img_width, img_height), 'white')
-        draw = ImageDraw.Draw(image)
+    def poll_receipts(self):
+        self.receipts.poll()
+        self.root.after(RECEIPT_POLL_MS, self.poll_receipts)
 
-        try:
-            font = ImageFont.truetype("arial.ttf", 16)  # Use a valid font path if needed
-            title_font = ImageFont.truetype("arial.ttf", 24)
-        except:
-            font = ImageFont.load_default()
-            title_font = ImageFont.load_default()
-
-        y_position = 20
-        draw.text((img_width // 2, y_position), "TRANSACTION RECEIPT", font=title_font, fill='black', anchor='mm')
-        y_position += 40
-        draw.line([(40, y_position), (img_width - 40, y_position)], fill='black', width=2)
-        y_position += 30
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-        receipt_content = [
-            f"Date: {timestamp}",
-            f"Transaction Type: {transaction_type}",
-            f"Account Number: {account['account_number']}",
-            f"Account Holder: {account['name']}"
-        ]
-
-        if amount is not None:
-            receipt_content.append(f"Amount: ₱{amount:.2f}")
-
-        if recipient:
-            receipt_content.extend([
-                f"Recipient Account: {recipient['account_number']}",
-                f"Recipient Name: {recipient['name']}"
-            ])
-
-        receipt_content.append(f"Current Balance: ₱{account['balance']:.2f}")
-
-        for line in receipt_content:
-            draw.text((50, y_position), line, font=font, fill='black')
-            y_position += 30
-
-        y_position += 10
-        draw.line([(40, y_position), (img_width - 40, y_position)], fill='black', width=2)
-        y_position += 30
-        draw.text((img_width // 2, y_position), "Thank you for banking with us!", font=font, fill='black', anchor='mm')
-
-        timestamp_str = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"./receipts/{account['account_number']}_{transaction_type}_{timestamp_str}.png"
-        os.makedirs('./receipts', exist_ok=True) # Create directory if it doesn't exist
-        image.save(filename)
-        return filename
+    def close(self):
+        # waits for queued receipts, then reports UI latency if asked to
+        self.receipts.close()
+        if receipt_cache.archive is not None:
+            receipt_cache.archive.close()
+        if os.environ.get("ATM_UI_LATENCY"):
+            print(self.latency.summary())
 
     def show_main_menu(self):
-        self.clear_frames()
-        ttk.Label(self.main_menu_frame, text="ATM Banking System", font=('Segoe UI Variable Text Semibold', 16, 'bold')).grid(row=0, column=0, pady=20)
-        ttk.Button(self.main_menu_frame, text="Create Account", command=self.show_create_account).grid(row=1, column=0, pady=self.button_pady)
-        ttk.Button(self.main_menu_frame, text="Login", command=self.show_login).grid(row=2, column=0, pady=self.button_pady)
-        ttk.Button(self.main_menu_frame, text="Exit", command=self.quit).grid(row=3, column=0, pady=self.button_pady)
-        self.main_menu_frame.grid(row=0, column=0)
+        self.show_screen('main_menu', self.build_main_menu)
+
+    def build_main_menu(self, frame):
+        ttk.Label(frame, text="ATM Banking System", font=('Segoe UI Variable Text Semibold', 16, 'bold')).grid(row=0, column=0, pady=20)
+        ttk.Button(frame, text="Create Account", command=self.show_create_account).grid(row=1, column=0, pady=self.button_pady)
+        ttk.Button(frame, text="Login", command=self.show_login).grid(row=2, column=0, pady=self.button_pady)
+        ttk.Button(frame, text="Exit", command=self.quit).grid(row=3, column=0, pady=self.button_pady)
 
     def quit(self):
+        # only leave mainloop(); main_program() then runs close(), which
+        # waits for queued receipts, and the program ends there
         self.root.quit()
-        sys.exit(0)
+
     def show_create_account(self):
-        self.clear_frames()
-        ttk.Label(self.create_account_frame, text="Create New Account", font=('Segoe UI Variable Text Semibold', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=self.button_pady)
-        ttk.Label(self.create_account_frame, text="Full Name: ").grid(row=1, column=0, pady=5)
-        name_entry = ttk.Entry(self.create_account_frame)
+        self.show_screen('create_account', self.build_create_account)
+
+    def build_create_account(self, frame):
+        ttk.Label(frame, text="Create New Account", font=('Segoe UI Variable Text Semibold', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=self.button_pady)
+        ttk.Label(frame, text="Full Name: ").grid(row=1, column=0, pady=5)
+        name_entry = self.entry(frame)
         name_entry.grid(row=1, column=1, pady=5)
-        ttk.Label(self.create_account_frame, text="PIN (4 digits): ").grid(row=2, column=0, pady=5)
-        pin_entry = ttk.Entry(self.create_account_frame, show="*")
+        ttk.Label(frame, text="PIN (4 digits): ").grid(row=2, column=0, pady=5)
+        pin_entry = self.entry(frame, show="*")
         pin_entry.grid(row=2, column=1, pady=5)
-        ttk.Label(self.create_account_frame, text="Confirm PIN: ").grid(row=3, column=0, pady=5)
-        confirm_pin_entry = ttk.Entry(self.create_account_frame, show="*")
+        ttk.Label(frame, text="Confirm PIN: ").grid(row=3, column=0, pady=5)
+        confirm_pin_entry = self.entry(frame, show="*")
         confirm_pin_entry.grid(row=3, column=1, pady=5)
-        ttk.Label(self.create_account_frame, text="Initial Deposit (₱): ").grid(row=4, column=0, pady=5)
-        deposit_entry = ttk.Entry(self.create_account_frame)
+        ttk.Label(frame, text="Initial Deposit (₱): ").grid(row=4, column=0, pady=5)
+        deposit_entry = self.entry(frame)
         deposit_entry.grid(row=4, column=1, pady=5)
 
         def create():
@@ -585,86 +598,89 @@ class ATMGui:
             if '..' in name or '  ' in name:
                 messagebox.showerror("Error", "Name cannot contain consecutive dots or spaces")
                 return
+            if not valid_name(name):
+                messagebox.showerror("Error", "Name is too long")
+                return
                     
             try:
-                initial_deposit = float(deposit_entry.get())
-                if len(pin) != 4 or not pin.isdigit():
-                    messagebox.showerror("Error", "PIN must be 4 digits")
-                    return
-                if pin != confirm_pin:
-                    messagebox.showerror("Error", "PINs do not match")
-                    return
-                if initial_deposit <= 0:
-                    messagebox.showerror("Error", "Initial deposit must be positive")
-                    return
-
-                account = {
-                    'account_number': generate_account_number(),
-                    'name': name,
-                    'pin': pin,
-                    'balance': initial_deposit,
-                    'transaction_history': []
-                }
-                accounts.append(account)
-                messagebox.showinfo("Success", f"Account created successfully!\nYour account number is: {account['account_number']} \nMake sure to remember this!")
-                self.show_main_menu()
+                initial_deposit = Money.parse(deposit_entry.get())
             except ValueError:
                 messagebox.showerror("Error", "Invalid deposit amount")
+                return
+            if not valid_pin(pin):
+                messagebox.showerror("Error", "PIN must be 4 digits")
+                return
+            if pin != confirm_pin:
+                messagebox.showerror("Error", "PINs do not match")
+                return
+            if initial_deposit <= 0:
+                messagebox.showerror("Error", "Initial deposit must be positive")
+                return
+            if not valid_amount(initial_deposit):
+                messagebox.showerror("Error", "Initial deposit is too large")
+                return
+
+            account = Account(generate_account_number(), name, pin, initial_deposit)
+            accounts.append(account)
+            messagebox.showinfo("Success", f"Account created successfully!\nYour account number is: {account['account_number']} \nMake sure to remember this!")
+            self.show_main_menu()
 
-        ttk.Button(self.create_account_frame, text="Create Account", command=create).grid(row=5, column=0, columnspan=2, pady=self.button_pady)
-        ttk.Button(self.create_account_frame, text="Back", command=self.show_main_menu).grid(row=6, column=0, columnspan=2, pady=self.button_pady)
-        self.create_account_frame.grid(row=0, column=0)
+        ttk.Button(frame, text="Create Account", command=create).grid(row=5, column=0, columnspan=2, pady=self.button_pady)
+        ttk.Button(frame, text="Back", command=self.show_main_menu).grid(row=6, column=0, columnspan=2, pady=self.button_pady)
 
     def show_login(self):
-        self.clear_frames()
-        ttk.Label(self.login_frame, text="Login", font=('Segoe UI Variable Text Semibold', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=20)
-        ttk.Label(self.login_frame, text="Account Number:").grid(row=1, column=0, pady=5)
-        acc_entry = ttk.Entry(self.login_frame)
+        self.show_screen('login', self.build_login)
+
+    def build_login(self, frame):
+        ttk.Label(frame, text="Login", font=('Segoe UI Variable Text Semibold', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=20)
+        ttk.Label(frame, text="Account Number:").grid(row=1, column=0, pady=5)
+        acc_entry = self.entry(frame)
         acc_entry.grid(row=1, column=1, pady=5)
-        ttk.Label(self.login_frame, text="PIN:").grid(row=2, column=0, pady=5)
-        pin_entry = ttk.Entry(self.login_frame, show="*")
+        ttk.Label(frame, text="PIN:").grid(row=2, column=0, pady=5)
+        pin_entry = self.entry(frame, show="*")
         pin_entry.grid(row=2, column=1, pady=5)
 
         def login():
-            global current_account_index
             acc_num = acc_entry.get()
             pin = pin_entry.get()
 
-            for i, account in enumerate(accounts):
-                if account['account_number'] == acc_num and account['pin'] == pin:
-                    current_account_index = i
-                    self.show_banking_menu()
-                    return
+            if self.session.login(acc_num, pin):
+                self.show_banking_menu()
+                return
             messagebox.showerror("Error", "Invalid account number or PIN")
 
-        ttk.Button(self.login_frame, text="Login", command=login).grid(row=3, column=0, columnspan=2, pady=self.button_pady)
-        ttk.Button(self.login_frame, text="Back", command=self.show_main_menu).grid(row=4, column=0, columnspan=2)
-        self.login_frame.grid(row=0, column=0)
+        ttk.Button(frame, text="Login", command=login).grid(row=3, column=0, columnspan=2, pady=self.button_pady)
+        ttk.Button(frame, text="Back", command=self.show_main_menu).grid(row=4, column=0, columnspan=2)
 
     def show_banking_menu(self):
-        self.clear_frames()
-        account = accounts[current_account_index]
-        ttk.Label(self.banking_menu_frame, text=f"Welcome, {account['name']}", font=('Segoe UI Variable Text Semibold', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=20)
-        ttk.Label(self.banking_menu_frame, text=f"Balance: ₱{account['balance']:.2f}", font=('Segoe UI Variable Text Semibold', 12)).grid(row=1, column=0, columnspan=2, pady=5, padx=5)
-        ttk.Button(self.banking_menu_frame, text="Deposit", command=lambda: self.show_transaction('deposit')).grid(row=2, column=0, pady=5, padx=5)
-        ttk.Button(self.banking_menu_frame, text="Withdraw", command=lambda: self.show_transaction('withdraw')).grid(row=2, column=1, pady=5, padx=5)
-        ttk.Button(self.banking_menu_frame, text="Transfer", command=lambda: self.show_transaction('transfer')).grid(row=3, column=0, pady=5, padx=5)
-        ttk.Button(self.banking_menu_frame, text="Transaction History", command=self.show_history).grid(row=3, column=1, pady=5, padx=5)
-        ttk.Button(self.banking_menu_frame, text="Change PIN", command=self.show_change_pin).grid(row=4, column=0, pady=5, padx=5)
-        ttk.Button(self.banking_menu_frame, text="Logout", command=self.logout).grid(row=4, column=1, pady=5, padx=5)
-        self.banking_menu_frame.grid(row=0, column=0)
+        account = self.session.account
+        self.welcome_var.set(f"Welcome, {account['name']}")
+        self.balance_var.set(f"Balance: ₱{account['balance']:.2f}")
+        self.show_screen('banking_menu', self.build_banking_menu)
+
+    def build_banking_menu(self, frame):
+        ttk.Label(frame, textvariable=self.welcome_var, font=('Segoe UI Variable Text Semibold', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=20)
+        ttk.Label(frame, textvariable=self.balance_var, font=('Segoe UI Variable Text Semibold', 12)).grid(row=1, column=0, columnspan=2, pady=5, padx=5)
+        ttk.Button(frame, text="Deposit", command=lambda: self.show_transaction('deposit')).grid(row=2, column=0, pady=5, padx=5)
+        ttk.Button(frame, text="Withdraw", command=lambda: self.show_transaction('withdraw')).grid(row=2, column=1, pady=5, padx=5)
+        ttk.Button(frame, text="Transfer", command=lambda: self.show_transaction('transfer')).grid(row=3, column=0, pady=5, padx=5)
+        ttk.Button(frame, text="Transaction History", command=self.show_history).grid(row=3, column=1, pady=5, padx=5)
+        ttk.Button(frame, text="Change PIN", command=self.show_change_pin).grid(row=4, column=0, pady=5, padx=5)
+        ttk.Button(frame, text="Logout", command=self.logout).grid(row=4, column=1, pady=5, padx=5)
 
     def show_change_pin(self):
-        self.clear_frames()
-        ttk.Label(self.transaction_frame, text="Change PIN", font=('Segoe UI Variable Text Semibold', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=20)
-        ttk.Label(self.transaction_frame, text="Current PIN:").grid(row=1, column=0, pady=5)
-        current_pin_entry = ttk.Entry(self.transaction_frame, show="*")
+        self.show_screen('change_pin', self.build_change_pin)
+
+    def build_change_pin(self, frame):
+        ttk.Label(frame, text="Change PIN", font=('Segoe UI Variable Text Semibold', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=20)
+        ttk.Label(frame, text="Current PIN:").grid(row=1, column=0, pady=5)
+        current_pin_entry = self.entry(frame, show="*")
         current_pin_entry.grid(row=1, column=1, pady=5)
-        ttk.Label(self.transaction_frame, text="New PIN (4 digits):").grid(row=2, column=0, pady=5)
-        new_pin_entry = ttk.Entry(self.transaction_frame, show="*")
+        ttk.Label(frame, text="New PIN (4 digits):").grid(row=2, column=0, pady=5)
+        new_pin_entry = self.entry(frame, show="*")
         new_pin_entry.grid(row=2, column=1, pady=5)
-        ttk.Label(self.transaction_frame, text="Confirm New PIN:").grid(row=3, column=0, pady=5)
-        confirm_pin_entry = ttk.Entry(self.transaction_frame, show="*")
+        ttk.Label(frame, text="Confirm New PIN:").grid(row=3, column=0, pady=5)
+        confirm_pin_entry = self.entry(frame, show="*")
         confirm_pin_entry.grid(row=3, column=1, pady=5)
 
         def change_pin():
@@ -672,7 +688,7 @@ class ATMGui:
             new_pin = new_pin_entry.get()
             confirm_pin = confirm_pin_entry.get()
 
-            account = accounts[current_account_index]
+            account = self.session.account
 
             if current_pin != account['pin']:
                 messagebox.showerror("Error", "Incorrect current PIN.")
@@ -680,36 +696,38 @@ class ATMGui:
             if new_pin != confirm_pin:
                 messagebox.showerror("Error", "New PIN and confirmation do not match.")
                 return
-            if len(new_pin) != 4 or not new_pin.isdigit():
+            if not valid_pin(new_pin):
                 messagebox.showerror("Error", "New PIN must be 4 digits.")
                 return
 
-            account['pin'] = new_pin
-            add_transaction(current_account_index, "PIN CHANGE", 0)
-            receipt_path = self.generate_receipt_image("PIN CHANGE", account)
-            messagebox.showinfo("Success", f"PIN changed successfully.\nReceipt saved as: {receipt_path}")
+            started = time.perf_counter()
+            self.session.change_pin(new_pin)
+            self.latency.record("change_pin", time.perf_counter() - started)
+            messagebox.showinfo("Success", "PIN changed successfully.\nView or reprint the receipt from Transaction History.")
             self.show_banking_menu()
 
-        ttk.Button(self.transaction_frame, text="Change PIN", command=change_pin).grid(row=4, column=0, columnspan=2, pady=20)
-        ttk.Button(self.transaction_frame, text="Back", command=self.show_banking_menu).grid(row=5, column=0, columnspan=2)
-        self.transaction_frame.grid(row=0, column=0)
+        ttk.Button(frame, text="Change PIN", command=change_pin).grid(row=4, column=0, columnspan=2, pady=20)
+        ttk.Button(frame, text="Back", command=self.show_banking_menu).grid(row=5, column=0, columnspan=2)
 
     def show_transaction(self, trans_type):
-        self.clear_frames()
-        ttk.Label(self.transaction_frame, text=f"{trans_type.title()}", font=('Segoe UI Variable Text Semibold', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=20)
+        # one screen each for deposit, withdraw and transfer
+        self.show_screen(trans_type, lambda frame: self.build_transaction(frame, trans_type))
+
+    def build_transaction(self, frame, trans_type):
+        ttk.Label(frame, text=f"{trans_type.title()}", font=('Segoe UI Variable Text Semibold', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=20)
 
         if trans_type == 'transfer':
-            ttk.Label(self.transaction_frame, text="Recipient Account:").grid(row=1, column=0, pady=5)
-            recipient_entry = ttk.Entry(self.transaction_frame)
+            ttk.Label(frame, text="Recipient Account:").grid(row=1, column=0, pady=5)
+            recipient_entry = self.entry(frame)
             recipient_entry.grid(row=1, column=1, pady=5)
 
-        ttk.Label(self.transaction_frame, text="Amount:").grid(row=2, column=0, pady=5)
-        amount_entry = ttk.Entry(self.transaction_frame)
+        ttk.Label(frame, text="Amount:").grid(row=2, column=0, pady=5)
+        amount_entry = self.entry(frame)
         amount_entry.grid(row=2, column=1, pady=5)
 
         def process_transaction():
             try:
-                amount = float(amount_entry.get())
+                amount = Money.parse(amount_entry.get())
                 if amount <= 0:
                     messagebox.showerror("Error", "Amount must be positive")
                     return
@@ -726,84 +744,214 @@ class ATMGui:
             except ValueError:
                 messagebox.showerror("Error", "Invalid amount")
 
-        ttk.Button(self.transaction_frame, text="Submit", command=process_transaction).grid(row=3, column=0, columnspan=2, pady=20)
-        ttk.Button(self.transaction_frame, text="Back", command=self.show_banking_menu).grid(row=4, column=0, columnspan=2)
-        self.transaction_frame.grid(row=0, column=0)
+        ttk.Button(frame, text="Submit", command=process_transaction).grid(row=3, column=0, columnspan=2, pady=20)
+        ttk.Button(frame, text="Back", command=self.show_banking_menu).grid(row=4, column=0, columnspan=2)
 
     def show_history(self):
-        self.clear_frames()
-        ttk.Label(self.transaction_frame, text="Transaction History", font=('Segoe UI Variable Text Semibold', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=20)
-
-        text_widget = tk.Text(self.transaction_frame, height=15, width=50)
-        text_widget.grid(row=1, column=0, columnspan=2, pady=10)
-
-        scrollbar = ttk.Scrollbar(self.transaction_frame, orient='vertical', command=text_widget.yview)
-        scrollbar.grid(row=1, column=2, sticky='ns')
+        self.show_screen('history', self.build_history)
+        self.refresh_history()
+
+    def build_history(self, frame):
+        ttk.Label(frame, text="Transaction History", font=('Segoe UI Variable Text Semibold', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=20)
+
+        filter_frame = ttk.Frame(frame)
+        filter_frame.grid(row=1, column=0, columnspan=2)
+        ttk.Label(filter_frame, text="From (YYYY-MM-DD):").grid(row=0, column=0, padx=5)
+        start_entry = self.entry(filter_frame, width=12)
+        start_entry.grid(row=0, column=1, padx=5)
+        ttk.Label(filter_frame, text="To:").grid(row=0, column=2, padx=5)
+        end_entry = self.entry(filter_frame, width=12)
+        end_entry.grid(row=0, column=3, padx=5)
+
+        text_widget = tk.Text(frame, height=15, width=50)
+        text_widget.grid(row=2, column=0, columnspan=2, pady=10)
+
+        scrollbar = ttk.Scrollbar(frame, orient='vertical', command=text_widget.yview)
+        scrollbar.grid(row=2, column=2, sticky='ns')
         text_widget['yscrollcommand'] = scrollbar.set
 
-        for trans in accounts[current_account_index]['transaction_history']:
-            text_widget.insert('end', f"\nType: {trans['type']}\n")
-            text_widget.insert('end', f"Amount: ₱{trans['amount']:.2f}\n")
-            text_widget.insert('end', f"Date: {trans['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}\n")
-            text_widget.insert('end', f"Balance After: ₱{trans['balance_after']:.2f}\n")
-            if trans['recipient']:
-                text_widget.insert('end', f"Recipient: {trans['recipient']}\n")
-            text_widget.insert('end', "-" * 40 + "\n")
+        balance_label = ttk.Label(frame, text="")
+        balance_label.grid(row=3, column=0, columnspan=2)
+
+        page_frame = ttk.Frame(frame)
+        page_frame.grid(row=4, column=0, columnspan=2, pady=5)
+        previous_button = ttk.Button(page_frame, text="< Previous")
+        previous_button.grid(row=0, column=0, padx=5)
+        page_label = ttk.Label(page_frame, text="")
+        page_label.grid(row=0, column=1, padx=10)
+        next_button = ttk.Button(page_frame, text="Next >")
+        next_button.grid(row=0, column=2, padx=5)
+        receipt_frame = ttk.Frame(frame)
+        receipt_frame.grid(row=5, column=0, columnspan=2, pady=5)
+        ttk.Label(receipt_frame, text="Receipt #:").grid(row=0, column=0, padx=5)
+        receipt_spinbox = ttk.Spinbox(receipt_frame, from_=1, to=1, width=4)
+        receipt_spinbox.grid(row=0, column=1, padx=5)
+        cursor = None
+
+        def show_range():
+            nonlocal cursor
+            try:
+                start_date = parse_date(start_entry.get())
+                end_date = parse_date(end_entry.get())
+            except ValueError:
+                messagebox.showerror("Error", "Invalid date. Please use YYYY-MM-DD.")
+                return
+            start, end = day_range(start_date, end_date)
+            account = self.session.account
+            cursor = self.session.history(start, end)
 
-        text_widget.config(state='disabled')
+            if end is None:
+                balance_label.config(text="")
+            else:
+                balance_label.config(text=f"Balance at end of {end_date}: ₱{balance_at(account, to_ns(end) - 1):.2f}")
+            show_page()
+
+        def show_page():
+            # newest first, one page at a time
+            text_widget.config(state='normal')
+            text_widget.delete('1.0', 'end')
+            for number, trans in enumerate(cursor.page(), 1):
+                text_widget.insert('end', f"\n#{number}  Type: {trans['type']}\n")
+                text_widget.insert('end', f"Amount: ₱{trans['amount']:.2f}\n")
+                text_widget.insert('end', f"Date: {trans['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}\n")
+                text_widget.insert('end', f"Balance After: ₱{trans['balance_after']:.2f}\n")
+                if trans['recipient']:
+                    text_widget.insert('end', f"Recipient: {trans['recipient']}\n")
+                text_widget.insert('end', "-" * 40 + "\n")
+            text_widget.config(state='disabled')
+
+            page_label.config(text=f"Page {cursor.page_number + 1} of {cursor.page_count}")
+            receipt_spinbox.config(to=max(1, len(cursor.page_indices())))
+            receipt_spinbox.set(1)
+            previous_button.config(state='normal' if cursor.has_previous() else 'disabled')
+            next_button.config(state='normal' if cursor.has_next() else 'disabled')
+
+        def next_page():
+            cursor.next()
+            show_page()
+
+        def previous_page():
+            cursor.previous()
+            show_page()
+
+        def export_range():
+            try:
+                start_date = parse_date(start_entry.get())
+                end_date = parse_date(end_entry.get())
+            except ValueError:
+                messagebox.showerror("Error", "Invalid date. Please use YYYY-MM-DD.")
+                return
+            account = self.session.account
+            path = filedialog.asksaveasfilename(
+                title="Export Statement", initialfile=os.path.basename(statement_path(account)),
+                defaultextension=".csv", filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl")])
+            if not path:
+                return
+            start, end = day_range(start_date, end_date)
+            try:
+                count = export_file(path, account_rows(account, start, end))
+            except OSError as e:
+                messagebox.showerror("Error", f"Could not write the statement: {e}")
+                return
+            messagebox.showinfo("Success", f"Exported {count:,} transaction(s) to {path}")
+
+        def view_receipt():
+            index = selected_receipt()
+            if index is None:
+                return
+            data = receipt_cache.png(self.session.account, index, accounts)
+            window = tk.Toplevel(self.root)
+            window.title("Receipt")
+            image = tk.PhotoImage(data=base64.b64encode(data))
+            label = ttk.Label(window, image=image)
+            label.image = image  # Tk doesn't keep a reference to it
+            label.grid(row=0, column=0, padx=10, pady=10)
+            ttk.Button(window, text="Close", command=window.destroy).grid(row=1, column=0, pady=5)
+
+        def reprint_receipt():
+            index = selected_receipt()
+            if index is None:
+                return
+            account = self.session.account
+            transaction = account['transaction_history'][index]
+            filename = filedialog.asksaveasfilename(
+                title="Reprint Receipt", defaultextension=".png", filetypes=[("PNG", "*.png")],
+                initialfile=os.path.basename(receipt_filename(transaction.type, account['account_number'], transaction.timestamp)))
+            if not filename:
+                return
+            self.receipts.save(filename, lambda: receipt_cache.png(account, index, accounts), callback=self.receipt_saved)
+            self.status_label.config(text=f"Saving receipt as: {filename}")
 
-        ttk.Button(self.transaction_frame, text="Back", command=self.show_banking_menu).grid(row=2, column=0, columnspan=2, pady=10)
-        self.transaction_frame.grid(row=0, column=0)
+        def selected_receipt():
+            # history index of the entry picked in the receipt spinbox
+            indices = cursor.page_indices()
+            try:
+                number = int(receipt_spinbox.get())
+            except ValueError:
+                number = 0
+            if not 1 <= number <= len(indices):
+                messagebox.showerror("Error", "Pick a transaction number from this page.")
+                return None
+            return indices[number - 1]
+
+        ttk.Button(filter_frame, text="Filter", command=show_range).grid(row=0, column=4, padx=5)
+        ttk.Button(filter_frame, text="Export...", command=export_range).grid(row=0, column=5, padx=5)
+        previous_button.config(command=previous_page)
+        next_button.config(command=next_page)
+        ttk.Button(receipt_frame, text="View Receipt", command=view_receipt).grid(row=0, column=2, padx=5)
+        ttk.Button(receipt_frame, text="Reprint", command=reprint_receipt).grid(row=0, column=3, padx=5)
+        self.refresh_history = show_range
+
+        ttk.Button(frame, text="Back", command=self.show_banking_menu).grid(row=6, column=0, columnspan=2, pady=10)
 
     def deposit(self, amount):
-        accounts[current_account_index]['balance'] += amount
-        add_transaction(current_account_index, "DEPOSIT", amount)
-        receipt_path = self.generate_receipt_image("DEPOSIT", accounts[current_account_index], amount)
-        messagebox.showinfo("Success", f"Deposit successful.\nNew balance: ₱{accounts[current_account_index]['balance']:.2f}\nReceipt saved as: {receipt_path}")
+        started = time.perf_counter()
+        try:
+            balance = self.session.deposit(amount)
+        except InvalidAmount as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.latency.record("deposit", time.perf_counter() - started)
+        messagebox.showinfo("Success", f"Deposit successful.\nNew balance: ₱{balance:.2f}\nView or reprint the receipt from Transaction History.")
 
     def withdraw(self, amount):
-        if amount > accounts[current_account_index]['balance']:
+        started = time.perf_counter()
+        try:
+            balance = self.session.withdraw(amount)
+        except InsufficientFunds:
             messagebox.showerror("Error", "Insufficient funds")
             return False
+        except InvalidAmount as e:
+            messagebox.showerror("Error", str(e))
+            return False
 
-        accounts[current_account_index]['balance'] -= amount
-        add_transaction(current_account_index, "WITHDRAWAL", amount)
-        receipt_path = self.generate_receipt_image("WITHDRAWAL", accounts[current_account_index], amount)
-        messagebox.showinfo("Success", f"Withdrawal successful.\nNew balance: ₱{accounts[current_account_index]['balance']:.2f}\nReceipt saved as: {receipt_path}")
+        self.latency.record("withdraw", time.perf_counter() - started)
+        messagebox.showinfo("Success", f"Withdrawal successful.\nNew balance: ₱{balance:.2f}\nView or reprint the receipt from Transaction History.")
         return True
 
     def transfer(self, amount, recipient_acc):
-        recipient_index = None
-        for i, account in enumerate(accounts):
-            if account['account_number'] == recipient_acc:
-                recipient_index = i
-                break
-
-        if recipient_index is None:
+        started = time.perf_counter()
+        try:
+            self.session.transfer(recipient_acc, amount,
+                                  sent_type=TxType.TRANSFER_SENT, received_type=TxType.TRANSFER_IN)
+        except AccountNotFound:
             messagebox.showerror("Error", "Recipient account not found")
             return
-
-        if recipient_index == current_account_index:
+        except SameAccount:
             messagebox.showerror("Error", "Cannot transfer to your own account")
             return
-
-        if amount > accounts[current_account_index]['balance']:
+        except InsufficientFunds:
             messagebox.showerror("Error", "Insufficient funds")
             return
+        except InvalidAmount as e:
+            messagebox.showerror("Error", str(e))
+            return
 
-        accounts[current_account_index]['balance'] -= amount
-        accounts[recipient_index]['balance'] += amount
-
-        add_transaction(current_account_index, "TRANSFER (SENT)", amount, recipient_acc)
-        add_transaction(recipient_index, "TRANSFER (RECEIVED)", amount, accounts[current_account_index]['account_number'])
-
-        receipt_path = self.generate_receipt_image("TRANSFER", accounts[current_account_index], amount, accounts[recipient_index])
-        messagebox.showinfo("Success", f"Transfer successful.\nReceipt saved as: {receipt_path}")
+        self.latency.record("transfer", time.perf_counter() - started)
+        messagebox.showinfo("Success", "Transfer successful.\nView or reprint the receipt from Transaction History.")
 
     def logout(self):
-        self.clear_frames()
-        global current_account_index
-        current_account_index = None
+        self.session.logout()
         self.show_main_menu()
 
 # --- Main Program (Interface Selection) ---
@@ -852,6 +1000,13 @@ def main_program():
     # root = tk.Tk()
     # app = ATMGui(root)
     # root.mainloop()
+    if STORAGE_BACKEND == "sqlite":
+        accounts.attach_storage(SQLiteStorage(DATABASE_PATH))
+    else:
+        try:
+            accounts.attach_journal(JOURNAL_PATH, snapshot_every=SNAPSHOT_EVERY)
+        except JournalInUse as e:
+            sys.exit(str(e))
     while True:
         choice = choose_interface()
 
@@ -866,9 +1021,11 @@ def main_program():
             display_message("Starting GUI Interface...", "success")
             time.sleep(1)
             print("running")
+            receipt_cache.archive = ReceiptArchive(RECEIPT_ARCHIVE_DIR)
             root = tk.Tk()
             app = ATMGui(root)
             root.mainloop()
+            app.close()
             break
         elif choice == "3":
             clear_screen()
@@ -1,186 +1,213 @@
-from datetime import datetime
-import random
-
-accounts = []
-current_account_index = None
+import sys
+from registry import SNAPSHOT_EVERY, AccountRegistry
+from journal import JournalInUse
+from money import Money
+from records import Account
+from session import InsufficientFunds, InvalidAmount, SameAccount, Session, valid_amount, valid_name, valid_pin
+from timeline import balance_at, day_range, parse_date, to_ns
+from statement import FORMATS, account_rows, export_file, statement_path
+from receipt_model import ReceiptPrinter, TextSink, latest
+
+accounts = AccountRegistry()
+JOURNAL_PATH = "./data/console.journal"
+# receipts go to stdout, or nowhere in batch mode (ATM_BATCH=1)
+receipts = ReceiptPrinter(TextSink())
 
 def generate_account_number():
-    while True:
-        acc_num = str(random.randint(1, 99))
-        if not any(account['account_number'] == acc_num for account in accounts):
-            return acc_num
+    return accounts.new_account_number()
 
 def create_account():
     print("\n=== Create New Account ===")
-    name = input("Enter your full name: ")
+    while True:
+        name = input("Enter your full name: ")
+        if valid_name(name):
+            break
+        print("Invalid name. Use letters, single spaces and dots, starting and ending with a letter.")
 
     while True:
         pin = input("Create a 4-digit PIN: ")
-        if len(pin) == 4 and pin.isdigit():
+        if valid_pin(pin):
             break
         print("Invalid PIN. Please enter 4 digits.")
 
-    initial_deposit = float(input("Enter initial deposit amount: ₱"))
+    while True:
+        try:
+            initial_deposit = Money.parse(input("Enter initial deposit amount: ₱"))
+        except ValueError:
+            print("Invalid amount.")
+            continue
+        if valid_amount(initial_deposit):
+            break
+        print("Initial deposit must be positive." if initial_deposit <= 0 else "Initial deposit is too large.")
 
-    account = {
-        'account_number': generate_account_number(),
-        'name': name,
-        'pin': pin,
-        'balance': initial_deposit,
-        'transaction_history': []
-    }
+    account = Account(generate_account_number(), name, pin, initial_deposit)
 
     accounts.append(account)
 
     print("\nAccount created successfully!")
     generate_receipt("ACCOUNT CREATION", account, initial_deposit)
 
-def add_transaction(account_index, transaction_type, amount, recipient=None):
-    timestamp = datetime.now()
-    transaction = {
-        'type': transaction_type,
-        'amount': amount,
-        'timestamp': timestamp,
-        'recipient': recipient,
-        'balance_after': accounts[account_index]['balance']
-    }
-    accounts[account_index]['transaction_history'].append(transaction)
-
 def login():
-    global current_account_index
+    # returns the new Session, or None if the login failed
     print("\n=== Login ===")
     account_number = input("Enter account number: ")
     pin = input("Enter PIN: ")
 
-    for i, account in enumerate(accounts):
-        if account['account_number'] == account_number and account['pin'] == pin:
-            current_account_index = i
-            print(f"\nWelcome, {account['name']}!")
-            return True
+    session = Session(accounts)
+    if session.login(account_number, pin):
+        print(f"\nWelcome, {session.account['name']}!")
+        return session
     print("Invalid account number or PIN.")
-    current_account_index = None  # if login fail
-    return False
+    return None
 
-def check_balance():
-    if current_account_index is None:
+def check_balance(session):
+    if not session.logged_in:
         print("You are not logged in.")
         return
 
-    account = accounts[current_account_index]
+    account = session.account
     print(f"\nCurrent Balance: ₱{account['balance']:.2f}")
     generate_receipt("BALANCE INQUIRY", account)
 
-def deposit():
-    if current_account_index is None:
+def deposit(session):
+    if not session.logged_in:
         print("You are not logged in.")
         return
 
-    amount = float(input("\nEnter deposit amount: ₱"))
-    if amount <= 0:
+    amount = Money.parse(input("\nEnter deposit amount: ₱"))
+    try:
+        balance = session.deposit(amount)
+    except InvalidAmount:
         print("Invalid amount.")
         return
 
-    accounts[current_account_index]['balance'] += amount
-    add_transaction(current_account_index, "DEPOSIT", amount)
-    print(f"Deposit successful. New balance: ₱{accounts[current_account_index]['balance']:.2f}")
-    generate_receipt("DEPOSIT", accounts[current_account_index], amount)
+    print(f"Deposit successful. New balance: ₱{balance:.2f}")
+    generate_receipt("DEPOSIT", session.account, amount, transaction=latest(session.account))
 
-def withdraw():
-    if current_account_index is None:
+def withdraw(session):
+    if not session.logged_in:
         print("You are not logged in.")
         return
 
-    amount = float(input("\nEnter withdrawal amount: ₱"))
-    if amount <= 0:
+    amount = Money.parse(input("\nEnter withdrawal amount: ₱"))
+    try:
+        balance = session.withdraw(amount)
+    except InvalidAmount:
         print("Invalid amount.")
         return
-    if amount > accounts[current_account_index]['balance']:
+    except InsufficientFunds:
         print("Insufficient funds.")
         return
 
-    accounts[current_account_index]['balance'] -= amount
-    add_transaction(current_account_index, "WITHDRAWAL", amount)
-    print(f"Withdrawal successful. New balance: ₱{accounts[current_account_index]['balance']:.2f}")
-    generate_receipt("WITHDRAWAL", accounts[current_account_index], amount)
+    print(f"Withdrawal successful. New balance: ₱{balance:.2f}")
+    generate_receipt("WITHDRAWAL", session.account, amount, transaction=latest(session.account))
 
-def transfer():
-    if current_account_index is None:
+def transfer(session):
+    if not session.logged_in:
         print("You are not logged in.")
         return
 
     recipient_acc = input("\nEnter recipient's account number: ")
-    recipient_index = None
-
-    for i, account in enumerate(accounts):
-        if account['account_number'] == recipient_acc:
-            recipient_index = i
-            break
-
-    if recipient_index is None:
+    if accounts.find(recipient_acc) is None:
         print("Recipient account not found.")
         return
 
-    amount = float(input("Enter transfer amount: ₱"))
-    if amount <= 0:
+    amount = Money.parse(input("Enter transfer amount: ₱"))
+    try:
+        recipient = session.transfer(recipient_acc, amount)
+    except InvalidAmount:
         print("Invalid amount.")
         return
-    if amount > accounts[current_account_index]['balance']:
+    except InsufficientFunds:
         print("Insufficient funds.")
         return
+    except SameAccount:
+        print("Cannot transfer to your own account.")
+        return
+
+    print(f"Transfer successful. New balance: ₱{session.account['balance']:.2f}")
+    generate_receipt("TRANSFER", session.account, amount, recipient, transaction=latest(session.account))
 
-    # perform transfer
-    accounts[current_account_index]['balance'] -= amount
-    accounts[recipient_index]['balance'] += amount
+def view_transaction_history(session):
+    if not session.logged_in:
+        print("You are not logged in.")
+        return
 
-    # record transactions for both accounts
-    add_transaction(current_account_index, "TRANSFER", amount, recipient_acc)
-    add_transaction(recipient_index, "TRANSFER RECEIVED", amount, accounts[current_account_index]['account_number'])
+    account = session.account
+    print("\n=== Transaction History ===")
+    print("Enter a date range (YYYY-MM-DD), or leave blank to show everything.")
+    try:
+        start_date = parse_date(input("From date: "))
+        end_date = parse_date(input("To date: "))
+    except ValueError:
+        print("Invalid date. Please use YYYY-MM-DD.")
+        return
+    start, end = day_range(start_date, end_date)
+    if end is not None:
+        print(f"Balance at end of {end_date}: ₱{balance_at(account, to_ns(end) - 1):.2f}")
 
-    print(f"Transfer successful. New balance: ₱{accounts[current_account_index]['balance']:.2f}")
-    generate_receipt("TRANSFER", accounts[current_account_index], amount, accounts[recipient_index])
+    # newest first, one page at a time
+    cursor = session.history(start, end)
+    while True:
+        for transaction in cursor.page():
+            print(f"\nType: {transaction['type']}")
+            print(f"Amount: ₱{transaction['amount']:.2f}")
+            print(f"Date: {transaction['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}")
+            print(f"Balance After: ₱{transaction['balance_after']:.2f}")
+            if transaction['recipient']:
+                print(f"Recipient: {transaction['recipient']}")
+            print("-" * 40)
+
+        if cursor.page_count == 1:
+            break
+        print(f"Page {cursor.page_number + 1} of {cursor.page_count}")
+        choice = input("N = next page, P = previous page, Enter = back: ").strip().upper()
+        if choice == "N" and cursor.has_next():
+            cursor.next()
+        elif choice == "P" and cursor.has_previous():
+            cursor.previous()
+        elif choice == "":
+            break
+        else:
+            print("No such page.")
 
-def view_transaction_history():
-    if current_account_index is None:
+def export_statement(session):
+    if not session.logged_in:
         print("You are not logged in.")
         return
 
-    print("\n=== Transaction History ===")
-    for transaction in accounts[current_account_index]['transaction_history']:
-        print(f"\nType: {transaction['type']}")
-        print(f"Amount: ₱{transaction['amount']:.2f}")
-        print(f"Date: {transaction['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"Balance After: ₱{transaction['balance_after']:.2f}")
-        if transaction['recipient']:
-            print(f"Recipient: {transaction['recipient']}")
-        print("-" * 40)
-
-def generate_receipt(transaction_type, account, amount=None, recipient=None):
-    print("\n" + "=" * 40)
-    print(f"{'TRANSACTION RECEIPT':^40}")
-    print("=" * 40)
-    print(f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"Transaction Type: {transaction_type}")
-    print(f"Account Number: {account['account_number']}")
-    print(f"Account Holder: {account['name']}")
-
-    if amount is not None:
-        print(f"Amount: ₱{amount:.2f}")
-
-    if recipient:
-        print(f"Recipient Account: {recipient['account_number']}")
-        print(f"Recipient Name: {recipient['name']}")
-
-    print(f"Current Balance: ₱{account['balance']:.2f}")
-    print("=" * 40)
-    print("Thank you for banking with us!")
-    print("=" * 40 + "\n")
-
-def change_pin():
-    if current_account_index is None:
+    account = session.account
+    print("\n=== Export Statement ===")
+    print("Enter a date range (YYYY-MM-DD), or leave blank to export everything.")
+    try:
+        start_date = parse_date(input("From date: "))
+        end_date = parse_date(input("To date: "))
+    except ValueError:
+        print("Invalid date. Please use YYYY-MM-DD.")
+        return
+    file_format = input("Format (csv/jsonl) [csv]: ").strip().lower() or "csv"
+    if file_format not in FORMATS:
+        print("Invalid format. Please enter csv or jsonl.")
+        return
+    start, end = day_range(start_date, end_date)
+    path = statement_path(account, file_format)
+    try:
+        count = export_file(path, account_rows(account, start, end), file_format)
+    except OSError as e:
+        print(f"Could not write the statement: {e}")
+        return
+    print(f"Exported {count} transaction(s) to {path}")
+
+def generate_receipt(transaction_type, account, amount=None, recipient=None, transaction=None):
+    # transaction: the one the operation just committed, if any
+    receipts.print(transaction_type, account, amount, recipient, transaction)
+
+def change_pin(session):
+    if not session.logged_in:
         print("You are not logged in.")
         return
 
-    account = accounts[current_account_index]
+    account = session.account
 
     # Verify current PIN
     current_pin = input("\nEnter your current PIN: ")
@@ -191,7 +218,7 @@ def change_pin():
     # Get new PIN
     while True:
         new_pin = input("Enter your new 4-digit PIN: ")
-        if len(new_pin) != 4 or not new_pin.isdigit():
+        if not valid_pin(new_pin):
             print("Invalid PIN. Please enter 4 digits.")
             continue
         confirm_pin = input("Confirm your new PIN: ")
@@ -200,16 +227,17 @@ def change_pin():
             continue
         break
 
-    # Update the PIN
-    account['pin'] = new_pin
-
-    # Record the PIN change in transaction history
-    add_transaction(current_account_index, "PIN CHANGE", 0)
+    # Update the PIN and record the change in transaction history
+    session.change_pin(new_pin)
 
     print("PIN changed successfully.")
-    generate_receipt("PIN CHANGE", account)
+    generate_receipt("PIN CHANGE", account, transaction=latest(account))
 
 def main():
+    try:
+        accounts.attach_journal(JOURNAL_PATH, snapshot_every=SNAPSHOT_EVERY)
+    except JournalInUse as e:
+        sys.exit(str(e))
     while True:
         print("\n=== ATM Banking System ===")
         print("1. Create Account")
@@ -221,7 +249,8 @@ def main():
         if choice == "1":
             create_account()
         elif choice == "2":
-            if login():
+            session = login()
+            if session:
                 while True:
                     print("\n=== Main Menu ===")
                     print("1. Check Balance")
@@ -230,25 +259,27 @@ def main():
                     print("4. Transfer")
                     print("5. Transaction History")
                     print("6. Change PIN")
-                    print("7. Logout")
+                    print("7. Export Statement")
+                    print("8. Logout")
 
-                    operation = input("Enter your choice (1-7): ")
+                    operation = input("Enter your choice (1-8): ")
 
                     if operation == "1":
-                        check_balance()
+                        check_balance(session)
                     elif operation == "2":
-                        deposit()
+                        deposit(session)
                     elif operation == "3":
-                        withdraw()
+                        withdraw(session)
                     elif operation == "4":
-                        transfer()
+                        transfer(session)
                     elif operation == "5":
-                        view_transaction_history()
+                        view_transaction_history(session)
                     elif operation == "6":
-                        change_pin()
+                        change_pin(session)
                     elif operation == "7":
-                        global current_account_index
-                        current_account_index = None
+                        export_statement(session)
+                    elif operation == "8":
+                        session.logout()
                         print("Logged out successfully.")
                         break
                     else:
@@ -5,17 +5,29 @@
 # Features: GUI and image generator for reciepts
 
 import tkinter as tk
-from tkinter import ttk, messagebox
-from datetime import datetime
-import random
-from PIL import Image, ImageDraw, ImageFont
+from tkinter import ttk, messagebox, filedialog
+import base64
 import os
+import sys
+import time
+from registry import SNAPSHOT_EVERY, AccountRegistry
+from journal import JournalInUse
+from money import Money
+from records import Account, TxType
+from session import AccountNotFound, InsufficientFunds, InvalidAmount, SameAccount, Session, valid_amount, valid_name, valid_pin
+from timeline import balance_at, day_range, parse_date, to_ns
+from statement import account_rows, export_file, statement_path
+from receipt import ReceiptCache, ReceiptWorker, load_fonts, receipt_filename
+from archive import ReceiptArchive
+from latency import LatencyLog
 
-accounts = []
-current_account_index = None
-
-if not os.path.exists('./receipts'):
-    os.makedirs('./receipts')
+accounts = AccountRegistry()
+JOURNAL_PATH = "./data/gui.journal"
+RECEIPT_POLL_MS = 100
+# receipts aren't kept as files; the ones viewed are cached as PNG bytes
+# and archived (see archive.py) so each is rendered only once
+receipt_cache = ReceiptCache(256)
+RECEIPT_ARCHIVE_DIR = "./data/receipts"
 
 class ATMGui:
     def __init__(self, root):
@@ -24,6 +36,15 @@ class ATMGui:
         self.root.geometry("600x600")
         
         self.center_window()
+
+        # each window serves its own customer
+        self.session = Session(accounts)
+        # find the receipt fonts now rather than on the first receipt
+        load_fonts()
+        # receipts are rendered and saved on a background thread; the Tk
+        # thread picks up the finished ones in poll_receipts()
+        self.receipts = ReceiptWorker()
+        self.latency = LatencyLog()  # ATM_UI_LATENCY=1 prints it on exit
         
         # Create main container
         self.main_frame = ttk.Frame(root, padding="10")
@@ -35,8 +56,17 @@ class ATMGui:
         self.main_frame.grid_rowconfigure(0, weight=1)
         self.main_frame.grid_columnconfigure(0, weight=1)
         
-        # Initialize all frames but only show login frame
-        self.init_frames()
+        self.status_label = ttk.Label(root, text="")
+        self.status_label.grid(row=1, column=0, pady=5)
+        self.root.after(RECEIPT_POLL_MS, self.poll_receipts)
+
+        # screens are built on first use and kept (see show_screen)
+        self.screens = {}
+        self.screen_fields = {}
+        self.current_screen = None
+        self._fields = []
+        self.welcome_var = tk.StringVar(root)
+        self.balance_var = tk.StringVar(root)
         self.show_main_menu()
 
     def center_window(self):
@@ -46,214 +76,170 @@ class ATMGui:
         y = (screen_height - 600) // 2
         self.root.geometry(f"600x600+{x}+{y}")
 
-    def clear_frames(self):
-        # First, remove all widgets from specific frames
-        for frame in [self.main_menu_frame, self.login_frame, self.create_account_frame, 
-                    self.banking_menu_frame, self.transaction_frame]:
-            for widget in frame.winfo_children():
-                widget.destroy()
-            frame.grid_forget()
-        
-        # Then clear any remaining widgets in the main frame
-        for widget in self.main_frame.winfo_children():
-            if widget not in [self.main_menu_frame, self.login_frame, self.create_account_frame, 
-                            self.banking_menu_frame, self.transaction_frame]:
-                widget.destroy()
-
-    def init_frames(self):
-        # Create all frames with center alignment
-        self.main_menu_frame = ttk.Frame(self.main_frame)
-        self.login_frame = ttk.Frame(self.main_frame)
-        self.create_account_frame = ttk.Frame(self.main_frame)
-        self.banking_menu_frame = ttk.Frame(self.main_frame)
-        self.transaction_frame = ttk.Frame(self.main_frame)
-        
-        # Configure grid weights for all frames
-        for frame in [self.main_menu_frame, self.login_frame, self.create_account_frame, 
-                    self.banking_menu_frame, self.transaction_frame]:
+    def show_screen(self, name, build):
+        # every screen is built once, by build(frame), and after that only
+        # shown and hidden; its entry fields are emptied each time it is
+        # shown again. Returns the screen's frame.
+        frame = self.screens.get(name)
+        if frame is None:
+            frame = self.screens[name] = ttk.Frame(self.main_frame)
             frame.grid_columnconfigure(0, weight=1)
-            # Remove the frame from grid immediately after creation
-            frame.grid_remove()
+            self._fields = self.screen_fields[name] = []
+            build(frame)
+        else:
+            for field in self.screen_fields[name]:
+                field.set("")
+        if self.current_screen is not frame:
+            if self.current_screen is not None:
+                self.current_screen.grid_remove()
+            frame.grid(row=0, column=0)
+            self.current_screen = frame
+        return frame
 
-    def generate_receipt_image(self, transaction_type, account, amount=None, recipient=None):
-        # Create image
-        img_width = 500
-        img_height = 400
-        image = Image.new('RGB', (img_width, img_height), 'white')
-        draw = ImageDraw.Draw(image)
-        
-        try:
-            font = ImageFont.truetype("arial.ttf", 16)
-            title_font = ImageFont.truetype("arial.ttf", 24)
-        except:
-            font = ImageFont.load_default()
-            title_font = ImageFont.load_default()
+    def entry(self, parent, **options):
+        # an Entry backed by a StringVar that show_screen() resets
+        field = tk.StringVar(parent)
+        self._fields.append(field)
+        return ttk.Entry(parent, textvariable=field, **options)
 
-        y_position = 20
-        draw.text((img_width//2, y_position), "TRANSACTION RECEIPT", font=title_font, fill='black', anchor='mm')
-        y_position += 40
-        
-        draw.line([(40, y_position), (img_width-40, y_position)], fill='black', width=2)
-        
-        y_position += 30
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        receipt_content = [
-            f"Date: {timestamp}",
-            f"Transaction Type: {transaction_type}",
-            f"Account Number: {account['account_number']}",
-            f"Account Holder: {account['name']}"
-        ]
-        
-        if amount is not None:
-            receipt_content.append(f"Amount: ₱{amount:.2f}")
-        
-        if recipient:
-            receipt_content.extend([
-                f"Recipient Account: {recipient['account_number']}",
-                f"Recipient Name: {recipient['name']}"
-            ])
-        
-        receipt_content.append(f"Current Balance: ₱{account['balance']:.2f}")
-        
-        for line in receipt_content:
-            draw.text((50, y_position), line, font=font, fill='black')
-            y_position += 30
-        
-        y_position += 10
-        draw.line([(40, y_position), (img_width-40, y_position)], fill='black', width=2)
-        
-        y_position += 30
-        draw.text((img_width//2, y_position), "Thank you for banking with us!", font=font, fill='black', anchor='mm')
-        
-        timestamp_str = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"./receipts/{account['account_number']}_{transaction_type}_{timestamp_str}.png"
-        image.save(filename)
-        return filename
+    def receipt_saved(self, filename, error):
+        if error is None:
+            self.status_label.config(text=f"Receipt saved as: {filename}")
+        else:
+            self.status_label.config(text=f"Could not save the receipt: {error}")
+
+    def poll_receipts(self):
+        self.receipts.poll()
+        self.root.after(RECEIPT_POLL_MS, self.poll_receipts)
+
+    def close(self):
+        # waits for queued receipts, then reports UI latency if asked to
+        self.receipts.close()
+        if receipt_cache.archive is not None:
+            receipt_cache.archive.close()
+        if os.environ.get("ATM_UI_LATENCY"):
+            print(self.latency.summary())
 
     def show_main_menu(self):
-        self.clear_frames()
-        
-        ttk.Label(self.main_menu_frame, text="ATM Banking System", font=('Helvetica', 16, 'bold')).grid(row=0, column=0, pady=20)
-        
-        ttk.Button(self.main_menu_frame, text="Create Account", command=self.show_create_account).grid(row=1, column=0, pady=10)
-        ttk.Button(self.main_menu_frame, text="Login", command=self.show_login).grid(row=2, column=0, pady=10)
-        ttk.Button(self.main_menu_frame, text="Exit", command=self.root.quit).grid(row=3, column=0, pady=10)
+        self.show_screen('main_menu', self.build_main_menu)
+
+    def build_main_menu(self, frame):
+        ttk.Label(frame, text="ATM Banking System", font=('Helvetica', 16, 'bold')).grid(row=0, column=0, pady=20)
         
-        self.main_menu_frame.grid(row=0, column=0)
+        ttk.Button(frame, text="Create Account", command=self.show_create_account).grid(row=1, column=0, pady=10)
+        ttk.Button(frame, text="Login", command=self.show_login).grid(row=2, column=0, pady=10)
+        ttk.Button(frame, text="Exit", command=self.root.quit).grid(row=3, column=0, pady=10)
 
     def show_create_account(self):
-        self.clear_frames()
-        
-        ttk.Label(self.create_account_frame, text="Create New Account", font=('Helvetica', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=20)
+        self.show_screen('create_account', self.build_create_account)
+
+    def build_create_account(self, frame):
+        ttk.Label(frame, text="Create New Account", font=('Helvetica', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=20)
         
-        ttk.Label(self.create_account_frame, text="Full Name:").grid(row=1, column=0, pady=5)
-        name_entry = ttk.Entry(self.create_account_frame)
+        ttk.Label(frame, text="Full Name:").grid(row=1, column=0, pady=5)
+        name_entry = self.entry(frame)
         name_entry.grid(row=1, column=1, pady=5)
         
-        ttk.Label(self.create_account_frame, text="PIN (4 digits):").grid(row=2, column=0, pady=5)
-        pin_entry = ttk.Entry(self.create_account_frame, show="*")
+        ttk.Label(frame, text="PIN (4 digits):").grid(row=2, column=0, pady=5)
+        pin_entry = self.entry(frame, show="*")
         pin_entry.grid(row=2, column=1, pady=5)
         
-        ttk.Label(self.create_account_frame, text="Initial Deposit (₱):").grid(row=3, column=0, pady=5)
-        deposit_entry = ttk.Entry(self.create_account_frame)
+        ttk.Label(frame, text="Initial Deposit (₱):").grid(row=3, column=0, pady=5)
+        deposit_entry = self.entry(frame)
         deposit_entry.grid(row=3, column=1, pady=5)
         
         def create():
             name = name_entry.get()
             pin = pin_entry.get()
             try:
-                initial_deposit = float(deposit_entry.get())
-                if len(pin) != 4 or not pin.isdigit():
-                    messagebox.showerror("Error", "PIN must be 4 digits")
-                    return
-                if initial_deposit <= 0:
-                    messagebox.showerror("Error", "Initial deposit must be positive")
-                    return
-                    
-                account = {
-                    'account_number': self.generate_account_number(),
-                    'name': name,
-                    'pin': pin,
-                    'balance': initial_deposit,
-                    'transaction_history': []
-                }
-                accounts.append(account)
-                messagebox.showinfo("Success", f"Account created successfully!\nYour account number is: {account['account_number']}")
-                self.show_main_menu()
+                initial_deposit = Money.parse(deposit_entry.get())
             except ValueError:
                 messagebox.showerror("Error", "Invalid deposit amount")
+                return
+            if not valid_name(name):
+                messagebox.showerror("Error", "Invalid name. Use letters, single spaces and dots, starting and ending with a letter.")
+                return
+            if not valid_pin(pin):
+                messagebox.showerror("Error", "PIN must be 4 digits")
+                return
+            if initial_deposit <= 0:
+                messagebox.showerror("Error", "Initial deposit must be positive")
+                return
+            if not valid_amount(initial_deposit):
+                messagebox.showerror("Error", "Initial deposit is too large")
+                return
+                
+            account = Account(self.generate_account_number(), name, pin, initial_deposit)
+            accounts.append(account)
+            messagebox.showinfo("Success", f"Account created successfully!\nYour account number is: {account['account_number']}")
+            self.show_main_menu()
 
-        ttk.Button(self.create_account_frame, text="Create Account", command=create).grid(row=4, column=0, columnspan=2, pady=20)
-        ttk.Button(self.create_account_frame, text="Back", command=self.show_main_menu).grid(row=5, column=0, columnspan=2)
-        
-        self.create_account_frame.grid(row=0, column=0)
+        ttk.Button(frame, text="Create Account", command=create).grid(row=4, column=0, columnspan=2, pady=20)
+        ttk.Button(frame, text="Back", command=self.show_main_menu).grid(row=5, column=0, columnspan=2)
 
     def show_login(self):
-        self.clear_frames()
-        
-        ttk.Label(self.login_frame, text="Login", font=('Helvetica', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=20)
+        self.show_screen('login', self.build_login)
+
+    def build_login(self, frame):
+        ttk.Label(frame, text="Login", font=('Helvetica', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=20)
         
-        ttk.Label(self.login_frame, text="Account Number:").grid(row=1, column=0, pady=5)
-        acc_entry = ttk.Entry(self.login_frame)
+        ttk.Label(frame, text="Account Number:").grid(row=1, column=0, pady=5)
+        acc_entry = self.entry(frame)
         acc_entry.grid(row=1, column=1, pady=5)
         
-        ttk.Label(self.login_frame, text="PIN:").grid(row=2, column=0, pady=5)
-        pin_entry = ttk.Entry(self.login_frame, show="*")
+        ttk.Label(frame, text="PIN:").grid(row=2, column=0, pady=5)
+        pin_entry = self.entry(frame, show="*")
         pin_entry.grid(row=2, column=1, pady=5)
         
         def login():
-            global current_account_index
             acc_num = acc_entry.get()
             pin = pin_entry.get()
             
-            for i, account in enumerate(accounts):
-                if account['account_number'] == acc_num and account['pin'] == pin:
-                    current_account_index = i
-                    self.show_banking_menu()
-                    return
+            if self.session.login(acc_num, pin):
+                self.show_banking_menu()
+                return
             messagebox.showerror("Error", "Invalid account number or PIN")
 
-        ttk.Button(self.login_frame, text="Login", command=login).grid(row=3, column=0, columnspan=2, pady=20)
-        ttk.Button(self.login_frame, text="Back", command=self.show_main_menu).grid(row=4, column=0, columnspan=2)
-        
-        self.login_frame.grid(row=0, column=0)
+        ttk.Button(frame, text="Login", command=login).grid(row=3, column=0, columnspan=2, pady=20)
+        ttk.Button(frame, text="Back", command=self.show_main_menu).grid(row=4, column=0, columnspan=2)
 
     def show_banking_menu(self):
-        self.clear_frames()
-        
-        account = accounts[current_account_index]
-        ttk.Label(self.banking_menu_frame, text=f"Welcome, {account['name']}", font=('Helvetica', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=20)
-        ttk.Label(self.banking_menu_frame, text=f"Balance: ₱{account['balance']:.2f}", font=('Helvetica', 12)).grid(row=1, column=0, columnspan=2, pady=10)
-        
-        ttk.Button(self.banking_menu_frame, text="Deposit", command=lambda: self.show_transaction('deposit')).grid(row=2, column=0, pady=10)
-        ttk.Button(self.banking_menu_frame, text="Withdraw", command=lambda: self.show_transaction('withdraw')).grid(row=2, column=1, pady=10)
-        ttk.Button(self.banking_menu_frame, text="Transfer", command=lambda: self.show_transaction('transfer')).grid(row=3, column=0, pady=10)
-        ttk.Button(self.banking_menu_frame, text="Transaction History", command=self.show_history).grid(row=3, column=1, pady=10)
-        ttk.Button(self.banking_menu_frame, text="Change PIN", command=self.show_change_pin).grid(row=4, column=0, pady=10)
-        ttk.Button(self.banking_menu_frame, text="Logout", command=self.logout).grid(row=4, column=1, pady=10)
-        
-        self.banking_menu_frame.grid(row=0, column=0)
-    
+        account = self.session.account
+        self.welcome_var.set(f"Welcome, {account['name']}")
+        self.balance_var.set(f"Balance: ₱{account['balance']:.2f}")
+        self.show_screen('banking_menu', self.build_banking_menu)
+
+    def build_banking_menu(self, frame):
+        ttk.Label(frame, textvariable=self.welcome_var, font=('Helvetica', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=20)
+        ttk.Label(frame, textvariable=self.balance_var, font=('Helvetica', 12)).grid(row=1, column=0, columnspan=2, pady=10)
+        
+        ttk.Button(frame, text="Deposit", command=lambda: self.show_transaction('deposit')).grid(row=2, column=0, pady=10)
+        ttk.Button(frame, text="Withdraw", command=lambda: self.show_transaction('withdraw')).grid(row=2, column=1, pady=10)
+        ttk.Button(frame, text="Transfer", command=lambda: self.show_transaction('transfer')).grid(row=3, column=0, pady=10)
+        ttk.Button(frame, text="Transaction History", command=self.show_history).grid(row=3, column=1, pady=10)
+        ttk.Button(frame, text="Change PIN", command=self.show_change_pin).grid(row=4, column=0, pady=10)
+        ttk.Button(frame, text="Logout", command=self.logout).grid(row=4, column=1, pady=10)
+
     # New show_change_pin method
     def show_change_pin(self):
-        self.clear_frames()
-        
-        ttk.Label(self.transaction_frame, text="Change PIN", font=('Helvetica', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=20)
+        self.show_screen('change_pin', self.build_change_pin)
+
+    def build_change_pin(self, frame):
+        ttk.Label(frame, text="Change PIN", font=('Helvetica', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=20)
         
         # Current PIN
-        ttk.Label(self.transaction_frame, text="Current PIN:").grid(row=1, column=0, pady=5)
-        current_pin_entry = ttk.Entry(self.transaction_frame, show="*")
+        ttk.Label(frame, text="Current PIN:").grid(row=1, column=0, pady=5)
+        current_pin_entry = self.entry(frame, show="*")
         current_pin_entry.grid(row=1, column=1, pady=5)
         
         # New PIN
-        ttk.Label(self.transaction_frame, text="New PIN (4 digits):").grid(row=2, column=0, pady=5)
-        new_pin_entry = ttk.Entry(self.transaction_frame, show="*")
+        ttk.Label(frame, text="New PIN (4 digits):").grid(row=2, column=0, pady=5)
+        new_pin_entry = self.entry(frame, show="*")
         new_pin_entry.grid(row=2, column=1, pady=5)
         
         # Confirm New PIN
-        ttk.Label(self.transaction_frame, text="Confirm New PIN:").grid(row=3, column=0, pady=5)
-        confirm_pin_entry = ttk.Entry(self.transaction_frame, show="*")
+        ttk.Label(frame, text="Confirm New PIN:").grid(row=3, column=0, pady=5)
+        confirm_pin_entry = self.entry(frame, show="*")
         confirm_pin_entry.grid(row=3, column=1, pady=5)
         
         def change_pin():
@@ -261,7 +247,7 @@ class ATMGui:
             new_pin = new_pin_entry.get()
             confirm_pin = confirm_pin_entry.get()
             
-            account = accounts[current_account_index]
+            account = self.session.account
             
             if current_pin != account['pin']:
                 messagebox.showerror("Error", "Incorrect current PIN.")
@@ -269,45 +255,41 @@ class ATMGui:
             if new_pin != confirm_pin:
                 messagebox.showerror("Error", "New PIN and confirmation do not match.")
                 return
-            if len(new_pin) != 4 or not new_pin.isdigit():
+            if not valid_pin(new_pin):
                 messagebox.showerror("Error", "New PIN must be 4 digits.")
                 return
             
-            # Update the PIN
-            account['pin'] = new_pin
-            
-            # Record the PIN change in transaction history
-            self.add_transaction("PIN CHANGE", 0)
+            # Update the PIN and record the change in transaction history
+            started = time.perf_counter()
+            self.session.change_pin(new_pin)
             
-            # Generate a receipt
-            receipt_path = self.generate_receipt_image("PIN CHANGE", account)
+            self.latency.record("change_pin", time.perf_counter() - started)
             
-            messagebox.showinfo("Success", f"PIN changed successfully.\nReceipt saved as: {receipt_path}")
+            messagebox.showinfo("Success", "PIN changed successfully.\nView or reprint the receipt from Transaction History.")
             self.show_banking_menu()
         
-        ttk.Button(self.transaction_frame, text="Change PIN", command=change_pin).grid(row=4, column=0, columnspan=2, pady=20)
-        ttk.Button(self.transaction_frame, text="Back", command=self.show_banking_menu).grid(row=5, column=0, columnspan=2)
-        
-        self.transaction_frame.grid(row=0, column=0)
-    
+        ttk.Button(frame, text="Change PIN", command=change_pin).grid(row=4, column=0, columnspan=2, pady=20)
+        ttk.Button(frame, text="Back", command=self.show_banking_menu).grid(row=5, column=0, columnspan=2)
 
     def show_transaction(self, trans_type):
-        self.clear_frames()
-        
-        ttk.Label(self.transaction_frame, text=f"{trans_type.title()}", font=('Helvetica', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=20)
+        # one screen each for deposit, withdraw and transfer
+        self.show_screen(trans_type, lambda frame: self.build_transaction(frame, trans_type))
+
+    def build_transaction(self, frame, trans_type):
+        ttk.Label(frame, text=f"{trans_type.title()}", font=('Helvetica', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=20)
         
         if trans_type == 'transfer':
-            ttk.Label(self.transaction_frame, text="Recipient Account:").grid(row=1, column=0, pady=5)
-            recipient_entry = ttk.Entry(self.transaction_frame)
+            ttk.Label(frame, text="Recipient Account:").grid(row=1, column=0, pady=5)
+            recipient_entry = self.entry(frame)
             recipient_entry.grid(row=1, column=1, pady=5)
         
-        ttk.Label(self.transaction_frame, text="Amount:").grid(row=2, column=0, pady=5)
-        amount_entry = ttk.Entry(self.transaction_frame)
+        ttk.Label(frame, text="Amount:").grid(row=2, column=0, pady=5)
+        amount_entry = self.entry(frame)
         amount_entry.grid(row=2, column=1, pady=5)
         
         def process_transaction():
             try:
-                amount = float(amount_entry.get())
+                amount = Money.parse(amount_entry.get())
                 if amount <= 0:
                     messagebox.showerror("Error", "Amount must be positive")
                     return
@@ -324,128 +306,229 @@ class ATMGui:
             except ValueError:
                 messagebox.showerror("Error", "Invalid amount")
         
-        ttk.Button(self.transaction_frame, text="Submit", command=process_transaction).grid(row=3, column=0, columnspan=2, pady=20)
-        ttk.Button(self.transaction_frame, text="Back", command=self.show_banking_menu).grid(row=4, column=0, columnspan=2)
-        
-        self.transaction_frame.grid(row=0, column=0)
+        ttk.Button(frame, text="Submit", command=process_transaction).grid(row=3, column=0, columnspan=2, pady=20)
+        ttk.Button(frame, text="Back", command=self.show_banking_menu).grid(row=4, column=0, columnspan=2)
 
     def show_history(self):
-        self.clear_frames()
-        
-        ttk.Label(self.transaction_frame, text="Transaction History", font=('Helvetica', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=20)
-        
-        text_widget = tk.Text(self.transaction_frame, height=15, width=50)
-        text_widget.grid(row=1, column=0, columnspan=2, pady=10)
-        
-        scrollbar = ttk.Scrollbar(self.transaction_frame, orient='vertical', command=text_widget.yview)
-        scrollbar.grid(row=1, column=2, sticky='ns')
+        self.show_screen('history', self.build_history)
+        self.refresh_history()
+
+    def build_history(self, frame):
+        ttk.Label(frame, text="Transaction History", font=('Helvetica', 14, 'bold')).grid(row=0, column=0, columnspan=2, pady=20)
+        
+        filter_frame = ttk.Frame(frame)
+        filter_frame.grid(row=1, column=0, columnspan=2)
+        ttk.Label(filter_frame, text="From (YYYY-MM-DD):").grid(row=0, column=0, padx=5)
+        start_entry = self.entry(filter_frame, width=12)
+        start_entry.grid(row=0, column=1, padx=5)
+        ttk.Label(filter_frame, text="To:").grid(row=0, column=2, padx=5)
+        end_entry = self.entry(filter_frame, width=12)
+        end_entry.grid(row=0, column=3, padx=5)
+        
+        text_widget = tk.Text(frame, height=15, width=50)
+        text_widget.grid(row=2, column=0, columnspan=2, pady=10)
+        
+        scrollbar = ttk.Scrollbar(frame, orient='vertical', command=text_widget.yview)
+        scrollbar.grid(row=2, column=2, sticky='ns')
         text_widget['yscrollcommand'] = scrollbar.set
         
-        for trans in accounts[current_account_index]['transaction_history']:
-            text_widget.insert('end', f"\nType: {trans['type']}\n")
-            text_widget.insert('end', f"Amount: ₱{trans['amount']:.2f}\n")
-            text_widget.insert('end', f"Date: {trans['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}\n")
-            text_widget.insert('end', f"Balance After: ₱{trans['balance_after']:.2f}\n")
-            if trans['recipient']:
-                text_widget.insert('end', f"Recipient: {trans['recipient']}\n")
-            text_widget.insert('end', "-" * 40 + "\n")
-        
-        text_widget.config(state='disabled')
-        
-        ttk.Button(self.transaction_frame, text="Back", command=self.show_banking_menu).grid(row=2, column=0, columnspan=2, pady=10)
+        balance_label = ttk.Label(frame, text="")
+        balance_label.grid(row=3, column=0, columnspan=2)
+        
+        page_frame = ttk.Frame(frame)
+        page_frame.grid(row=4, column=0, columnspan=2, pady=5)
+        previous_button = ttk.Button(page_frame, text="< Previous")
+        previous_button.grid(row=0, column=0, padx=5)
+        page_label = ttk.Label(page_frame, text="")
+        page_label.grid(row=0, column=1, padx=10)
+        next_button = ttk.Button(page_frame, text="Next >")
+        next_button.grid(row=0, column=2, padx=5)
+        receipt_frame = ttk.Frame(frame)
+        receipt_frame.grid(row=5, column=0, columnspan=2, pady=5)
+        ttk.Label(receipt_frame, text="Receipt #:").grid(row=0, column=0, padx=5)
+        receipt_spinbox = ttk.Spinbox(receipt_frame, from_=1, to=1, width=4)
+        receipt_spinbox.grid(row=0, column=1, padx=5)
+        cursor = None
+        
+        def show_range():
+            nonlocal cursor
+            try:
+                start_date = parse_date(start_entry.get())
+                end_date = parse_date(end_entry.get())
+            except ValueError:
+                messagebox.showerror("Error", "Invalid date. Please use YYYY-MM-DD.")
+                return
+            start, end = day_range(start_date, end_date)
+            account = self.session.account
+            cursor = self.session.history(start, end)
+
+            if end is None:
+                balance_label.config(text="")
+            else:
+                balance_label.config(text=f"Balance at end of {end_date}: ₱{balance_at(account, to_ns(end) - 1):.2f}")
+            show_page()
+
+        def show_page():
+            # newest first, one page at a time
+            text_widget.config(state='normal')
+            text_widget.delete('1.0', 'end')
+            for number, trans in enumerate(cursor.page(), 1):
+                text_widget.insert('end', f"\n#{number}  Type: {trans['type']}\n")
+                text_widget.insert('end', f"Amount: ₱{trans['amount']:.2f}\n")
+                text_widget.insert('end', f"Date: {trans['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}\n")
+                text_widget.insert('end', f"Balance After: ₱{trans['balance_after']:.2f}\n")
+                if trans['recipient']:
+                    text_widget.insert('end', f"Recipient: {trans['recipient']}\n")
+                text_widget.insert('end', "-" * 40 + "\n")
+            text_widget.config(state='disabled')
+
+            page_label.config(text=f"Page {cursor.page_number + 1} of {cursor.page_count}")
+            receipt_spinbox.config(to=max(1, len(cursor.page_indices())))
+            receipt_spinbox.set(1)
+            previous_button.config(state='normal' if cursor.has_previous() else 'disabled')
+            next_button.config(state='normal' if cursor.has_next() else 'disabled')
+
+        def next_page():
+            cursor.next()
+            show_page()
+
+        def previous_page():
+            cursor.previous()
+            show_page()
         
-        self.transaction_frame.grid(row=0, column=0)
+        def export_range():
+            try:
+                start_date = parse_date(start_entry.get())
+                end_date = parse_date(end_entry.get())
+            except ValueError:
+                messagebox.showerror("Error", "Invalid date. Please use YYYY-MM-DD.")
+                return
+            account = self.session.account
+            path = filedialog.asksaveasfilename(
+                title="Export Statement", initialfile=os.path.basename(statement_path(account)),
+                defaultextension=".csv", filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl")])
+            if not path:
+                return
+            start, end = day_range(start_date, end_date)
+            try:
+                count = export_file(path, account_rows(account, start, end))
+            except OSError as e:
+                messagebox.showerror("Error", f"Could not write the statement: {e}")
+                return
+            messagebox.showinfo("Success", f"Exported {count:,} transaction(s) to {path}")
+
+        def view_receipt():
+            index = selected_receipt()
+            if index is None:
+                return
+            data = receipt_cache.png(self.session.account, index, accounts)
+            window = tk.Toplevel(self.root)
+            window.title("Receipt")
+            image = tk.PhotoImage(data=base64.b64encode(data))
+            label = ttk.Label(window, image=image)
+            label.image = image  # Tk doesn't keep a reference to it
+            label.grid(row=0, column=0, padx=10, pady=10)
+            ttk.Button(window, text="Close", command=window.destroy).grid(row=1, column=0, pady=5)
+
+        def reprint_receipt():
+            index = selected_receipt()
+            if index is None:
+                return
+            account = self.session.account
+            transaction = account['transaction_history'][index]
+            filename = filedialog.asksaveasfilename(
+                title="Reprint Receipt", defaultextension=".png", filetypes=[("PNG", "*.png")],
+                initialfile=os.path.basename(receipt_filename(transaction.type, account['account_number'], transaction.timestamp)))
+            if not filename:
+                return
+            self.receipts.save(filename, lambda: receipt_cache.png(account, index, accounts), callback=self.receipt_saved)
+            self.status_label.config(text=f"Saving receipt as: {filename}")
+
+        def selected_receipt():
+            # history index of the entry picked in the receipt spinbox
+            indices = cursor.page_indices()
+            try:
+                number = int(receipt_spinbox.get())
+            except ValueError:
+                number = 0
+            if not 1 <= number <= len(indices):
+                messagebox.showerror("Error", "Pick a transaction number from this page.")
+                return None
+            return indices[number - 1]
+
+        ttk.Button(filter_frame, text="Filter", command=show_range).grid(row=0, column=4, padx=5)
+        ttk.Button(filter_frame, text="Export...", command=export_range).grid(row=0, column=5, padx=5)
+        previous_button.config(command=previous_page)
+        next_button.config(command=next_page)
+        ttk.Button(receipt_frame, text="View Receipt", command=view_receipt).grid(row=0, column=2, padx=5)
+        ttk.Button(receipt_frame, text="Reprint", command=reprint_receipt).grid(row=0, column=3, padx=5)
+        self.refresh_history = show_range
+        
+        ttk.Button(frame, text="Back", command=self.show_banking_menu).grid(row=6, column=0, columnspan=2, pady=10)
 
     def generate_account_number(self):
-        while True:
-            acc_num = str(random.randint(1, 99))
-            if not any(account['account_number'] == acc_num for account in accounts):
-                return acc_num
-
-    def add_transaction(self, transaction_type, amount, recipient=None):
-        accounts[current_account_index]['transaction_history'].append({
-            'type': transaction_type,
-            'amount': amount,
-            'timestamp': datetime.now(),
-            'recipient': recipient,
-            'balance_after': accounts[current_account_index]['balance']
-        })
+        return accounts.new_account_number()
 
     def deposit(self, amount):
-        self.clear_frames()
-        accounts[current_account_index]['balance'] += amount
-        self.add_transaction("DEPOSIT", amount)
-        receipt_path = self.generate_receipt_image("DEPOSIT", accounts[current_account_index], amount)
-        messagebox.showinfo("Success", f"Deposit successful.\nNew balance: ₱{accounts[current_account_index]['balance']:.2f}\nReceipt saved as: {receipt_path}")
+        started = time.perf_counter()
+        try:
+            balance = self.session.deposit(amount)
+        except InvalidAmount as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.latency.record("deposit", time.perf_counter() - started)
+        messagebox.showinfo("Success", f"Deposit successful.\nNew balance: ₱{balance:.2f}\nView or reprint the receipt from Transaction History.")
 
     def withdraw(self, amount):
-        self.clear_frames()
-        if amount > accounts[current_account_index]['balance']:
+        started = time.perf_counter()
+        try:
+            balance = self.session.withdraw(amount)
+        except InsufficientFunds:
             messagebox.showerror("Error", "Insufficient funds")
             return False
+        except InvalidAmount as e:
+            messagebox.showerror("Error", str(e))
+            return False
         
-        accounts[current_account_index]['balance'] -= amount
-        self.add_transaction("WITHDRAWAL", amount)
-        receipt_path = self.generate_receipt_image("WITHDRAWAL", accounts[current_account_index], amount)
-        messagebox.showinfo("Success", f"Withdrawal successful.\nNew balance: ₱{accounts[current_account_index]['balance']:.2f}\nReceipt saved as: {receipt_path}")
+        self.latency.record("withdraw", time.perf_counter() - started)
+        messagebox.showinfo("Success", f"Withdrawal successful.\nNew balance: ₱{balance:.2f}\nView or reprint the receipt from Transaction History.")
         return True
 
     def transfer(self, amount, recipient_acc):
-        self.clear_frames()
-        recipient_index = None
-        for i, account in enumerate(accounts):
-            if account['account_number'] == recipient_acc:
-                recipient_index = i
-                break
-        
-        if recipient_index is None:
+        started = time.perf_counter()
+        try:
+            self.session.transfer(recipient_acc, amount,
+                                  sent_type=TxType.TRANSFER_SENT, received_type=TxType.TRANSFER_IN)
+        except AccountNotFound:
             messagebox.showerror("Error", "Recipient account not found")
             return
-            
-        if recipient_index == current_account_index:
+        except SameAccount:
             messagebox.showerror("Error", "Cannot transfer to your own account")
             return
-        
-        if amount > accounts[current_account_index]['balance']:
+        except InsufficientFunds:
             messagebox.showerror("Error", "Insufficient funds")
             return
-            
-        # Perform the transfer
-        accounts[current_account_index]['balance'] -= amount
-        accounts[recipient_index]['balance'] += amount
-        
-        # Add transaction record for sender
-        accounts[current_account_index]['transaction_history'].append({
-            'type': "TRANSFER (SENT)",
-            'amount': amount,
-            'timestamp': datetime.now(),
-            'recipient': recipient_acc,
-            'balance_after': accounts[current_account_index]['balance']
-        })
-        
-        # Add transaction record for recipient
-        accounts[recipient_index]['transaction_history'].append({
-            'type': "TRANSFER (RECEIVED)",
-            'amount': amount,
-            'timestamp': datetime.now(),
-            'recipient': accounts[current_account_index]['account_number'],
-            'balance_after': accounts[recipient_index]['balance']
-        })
-        
-        # Generate transfer receipt
-        receipt_path = self.generate_receipt_image("TRANSFER", accounts[current_account_index], 
-                                                 amount, accounts[recipient_index])
-        messagebox.showinfo("Success", f"Transfer successful.\nReceipt saved as: {receipt_path}")
+        except InvalidAmount as e:
+            messagebox.showerror("Error", str(e))
+            return
+        
+        self.latency.record("transfer", time.perf_counter() - started)
+        messagebox.showinfo("Success", "Transfer successful.\nView or reprint the receipt from Transaction History.")
+
     def logout(self):
-        self.clear_frames()
-        global current_account_index
-        current_account_index = None
+        self.session.logout()
         self.show_main_menu()
 
 def main():
+    try:
+        accounts.attach_journal(JOURNAL_PATH, snapshot_every=SNAPSHOT_EVERY)
+    except JournalInUse as e:
+        sys.exit(str(e))
+    receipt_cache.archive = ReceiptArchive(RECEIPT_ARCHIVE_DIR)
     root = tk.Tk()
     app = ATMGui(root)
     root.mainloop()
+    app.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
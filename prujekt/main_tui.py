@@ -1,16 +1,25 @@
-from datetime import datetime
-import random
 from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
 from rich.layout import Layout
 from rich.align import Align
 from rich.text import Text
-from rich.prompt import Prompt, IntPrompt, FloatPrompt
+from rich.prompt import Prompt, IntPrompt, PromptBase
 from rich.style import Style
+import sys
 import time
+from registry import SNAPSHOT_EVERY, AccountRegistry
+from journal import JournalInUse
+from money import Money
+from records import Account
+from session import InsufficientFunds, InvalidAmount, SameAccount, Session, valid_amount, valid_name, valid_pin
+from timeline import balance_at, day_range, parse_date, to_ns
+from statement import FORMATS, account_rows, export_file, statement_path
+from receipt_model import ReceiptPrinter, RichSink, latest
 
 console = Console()
+# receipts are shown as a Rich panel, or not at all in batch mode (ATM_BATCH=1)
+receipts = ReceiptPrinter(RichSink(console))
 
 # Styles
 HEADER_STYLE = Style(color="blue", bold=True)
@@ -18,8 +27,13 @@ SUCCESS_STYLE = Style(color="green", bold=True)
 ERROR_STYLE = Style(color="red", bold=True)
 HIGHLIGHT_STYLE = Style(color="yellow")
 
-accounts = []
-current_account_index = None
+class MoneyPrompt(PromptBase):
+    # like FloatPrompt, but returns exact centavos
+    response_type = Money
+    validate_error_message = "[prompt.invalid]Please enter a valid amount"
+
+accounts = AccountRegistry()
+JOURNAL_PATH = "./data/tui.journal"
 
 def clear_screen():
     console.clear()
@@ -41,58 +55,47 @@ def display_message(message, style="default"):
         console.print(Panel(message))
     time.sleep(1.5)  # Give users time to read the message
 
-def add_transaction(account_index, transaction_type, amount, recipient=None):
-    timestamp = datetime.now()
-    transaction = {
-        'type': transaction_type,
-        'amount': amount,
-        'timestamp': timestamp,
-        'recipient': recipient,
-        'balance_after': accounts[account_index]['balance']
-    }
-    accounts[account_index]['transaction_history'].append(transaction)
-
 def generate_account_number():
-    while True:
-        acc_num = str(random.randint(1, 20))
-        if not any(account['account_number'] == acc_num for account in accounts):
-            return acc_num
+    return accounts.new_account_number()
 
 def create_account():
     clear_screen()
     display_header("Create New Account")
     
-    name = Prompt.ask("[blue]Enter your full name")
+    while True:
+        name = Prompt.ask("[blue]Enter your full name")
+        if valid_name(name):
+            break
+        display_message("Invalid name. Use letters, single spaces and dots, starting and ending with a letter.", "error")
     
     while True:
         pin = Prompt.ask("[blue]Create a 4-digit PIN", password=True)
-        if len(pin) == 4 and pin.isdigit():
+        if valid_pin(pin):
             break
         display_message("Invalid PIN. Please enter 4 digits.", "error")
     
-    initial_deposit = FloatPrompt.ask("[blue]Enter initial deposit amount (₱)")
+    while True:
+        initial_deposit = MoneyPrompt.ask("[blue]Enter initial deposit amount (₱)")
+        if valid_amount(initial_deposit):
+            break
+        display_message("Initial deposit must be positive." if initial_deposit <= 0
+                        else "Initial deposit is too large.", "error")
     
-    account = {
-        'account_number': generate_account_number(),
-        'name': name,
-        'pin': pin,
-        'balance': initial_deposit,
-        'transaction_history': []
-    }
+    account = Account(generate_account_number(), name, pin, initial_deposit)
     
     accounts.append(account)
     display_message(f"Account created successfully!\nYour account number is: {account['account_number']}", "success")
     generate_receipt("ACCOUNT CREATION", account, initial_deposit)
 
-def check_balance():
-    if current_account_index is None:
+def check_balance(session):
+    if not session.logged_in:
         display_message("You are not logged in.", "error")
         return
 
     clear_screen()
     display_header("Balance Inquiry")
     
-    account = accounts[current_account_index]
+    account = session.account
     balance_table = Table(show_header=False, border_style="blue")
     balance_table.add_column("Key", style="cyan")
     balance_table.add_column("Value", style="yellow")
@@ -104,47 +107,47 @@ def check_balance():
     console.print(Panel(balance_table, border_style="blue", padding=(1, 2)))
     input("\nPress Enter to continue...")
 
-def deposit():
-    if current_account_index is None:
+def deposit(session):
+    if not session.logged_in:
         display_message("You are not logged in.", "error")
         return
 
     clear_screen()
     display_header("Deposit")
     
-    amount = FloatPrompt.ask("[blue]Enter deposit amount (₱)")
-    if amount <= 0:
+    amount = MoneyPrompt.ask("[blue]Enter deposit amount (₱)")
+    try:
+        session.deposit(amount)
+    except InvalidAmount:
         display_message("Invalid amount.", "error")
         return
 
-    accounts[current_account_index]['balance'] += amount
-    add_transaction(current_account_index, "DEPOSIT", amount)
-    display_message(f"Deposit successful.\nNew balance: ₱{accounts[current_account_index]['balance']:,.2f}", "success")
-    generate_receipt("DEPOSIT", accounts[current_account_index], amount)
+    display_message(f"Deposit successful.\nNew balance: ₱{session.account['balance']:,.2f}", "success")
+    generate_receipt("DEPOSIT", session.account, amount, transaction=latest(session.account))
 
-def withdraw():
-    if current_account_index is None:
+def withdraw(session):
+    if not session.logged_in:
         display_message("You are not logged in.", "error")
         return
 
     clear_screen()
     display_header("Withdrawal")
     
-    amount = FloatPrompt.ask("[blue]Enter withdrawal amount (₱)")
-    if amount <= 0:
+    amount = MoneyPrompt.ask("[blue]Enter withdrawal amount (₱)")
+    try:
+        session.withdraw(amount)
+    except InvalidAmount:
         display_message("Invalid amount.", "error")
         return
-    if amount > accounts[current_account_index]['balance']:
+    except InsufficientFunds:
         display_message("Insufficient funds.", "error")
         return
 
-    accounts[current_account_index]['balance'] -= amount
-    add_transaction(current_account_index, "WITHDRAWAL", amount)
-    display_message(f"Withdrawal successful.\nNew balance: ₱{accounts[current_account_index]['balance']:,.2f}", "success")
-    generate_receipt("WITHDRAWAL", accounts[current_account_index], amount)
+    display_message(f"Withdrawal successful.\nNew balance: ₱{session.account['balance']:,.2f}", "success")
+    generate_receipt("WITHDRAWAL", session.account, amount, transaction=latest(session.account))
 
-def transfer():
-    if current_account_index is None:
+def transfer(session):
+    if not session.logged_in:
         display_message("You are not logged in.", "error")
         return
 
@@ -152,45 +155,35 @@ def transfer():
     display_header("Transfer")
     
     recipient_acc = Prompt.ask("[blue]Enter recipient's account number")
-    recipient_index = None
-
-    for i, account in enumerate(accounts):
-        if account['account_number'] == recipient_acc:
-            recipient_index = i
-            break
-
-    if recipient_index is None:
+    if accounts.find(recipient_acc) is None:
         display_message("Recipient account not found.", "error")
         return
 
-    amount = FloatPrompt.ask("[blue]Enter transfer amount (₱)")
-    if amount <= 0:
+    amount = MoneyPrompt.ask("[blue]Enter transfer amount (₱)")
+    try:
+        recipient = session.transfer(recipient_acc, amount)
+    except InvalidAmount:
         display_message("Invalid amount.", "error")
         return
-    if amount > accounts[current_account_index]['balance']:
+    except InsufficientFunds:
         display_message("Insufficient funds.", "error")
         return
+    except SameAccount:
+        display_message("Cannot transfer to your own account.", "error")
+        return
 
-    # Perform transfer
-    accounts[current_account_index]['balance'] -= amount
-    accounts[recipient_index]['balance'] += amount
-
-    # Record transactions for both accounts
-    add_transaction(current_account_index, "TRANSFER", amount, recipient_acc)
-    add_transaction(recipient_index, "TRANSFER RECEIVED", amount, accounts[current_account_index]['account_number'])
-
-    display_message(f"Transfer successful.\nNew balance: ₱{accounts[current_account_index]['balance']:,.2f}", "success")
-    generate_receipt("TRANSFER", accounts[current_account_index], amount, accounts[recipient_index])
+    display_message(f"Transfer successful.\nNew balance: ₱{session.account['balance']:,.2f}", "success")
+    generate_receipt("TRANSFER", session.account, amount, recipient, transaction=latest(session.account))
 
-def change_pin():
-    if current_account_index is None:
+def change_pin(session):
+    if not session.logged_in:
         display_message("You are not logged in.", "error")
         return
 
     clear_screen()
     display_header("Change PIN")
     
-    account = accounts[current_account_index]
+    account = session.account
     current_pin = Prompt.ask("[blue]Enter your current PIN", password=True)
     
     if current_pin != account['pin']:
@@ -199,7 +192,7 @@ def change_pin():
 
     while True:
         new_pin = Prompt.ask("[blue]Enter your new 4-digit PIN", password=True)
-        if len(new_pin) != 4 or not new_pin.isdigit():
+        if not valid_pin(new_pin):
             display_message("Invalid PIN. Please enter 4 digits.", "error")
             continue
             
@@ -209,78 +202,115 @@ def change_pin():
             continue
         break
 
-    account['pin'] = new_pin
-    add_transaction(current_account_index, "PIN CHANGE", 0)
+    session.change_pin(new_pin)
     display_message("PIN changed successfully.", "success")
-    generate_receipt("PIN CHANGE", account)
+    generate_receipt("PIN CHANGE", account, transaction=latest(account))
 
-def generate_receipt(transaction_type, account, amount=None, recipient=None):
-    receipt = Table(show_header=False, border_style="blue")
-    receipt.add_column("Key", style="cyan")
-    receipt.add_column("Value", style="yellow")
-    
-    receipt.add_row("TRANSACTION RECEIPT", "")
-    receipt.add_row("Date", datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-    receipt.add_row("Transaction Type", transaction_type)
-    receipt.add_row("Account Number", account['account_number'])
-    receipt.add_row("Account Holder", account['name'])
-    
-    if amount is not None:
-        receipt.add_row("Amount", f"₱{amount:,.2f}")
-    
-    if recipient:
-        receipt.add_row("Recipient Account", recipient['account_number'])
-        receipt.add_row("Recipient Name", recipient['name'])
-    
-    receipt.add_row("Current Balance", f"₱{account['balance']:,.2f}")
-    
-    console.print(Panel(receipt, title="Receipt", border_style="blue", padding=(1, 2)))
-    input("\nPress Enter to continue...")
+def generate_receipt(transaction_type, account, amount=None, recipient=None, transaction=None):
+    # transaction: the one the operation just committed, if any
+    if receipts.print(transaction_type, account, amount, recipient, transaction) is not None:
+        input("\nPress Enter to continue...")
 
-def view_transaction_history():
-    if current_account_index is None:
+def view_transaction_history(session):
+    if not session.logged_in:
         display_message("You are not logged in.", "error")
         return
         
     clear_screen()
     display_header("Transaction History")
+
+    account = session.account
+    console.print("[blue]Enter a date range (YYYY-MM-DD), or leave blank to show everything.")
+    try:
+        start_date = parse_date(Prompt.ask("[blue]From date", default="", show_default=False))
+        end_date = parse_date(Prompt.ask("[blue]To date", default="", show_default=False))
+    except ValueError:
+        display_message("Invalid date. Please use YYYY-MM-DD.", "error")
+        return
+    start, end = day_range(start_date, end_date)
+    cursor = session.history(start, end)
+    
+    while True:
+        table = Table(show_header=True, header_style="bold magenta")
+        table.add_column("Type")
+        table.add_column("Amount")
+        table.add_column("Date")
+        table.add_column("Balance After")
+        table.add_column("Recipient")
     
-    table = Table(show_header=True, header_style="bold magenta")
-    table.add_column("Type")
-    table.add_column("Amount")
-    table.add_column("Date")
-    table.add_column("Balance After")
-    table.add_column("Recipient")
+        # newest first, one page at a time
+        for transaction in cursor.page():
+            table.add_row(
+                transaction['type'],
+                f"₱{transaction['amount']:,.2f}",
+                transaction['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
+                f"₱{transaction['balance_after']:,.2f}",
+                transaction['recipient'] if transaction['recipient'] else "-"
+            )
     
-    for transaction in accounts[current_account_index]['transaction_history']:
-        table.add_row(
-            transaction['type'],
-            f"₱{transaction['amount']:,.2f}",
-            transaction['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
-            f"₱{transaction['balance_after']:,.2f}",
-            transaction['recipient'] if transaction['recipient'] else "-"
-        )
+        caption = f"Page {cursor.page_number + 1} of {cursor.page_count}"
+        if end is not None:
+            caption += f" | Balance at end of {end_date}: ₱{balance_at(account, to_ns(end) - 1):,.2f}"
+        table.caption = caption
     
-    console.print(Panel(table, border_style="blue", padding=(1, 2)))
-    input("\nPress Enter to continue...")
+        clear_screen()
+        display_header("Transaction History")
+        console.print(Panel(table, border_style="blue", padding=(1, 2)))
+        if cursor.page_count == 1:
+            input("\nPress Enter to continue...")
+            return
+    
+        choice = Prompt.ask("[blue]N = next page, P = previous page, Enter = back",
+                            default="", show_default=False).strip().upper()
+        if choice == "N":
+            cursor.next()
+        elif choice == "P":
+            cursor.previous()
+        elif choice == "":
+            return
+
+def export_statement(session):
+    if not session.logged_in:
+        display_message("You are not logged in.", "error")
+        return
+
+    clear_screen()
+    display_header("Export Statement")
+
+    account = session.account
+    console.print("[blue]Enter a date range (YYYY-MM-DD), or leave blank to export everything.")
+    try:
+        start_date = parse_date(Prompt.ask("[blue]From date", default="", show_default=False))
+        end_date = parse_date(Prompt.ask("[blue]To date", default="", show_default=False))
+    except ValueError:
+        display_message("Invalid date. Please use YYYY-MM-DD.", "error")
+        return
+    file_format = Prompt.ask("[blue]Format", choices=list(FORMATS), default="csv")
+    start, end = day_range(start_date, end_date)
+    path = statement_path(account, file_format)
+    try:
+        with console.status("Exporting..."):
+            count = export_file(path, account_rows(account, start, end), file_format)
+    except OSError as e:
+        display_message(f"Could not write the statement: {e}", "error")
+        return
+    display_message(f"Exported {count:,} transaction(s) to {path}", "success")
 
 def login():
-    global current_account_index
+    # returns the new Session, or None if the login failed
     clear_screen()
     display_header("Login")
     
     account_number = Prompt.ask("[blue]Enter account number")
     pin = Prompt.ask("[blue]Enter PIN", password=True)
     
-    for i, account in enumerate(accounts):
-        if account['account_number'] == account_number and account['pin'] == pin:
-            current_account_index = i
-            display_message(f"Welcome, {account['name']}!", "success")
-            return True
+    session = Session(accounts)
+    if session.login(account_number, pin):
+        display_message(f"Welcome, {session.account['name']}!", "success")
+        return session
             
     display_message("Invalid account number or PIN.", "error")
-    current_account_index = None
-    return False
+    return None
 
 def display_menu(title, options):
     clear_screen()
@@ -299,6 +329,10 @@ def display_menu(title, options):
     return choice
 
 def main():
+    try:
+        accounts.attach_journal(JOURNAL_PATH, snapshot_every=SNAPSHOT_EVERY)
+    except JournalInUse as e:
+        sys.exit(str(e))
     while True:
         main_options = {
             "1": "Create Account",
@@ -311,7 +345,8 @@ def main():
         if choice == "1":
             create_account()
         elif choice == "2":
-            if login():
+            session = login()
+            if session:
                 while True:
                     logged_in_options = {
                         "1": "Check Balance",
@@ -320,26 +355,28 @@ def main():
                         "4": "Transfer",
                         "5": "Transaction History",
                         "6": "Change PIN",
-                        "7": "Logout"
+                        "7": "Export Statement",
+                        "8": "Logout"
                     }
                     
                     operation = display_menu("Main Menu", logged_in_options)
                     
                     if operation == "1":
-                        check_balance()
+                        check_balance(session)
                     elif operation == "2":
-                        deposit()
+                        deposit(session)
                     elif operation == "3":
-                        withdraw()
+                        withdraw(session)
                     elif operation == "4":
-                        transfer()
+                        transfer(session)
                     elif operation == "5":
-                        view_transaction_history()
+                        view_transaction_history(session)
                     elif operation == "6":
-                        change_pin()
+                        change_pin(session)
                     elif operation == "7":
-                        global current_account_index
-                        current_account_index = None
+                        export_statement(session)
+                    elif operation == "8":
+                        session.logout()
                         display_message("Logged out successfully.", "success")
                         break
             else:
@@ -0,0 +1,158 @@
+# Fixed-point money: amounts are whole centavos stored in an int.
+# Money(150000) is ₱1,500.00. Money("1,500.50") parses what the user typed
+# (so it can be used as a rich prompt type), and format specs like ".2f"
+# and ",.2f" print pesos, so the existing f-strings keep working.
+# Adding or subtracting Money never drifts the way float balances do.
+
+from array import array
+from decimal import Decimal
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, bulk helpers fall back to array
+    np = None
+
+
+# the largest amount or balance the journal, ledgers, snapshots and SQLite
+# can store (int64)
+MAX_CENTAVOS = 2 ** 63 - 1
+
+_new = int.__new__
+_add = int.__add__
+_sub = int.__sub__
+_mul = int.__mul__
+
+
+class Money(int):
+    __slots__ = ()
+
+    def __new__(cls, value=0):
+        if isinstance(value, str):
+            return cls.parse(value)
+        if isinstance(value, float):
+            raise TypeError("Money(float) is ambiguous, use Money.from_pesos()")
+        return super().__new__(cls, value)
+
+    @classmethod
+    def parse(cls, text):
+        whole, _, frac = text.partition('.')
+        # fast path for plain input like "1500" or "1500.50"
+        if whole.isdigit() and whole.isascii() and (not frac or (frac.isdigit() and len(frac) <= 2)):
+            return _new(cls, int(whole) * 100 + (int(frac) * 10 if len(frac) == 1 else int(frac or 0)))
+        return cls._parse_slow(text)
+
+    @classmethod
+    def _parse_slow(cls, original):
+        text = original.strip().replace(',', '')
+        if text.startswith('₱'):
+            text = text[1:]
+        negative = text.startswith('-')
+        if negative or text.startswith('+'):
+            text = text[1:]
+        whole, _, frac = text.partition('.')
+        if (not whole and not frac) or len(frac) > 2 or not text.isascii() \
+                or (whole and not whole.isdigit()) or (frac and not frac.isdigit()):
+            raise ValueError(f"Invalid amount: {original!r}")
+        centavos = int(whole or 0) * 100 + int(frac.ljust(2, '0'))
+        return _new(cls, -centavos if negative else centavos)
+
+    @classmethod
+    def from_pesos(cls, value):
+        # rounds half-up to the nearest centavo
+        cents = (Decimal(str(value)) * 100).quantize(Decimal(1), rounding='ROUND_HALF_UP')
+        return _new(cls, int(cents))
+
+    def pesos(self):
+        return Decimal(int(self)).scaleb(-2)
+
+    def __format__(self, spec):
+        if spec in ('.2f', ',.2f'):
+            pesos, centavos = divmod(abs(int(self)), 100)
+            sign = '-' if self < 0 else ''
+            if spec == ',.2f':
+                return f"{sign}{pesos:,}.{centavos:02d}"
+            return f"{sign}{pesos}.{centavos:02d}"
+        if spec:
+            return format(self.pesos(), spec)
+        return str(self)
+
+    def __str__(self):
+        return format(self, '.2f')
+
+    def __repr__(self):
+        return f"Money('{self}')"
+
+    # arithmetic with Money or int (centavos) stays Money; floats are refused
+    # so a float can't sneak back into a balance
+
+    def _mixed(self, other):
+        if isinstance(other, float):
+            raise TypeError("can't mix Money and float, use Money.from_pesos()")
+        return NotImplemented
+
+    def __add__(self, other):
+        if isinstance(other, int):
+            return _new(Money, _add(self, other))
+        return self._mixed(other)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if isinstance(other, int):
+            return _new(Money, _sub(self, other))
+        return self._mixed(other)
+
+    def __rsub__(self, other):
+        if isinstance(other, int):
+            return _new(Money, _sub(other, self))
+        return self._mixed(other)
+
+    def __mul__(self, other):
+        if isinstance(other, int):
+            return _new(Money, _mul(self, other))
+        return self._mixed(other)
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return _new(Money, -int(self))
+
+    def __abs__(self):
+        return _new(Money, abs(int(self)))
+
+
+ZERO = Money(0)
+
+
+# --- bulk helpers (work on any sequence of centavo ints) ---
+
+def parse_many(texts):
+    return array('q', (Money.parse(text) for text in texts))
+
+
+def as_array(amounts):
+    if np is not None:
+        return np.asarray(amounts, dtype=np.int64)
+    if isinstance(amounts, array) and amounts.typecode == 'q':
+        return amounts
+    return array('q', amounts)
+
+
+def total(amounts):
+    amounts = as_array(amounts)
+    if np is not None:
+        return Money(int(amounts.sum()))
+    return Money(sum(amounts))
+
+
+def running_balance(opening, deltas):
+    # balance after each signed delta, e.g. for a statement
+    deltas = as_array(deltas)
+    if np is not None:
+        return np.cumsum(deltas) + int(opening)
+    balances = array('q')
+    balance = int(opening)
+    for delta in deltas:
+        balance += delta
+        balances.append(balance)
+    return balances
@@ -0,0 +1,228 @@
+# Bulk payroll: pay many accounts from one source account in one batch.
+# The rows come from a CSV stream of (recipient account number, amount),
+# with an optional header row. Instead of one interactive transfer per
+# employee, pay():
+#   - validates every row up front, looking recipients up through the
+#     registry's account-number index
+#   - takes the locks of the source and all recipients once, in index order
+#   - debits the source once with a single PAYROLL transaction for the total
+#   - credits every recipient and records all the history in one
+#     record_many() call (one journal write, one storage batch)
+#   - commits once, then writes all the receipts with a single write;
+#     they are receipt_model receipts dated with the batch's timestamp
+#
+# By default bad rows are skipped and reported, and when the source can't
+# cover everything the rows are paid in file order while the money lasts.
+# With all_or_nothing=True any bad row or a short balance raises
+# PayrollRejected and nothing is paid.
+#
+# Run: python payroll.py <source account> <pin> [payroll.csv] [--all-or-nothing]
+#                        [--receipts FILE] [--journal PATH]
+# Reads the CSV from stdin when no file (or "-") is given.
+
+import argparse
+import csv
+import io
+import sys
+import time
+
+from journal import JournalInUse
+from money import Money
+from receipt_model import Receipt, TextSink
+from records import Transaction, TxType
+from registry import SNAPSHOT_EVERY, AccountRegistry
+from session import AccountNotFound
+
+JOURNAL_PATH = "./data/atm.journal"
+
+
+class PayrollRejected(Exception):
+    # raised in all-or-nothing mode; result.rejected says why
+    def __init__(self, result):
+        super().__init__(f"payroll rejected: {len(result.rejected)} row(s) can't be paid")
+        self.result = result
+
+
+class Rejection:
+    __slots__ = ('line', 'recipient', 'amount', 'reason')
+
+    def __init__(self, line, recipient, amount, reason):
+        self.line = line
+        self.recipient = recipient
+        self.amount = amount
+        self.reason = reason
+
+    def __repr__(self):
+        return f"Rejection(line={self.line}, recipient={self.recipient!r}, reason={self.reason!r})"
+
+
+class PayrollResult:
+    def __init__(self, source):
+        self.source = source
+        self.payments = []  # (line, recipient index, amount), in file order
+        self.rejected = []  # Rejection
+        self.transactions = []  # (account index, Transaction) recorded, the source's first
+        self.total = Money(0)
+
+    @property
+    def paid(self):
+        return len(self.payments)
+
+
+def read_payroll(stream):
+    # yields (line number, recipient, amount text); skips blank rows and a
+    # header row such as "recipient,amount"
+    for line, row in enumerate(csv.reader(stream), 1):
+        if not row or not any(field.strip() for field in row):
+            continue
+        recipient = row[0].strip()
+        amount = row[1].strip() if len(row) > 1 else ''
+        if line == 1 and not recipient.isdigit():
+            continue
+        yield line, recipient, amount
+
+
+def validate(registry, source_index, rows, result):
+    # fills result.payments with the rows that can be paid and
+    # result.rejected with the rest
+    find = registry.find
+    for line, recipient, amount in rows:
+        try:
+            amount = Money.parse(amount)
+        except ValueError:
+            result.rejected.append(Rejection(line, recipient, amount, "invalid amount"))
+            continue
+        if amount <= 0:
+            result.rejected.append(Rejection(line, recipient, amount, "invalid amount"))
+            continue
+        index = find(recipient)
+        if index is None:
+            result.rejected.append(Rejection(line, recipient, amount, "recipient account not found"))
+        elif index == source_index:
+            result.rejected.append(Rejection(line, recipient, amount, "cannot pay the source account"))
+        else:
+            result.payments.append((line, index, amount))
+
+
+def pay(registry, source_number, rows, all_or_nothing=False, receipts=None):
+    # rows: (line, recipient, amount text) as from read_payroll();
+    # receipts: optional text stream for the receipts
+    source_index = registry.find(source_number)
+    if source_index is None:
+        raise AccountNotFound("Source account not found")
+    source = registry[source_index]
+    result = PayrollResult(source)
+    validate(registry, source_index, rows, result)
+    if all_or_nothing and result.rejected:
+        raise PayrollRejected(result)
+
+    with registry.locked(source_index, *(index for _, index, _ in result.payments)):
+        if registry.storage is not None:
+            registry.storage.refresh(source)
+        balance = source['balance']
+        total = sum(amount for _, _, amount in result.payments)
+        if total > balance:
+            if all_or_nothing:
+                result.rejected.extend(Rejection(line, registry[index]['account_number'], amount, "insufficient funds")
+                                       for line, index, amount in result.payments)
+                result.payments = []
+                raise PayrollRejected(result)
+            payments, total = [], 0
+            for line, index, amount in result.payments:
+                if total + amount <= balance:
+                    payments.append((line, index, amount))
+                    total += amount
+                else:
+                    result.rejected.append(Rejection(line, registry[index]['account_number'], amount,
+                                                     "insufficient funds"))
+            result.payments = payments
+        result.total = Money(total)
+        if not result.payments:
+            return result
+
+        balances = registry.change_balances([(source_index, -result.total)] +
+                                            [(index, amount) for _, index, amount in result.payments])
+        if balances is None:
+            # another program sharing the storage spent the money meanwhile
+            result.rejected.extend(Rejection(line, registry[index]['account_number'], amount, "insufficient funds")
+                                   for line, index, amount in result.payments)
+            result.payments, result.total = [], Money(0)
+            if all_or_nothing:
+                raise PayrollRejected(result)
+            return result
+
+        # one timestamp for the whole batch keeps every history sorted
+        now = time.time_ns()
+        entries = [(source_index, Transaction(TxType.PAYROLL, result.total, None, balances[0], now))]
+        for (_, index, amount), balance in zip(result.payments, balances[1:]):
+            entries.append((index, Transaction(TxType.PAYROLL_RECEIVED, amount, source_number, balance, now)))
+        registry.record_many(entries)
+        result.transactions = entries
+    registry.commit()
+    if receipts is not None:
+        write_receipts(receipts, registry, result)
+    return result
+
+
+def write_receipts(stream, registry, result):
+    # one receipt for the source and one per payment, built in memory and
+    # written at once
+    if not result.transactions:
+        return
+    buffer = io.StringIO()
+    sink = TextSink(buffer)
+    (_, transaction), *received = result.transactions
+    sink.emit(Receipt.of(transaction.type, result.source, result.total, transaction=transaction))
+    # Receipt.of() would label the source as the recipient; of_transaction()
+    # shows it as "From"
+    for index, transaction in received:
+        sink.emit(Receipt.of_transaction(registry[index], transaction, registry))
+    stream.write(buffer.getvalue())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pay many accounts from one account")
+    parser.add_argument('source', help="account number to pay from")
+    parser.add_argument('pin')
+    parser.add_argument('csv', nargs='?', default='-', help="recipient,amount rows (default: stdin)")
+    parser.add_argument('--all-or-nothing', action='store_true',
+                        help="pay nothing unless every row can be paid")
+    parser.add_argument('--receipts', help="write the receipts to this file")
+    parser.add_argument('--journal', default=JOURNAL_PATH)
+    args = parser.parse_args()
+
+    accounts = AccountRegistry()
+    try:
+        accounts.attach_journal(args.journal, snapshot_every=SNAPSHOT_EVERY)
+    except JournalInUse as e:
+        sys.exit(str(e))
+    if accounts.authenticate(args.source, args.pin) is None:
+        sys.exit("Invalid account number or PIN.")
+
+    stream = sys.stdin if args.csv == '-' else open(args.csv, newline='', encoding='utf-8')
+    receipts = open(args.receipts, 'w', encoding='utf-8') if args.receipts else None
+    start = time.perf_counter()
+    try:
+        result = pay(accounts, args.source, read_payroll(stream), args.all_or_nothing, receipts)
+    except PayrollRejected as e:
+        result = e.result
+        print("Payroll rejected, nothing was paid.")
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        if receipts is not None:
+            receipts.close()
+    elapsed = time.perf_counter() - start
+
+    for rejection in result.rejected:
+        print(f"line {rejection.line}: {rejection.recipient}: {rejection.reason}", file=sys.stderr)
+    print(f"Paid {result.paid:,} account(s), total ₱{result.total:,.2f}, in {elapsed:.2f} s")
+    if result.rejected:
+        print(f"{len(result.rejected):,} row(s) rejected")
+    print(f"Balance: ₱{result.source['balance']:,.2f}")
+    accounts.journal.close()
+    sys.exit(1 if result.rejected else 0)
+
+
+if __name__ == "__main__":
+    main()
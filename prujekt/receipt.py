@@ -0,0 +1,407 @@
+# Receipt images for the GUI.
+# Fonts are looked up once per process and kept: font(size) tries the
+# FONT_CANDIDATES in order and falls back to Pillow's built-in font, and
+# the result is cached, so a missing arial.ttf (the usual case on Linux)
+# costs one failed lookup per size instead of two per receipt.
+# Everything on a receipt except the values is the same for every receipt
+# with the same rows: title, rules, labels and footer are drawn once into a
+# template image per label layout, and each receipt is a copy of its
+# template with only the values drawn on it.
+# A receipt doesn't have to be kept as a file: everything on it is in the
+# transaction record, so transaction_lines() rebuilds it from history and
+# ReceiptCache keeps the most recently viewed ones as PNG bytes. With an
+# archive (archive.ReceiptArchive) attached, each receipt is rendered once
+# and later cache misses are served from the archive.
+# ReceiptWorker renders and saves receipts on a background thread so a
+# GUI doesn't wait for PNG encoding and disk writes: submit() takes the
+# receipt's text right away (so it shows the balance at the time of the
+# transaction) and queues it; poll(), called from the GUI's own thread,
+# runs the callbacks of the receipts that are done. ImageSink plugs the
+# worker into a receipt_model.ReceiptPrinter.
+# Receipts are black text on white, so they don't need 24-bit colour: an
+# output profile (PROFILES) picks the image mode a receipt is encoded in
+# and the zlib level of the PNG, trading encode time against bytes on
+# disk. day_pdf() bundles a day's receipts into one multi-page PDF,
+# written page by page by write_pdf().
+#
+# Run: python receipt.py <output.pdf> [--day YYYY-MM-DD] [--account NUMBER]
+#                        [--profile NAME] [--journal PATH]
+
+import argparse
+import io
+import os
+import queue
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFont
+
+from journal import JournalInUse
+from receipt_model import Receipt
+from registry import AccountRegistry
+from timeline import day_range, parse_date, range_indices
+
+RECEIPT_DIR = "./receipts"
+WIDTH, HEIGHT = 500, 400
+MARGIN = 50
+LINE_HEIGHT = 30
+TEXT_SIZE, TITLE_SIZE = 16, 24
+FONT_CANDIDATES = (
+    "arial.ttf",
+    "DejaVuSans.ttf",
+    "LiberationSans-Regular.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/TTF/DejaVuSans.ttf",
+    "/Library/Fonts/Arial.ttf",
+)
+JOURNAL_PATH = "./data/atm.journal"
+# output profiles: name -> (image mode, PNG zlib level)
+PROFILES = {
+    'rgb': ('RGB', 6),       # what Pillow writes by default
+    'gray': ('L', 6),
+    'palette': ('P', 6),     # 16 shades of grey, keeps the antialiasing
+    'mono': ('1', 9),        # 1 bit per pixel, smallest
+    'mono-fast': ('1', 1),
+}
+DEFAULT_PROFILE = 'palette'
+PALETTE_COLORS = 16
+# day PDFs: page resolution (dots per inch), zlib level of the page
+# images, and the PDF colour space of each profile's image mode ('P'
+# pages get an indexed space built from their palette)
+PDF_DPI = 100
+PDF_LEVEL = 6
+PDF_SPACES = {'1': b'/DeviceGray', 'L': b'/DeviceGray', 'RGB': b'/DeviceRGB'}
+_THRESHOLD = [0] * 128 + [255] * 128
+_GREYS = [value * (PALETTE_COLORS - 1) // 255 * 255 // (PALETTE_COLORS - 1) for value in range(256)]
+
+
+@lru_cache(maxsize=None)
+def font(size):
+    for name in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:  # Pillow < 10.1 has only the fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+def load_fonts():
+    # resolve the fonts up front (at program start) instead of on the
+    # first receipt
+    font(TEXT_SIZE)
+    font(TITLE_SIZE)
+
+
+def receipt_lines(transaction_type, account, amount=None, recipient=None, when=None):
+    # (label, value) rows in the order they are printed
+    return Receipt.of(transaction_type, account, amount, recipient, when=when).lines()
+
+
+def transaction_lines(account, transaction, registry=None):
+    # receipt rows for a recorded transaction
+    return Receipt.of_transaction(account, transaction, registry).lines()
+
+
+@lru_cache(maxsize=16)
+def template(labels):
+    # the static part of a receipt with these row labels, and the x
+    # position where each row's value starts
+    text_font, title_font = font(TEXT_SIZE), font(TITLE_SIZE)
+    image = Image.new('RGB', (WIDTH, HEIGHT), 'white')
+    draw = ImageDraw.Draw(image)
+    y = 20
+    draw.text((WIDTH // 2, y), "TRANSACTION RECEIPT", font=title_font, fill='black', anchor='mm')
+    y += 40
+    draw.line([(40, y), (WIDTH - 40, y)], fill='black', width=2)
+    y += 30
+    value_x = []
+    for label in labels:
+        draw.text((MARGIN, y), label, font=text_font, fill='black')
+        value_x.append(MARGIN + draw.textlength(label, font=text_font))
+        y += LINE_HEIGHT
+    y += 10
+    draw.line([(40, y), (WIDTH - 40, y)], fill='black', width=2)
+    y += 30
+    draw.text((WIDTH // 2, y), "Thank you for banking with us!", font=text_font, fill='black', anchor='mm')
+    return image, tuple(value_x)
+
+
+def render_receipt(lines):
+    # Image of a receipt with these (label, value) rows
+    base, value_x = template(tuple(label for label, _ in lines))
+    image = base.copy()
+    draw = ImageDraw.Draw(image)
+    text_font = font(TEXT_SIZE)
+    y = 90
+    for x, (_, value) in zip(value_x, lines):
+        draw.text((x, y), str(value), font=text_font, fill='black')
+        y += LINE_HEIGHT
+    return image
+
+
+def convert(image, profile=DEFAULT_PROFILE):
+    # a rendered (RGB) receipt in the profile's image mode
+    mode = PROFILES[profile][0]
+    if mode == 'RGB':
+        return image
+    gray = image.convert('L')
+    if mode == 'P':
+        # a fixed grey ramp; an adaptive palette costs ~40x more to build
+        return gray.point(_GREYS).convert('P')
+    # a plain threshold; dithering would speckle the text
+    return gray if mode == 'L' else gray.point(_THRESHOLD, '1')
+
+
+def png_bytes(image, profile=DEFAULT_PROFILE, level=None):
+    # level overrides the profile's zlib level (0-9)
+    buffer = io.BytesIO()
+    convert(image, profile).save(buffer, 'PNG', compress_level=PROFILES[profile][1] if level is None else level)
+    return buffer.getvalue()
+
+
+def _pdf_object(stream, start, offsets, number, entries, data=None):
+    # writes object `number`, a dictionary (entries) with an optional stream
+    offsets[number] = stream.tell() - start
+    stream.write(b'%d 0 obj\n<<%s' % (number, entries))
+    if data is None:
+        stream.write(b'>>\nendobj\n')
+    else:
+        stream.write(b'/Length %d>>\nstream\n%s\nendstream\nendobj\n' % (len(data), data))
+
+
+def write_pdf(stream, images, profile=DEFAULT_PROFILE):
+    # one receipt per page; returns the page count. Pillow's PDF writer
+    # keeps every page of the document in memory (and appending to a PDF
+    # rewrites its whole page tree), so the PDF is written here instead:
+    # each page is written as soon as it is converted, as a deflated image
+    # and a content stream that draws it, and only the page tree, catalog
+    # and xref table, which list every page, are left for the end.
+    # images can be any iterable, a generator keeps one page in memory.
+    start = stream.tell()
+    offsets = {}
+    pages = []
+    stream.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    for image in images:
+        page = convert(image, profile)
+        if page.mode == 'P':
+            palette = bytes(page.getpalette())
+            space = b'[/Indexed/DeviceRGB %d<%s>]' % (len(palette) // 3 - 1, palette.hex().encode('ascii'))
+        else:
+            space = PDF_SPACES[page.mode]
+        width, height = page.size
+        points = width * 72 / PDF_DPI, height * 72 / PDF_DPI
+        number = 3 + 3 * len(pages)   # 1 and 2 are the catalog and page tree
+        _pdf_object(stream, start, offsets, number,
+                    b'/Type/XObject/Subtype/Image/Width %d/Height %d/ColorSpace%s/BitsPerComponent %d'
+                    b'/Filter/FlateDecode' % (width, height, space, 1 if page.mode == '1' else 8),
+                    zlib.compress(page.tobytes(), PDF_LEVEL))
+        _pdf_object(stream, start, offsets, number + 1, b'', b'q %g 0 0 %g 0 0 cm /Receipt Do Q' % points)
+        _pdf_object(stream, start, offsets, number + 2,
+                    b'/Type/Page/Parent 2 0 R/MediaBox[0 0 %g %g]/Resources<</XObject<</Receipt %d 0 R>>>>'
+                    b'/Contents %d 0 R' % (*points, number, number + 1))
+        pages.append(number + 2)
+    _pdf_object(stream, start, offsets, 1, b'/Type/Catalog/Pages 2 0 R')
+    _pdf_object(stream, start, offsets, 2, b'/Type/Pages/Count %d/Kids[%s]'
+                % (len(pages), b' '.join(b'%d 0 R' % number for number in pages)))
+    xref = stream.tell() - start
+    stream.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(offsets) + 1))
+    stream.write(b''.join(b'%010d 00000 n \n' % offsets[number] for number in range(1, len(offsets) + 1)))
+    stream.write(b'trailer\n<</Size %d/Root 1 0 R>>\nstartxref\n%d\n%%%%EOF\n' % (len(offsets) + 1, xref))
+    return len(pages)
+
+
+def day_receipts(registry, day, account_number=None):
+    # receipt lines of every transaction on `day` (a date), account by
+    # account, oldest first
+    start, end = day_range(day, day)
+    if account_number is None:
+        accounts = registry
+    else:
+        index = registry.find(account_number)
+        accounts = [] if index is None else [registry[index]]
+    for account in accounts:
+        history = account['transaction_history']
+        first, stop = range_indices(history, start, end)
+        for transaction in history[first:stop]:
+            yield transaction_lines(account, transaction, registry)
+
+
+def day_pdf(path, registry, day, account_number=None, profile='mono'):
+    # bundles a day's receipts into one PDF; returns the page count
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as stream:
+        return write_pdf(stream, (render_receipt(lines) for lines in day_receipts(registry, day, account_number)),
+                         profile)
+
+
+class ReceiptCache:
+    # LRU cache of rendered receipts as PNG bytes, keyed by account number,
+    # history index and transaction timestamp; safe to share between threads
+    def __init__(self, maxsize=256, archive=None, profile=DEFAULT_PROFILE):
+        self.maxsize = maxsize
+        self.archive = archive
+        self.profile = profile
+        self.hits = self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def png(self, account, index, registry=None):
+        # the history index alone doesn't name a transaction for good: a
+        # history merged with another program's transactions can move one,
+        # so cached and archived receipts are checked against its timestamp
+        transaction = account['transaction_history'][index]
+        key = (account['account_number'], index, transaction.timestamp_ns)
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+        data = self.archive.get(key[0], index, transaction.timestamp_ns) if self.archive is not None else None
+        if data is None:
+            data = png_bytes(render_receipt(transaction_lines(account, transaction, registry)), self.profile)
+            if self.archive is not None:
+                self.archive.put(key[0], index, data, transaction.timestamp_ns)
+        with self._lock:
+            self._items[key] = data
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return data
+
+    def __len__(self):
+        return len(self._items)
+
+
+def receipt_filename(transaction_type, account_number, when, directory=RECEIPT_DIR):
+    return os.path.join(directory, f"{account_number}_{transaction_type}_{when:%Y%m%d_%H%M%S}.png")
+
+
+def save_receipt(transaction_type, account, amount=None, recipient=None, directory=RECEIPT_DIR,
+                 profile=DEFAULT_PROFILE):
+    # renders the receipt into directory and returns the file name
+    when = datetime.now()
+    image = render_receipt(receipt_lines(transaction_type, account, amount, recipient, when))
+    os.makedirs(directory, exist_ok=True)
+    filename = receipt_filename(transaction_type, account['account_number'], when, directory)
+    with open(filename, 'wb') as f:
+        f.write(png_bytes(image, profile))
+    return filename
+
+
+class ReceiptWorker:
+    def __init__(self, directory=RECEIPT_DIR, profile=DEFAULT_PROFILE):
+        self.directory = directory
+        self.profile = profile
+        self.pending = 0
+        self._jobs = queue.Queue()
+        self._done = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, transaction_type, account, amount=None, recipient=None, callback=None):
+        # queues the receipt and returns the file name it will be saved
+        # as; callback(filename, error) runs from poll() once it is written
+        return self.submit_receipt(Receipt.of(transaction_type, account, amount, recipient), callback)
+
+    def submit_receipt(self, receipt, callback=None):
+        # same, for a receipt_model.Receipt
+        lines = receipt.lines()
+        filename = receipt_filename(receipt.transaction_type, receipt.account_number, receipt.when, self.directory)
+        return self.save(filename, lambda: png_bytes(render_receipt(lines), self.profile), callback)
+
+    def save(self, filename, make_png, callback=None):
+        # writes make_png() (called on the worker thread) to filename
+        self.pending += 1
+        self._jobs.put((make_png, filename, callback))
+        return filename
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            make_png, filename, callback = job
+            error = None
+            try:
+                data = make_png()
+                directory = os.path.dirname(filename)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(filename, 'wb') as f:
+                    f.write(data)
+            except Exception as e:
+                # anything make_png() raises is reported through the
+                # callback; letting it end the thread would leave every
+                # later receipt waiting forever
+                error = e
+            self._done.put((callback, filename, error))
+
+    def poll(self):
+        # runs the callbacks of finished receipts on the calling thread
+        while True:
+            try:
+                callback, filename, error = self._done.get_nowait()
+            except queue.Empty:
+                return
+            self.pending -= 1
+            if callback is not None:
+                callback(filename, error)
+
+    def close(self):
+        # waits for the queued receipts to be written
+        self._jobs.put(None)
+        self._thread.join()
+        self.poll()
+
+
+
+class ImageSink:
+    # receipt_model sink: saves each receipt as a PNG on the worker thread
+    def __init__(self, worker, callback=None):
+        self.worker = worker
+        self.callback = callback
+
+    def emit(self, receipt):
+        self.worker.submit_receipt(receipt, self.callback)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bundle a day's receipts into one PDF")
+    parser.add_argument('output', help="PDF file to write")
+    parser.add_argument('--day', default='', help="YYYY-MM-DD (default: today)")
+    parser.add_argument('--account', help="only this account's receipts")
+    parser.add_argument('--profile', choices=PROFILES, default='mono')
+    parser.add_argument('--journal', default=JOURNAL_PATH)
+    args = parser.parse_args()
+
+    try:
+        day = parse_date(args.day) or datetime.now().date()
+    except ValueError:
+        sys.exit("Invalid date. Please use YYYY-MM-DD.")
+    accounts = AccountRegistry()
+    try:
+        accounts.attach_journal(args.journal)
+    except JournalInUse as e:
+        sys.exit(str(e))
+    load_fonts()
+    pages = day_pdf(args.output, accounts, day, args.account, args.profile)
+    accounts.journal.close()
+    if not pages:
+        os.remove(args.output)
+        sys.exit(f"No transactions on {day}.")
+    print(f"Wrote {pages:,} receipt(s) for {day} to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
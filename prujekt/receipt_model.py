@@ -0,0 +1,136 @@
+# Receipt model shared by the console, Rich and image front-ends.
+# A Receipt is built once, right after the transaction is committed: every
+# field is formatted then, and it is dated with the transaction's own
+# timestamp (so it matches the history) instead of another datetime.now().
+# Sinks only lay the finished rows out:
+#   TextSink   the console receipt, written as one string in one call
+#   RichSink   a Rich panel
+#   ImageSink  (receipt.py) a PNG saved by a receipt.ReceiptWorker
+# ReceiptPrinter hands each receipt to its sinks. In batch mode (batch=True,
+# or ATM_BATCH set in the environment) it has no sinks and doesn't build
+# receipts at all.
+
+import os
+import sys
+from datetime import datetime
+
+from records import CREDIT_TYPES, TxType
+
+TITLE = "TRANSACTION RECEIPT"
+FOOTER = "Thank you for banking with us!"
+WIDTH = 40
+
+
+def latest(account):
+    # the account's most recent transaction, or None
+    history = account['transaction_history']
+    return history[-1] if len(history) else None
+
+
+class Receipt:
+    __slots__ = ('transaction_type', 'account_number', 'when', 'rows')
+
+    def __init__(self, transaction_type, account_number, when, rows):
+        self.transaction_type = transaction_type
+        self.account_number = account_number
+        self.when = when
+        self.rows = tuple(rows)  # (label, value) pairs, values already formatted
+
+    @classmethod
+    def of(cls, transaction_type, account, amount=None, recipient=None, transaction=None, when=None):
+        # the receipt for an operation; pass the transaction it committed
+        # (if any) for its timestamp and balance
+        if transaction is not None:
+            when, balance = transaction.timestamp, transaction.balance_after
+        else:
+            when, balance = when or datetime.now(), account['balance']
+        rows = [("Date", f"{when:%Y-%m-%d %H:%M:%S}"),
+                ("Transaction Type", transaction_type),
+                ("Account Number", account['account_number']),
+                ("Account Holder", account['name'])]
+        if amount is not None:
+            rows.append(("Amount", f"₱{amount:.2f}"))
+        if recipient:
+            rows.append(("Recipient Account", recipient['account_number']))
+            rows.append(("Recipient Name", recipient['name']))
+        rows.append(("Current Balance", f"₱{balance:.2f}"))
+        return cls(transaction_type, account['account_number'], when, rows)
+
+    @classmethod
+    def of_transaction(cls, account, transaction, registry=None):
+        # the receipt for any transaction in the history; with a registry
+        # the counterparty's name is looked up too
+        when = transaction.timestamp
+        rows = [("Date", f"{when:%Y-%m-%d %H:%M:%S}"),
+                ("Transaction Type", transaction.type),
+                ("Account Number", account['account_number']),
+                ("Account Holder", account['name'])]
+        if transaction.code != TxType.PIN_CHANGE:
+            rows.append(("Amount", f"₱{transaction.amount:.2f}"))
+        if transaction.recipient:
+            direction = "From" if transaction.code in CREDIT_TYPES else "Recipient"
+            rows.append((f"{direction} Account", transaction.recipient))
+            index = registry.find(transaction.recipient) if registry is not None else None
+            if index is not None:
+                rows.append((f"{direction} Name", registry[index]['name']))
+        rows.append(("Balance After", f"₱{transaction.balance_after:.2f}"))
+        return cls(transaction.type, account['account_number'], when, rows)
+
+    def lines(self):
+        # ("Label: ", value) rows, as the image renderer takes them
+        return [(label + ": ", value) for label, value in self.rows]
+
+    def text(self):
+        rule = "=" * WIDTH + "\n"
+        return "".join(["\n", rule, f"{TITLE:^{WIDTH}}\n", rule,
+                        *(f"{label}: {value}\n" for label, value in self.rows),
+                        rule, FOOTER, "\n", rule, "\n"])
+
+
+class TextSink:
+    # stream defaults to whatever sys.stdout is at the time
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def emit(self, receipt):
+        stream = self.stream or sys.stdout
+        stream.write(receipt.text())
+        stream.flush()
+
+
+class RichSink:
+    def __init__(self, console):
+        self.console = console
+
+    def emit(self, receipt):
+        from rich.panel import Panel
+        from rich.table import Table
+
+        table = Table(show_header=False, border_style="blue")
+        table.add_column("Key", style="cyan")
+        table.add_column("Value", style="yellow")
+        table.add_row(TITLE, "")
+        for label, value in receipt.rows:
+            table.add_row(label, value)
+        self.console.print(Panel(table, title="Receipt", border_style="blue", padding=(1, 2)))
+
+
+class ReceiptPrinter:
+    def __init__(self, *sinks, batch=None):
+        if batch is None:
+            batch = bool(os.environ.get("ATM_BATCH"))
+        self.sinks = [] if batch else list(sinks)
+
+    @property
+    def enabled(self):
+        return bool(self.sinks)
+
+    def print(self, transaction_type, account, amount=None, recipient=None, transaction=None):
+        # builds the receipt and sends it to every sink; returns it (None
+        # when there are no sinks)
+        if not self.sinks:
+            return None
+        receipt = Receipt.of(transaction_type, account, amount, recipient, transaction)
+        for sink in self.sinks:
+            sink.emit(receipt)
+        return receipt
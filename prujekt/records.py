@@ -0,0 +1,142 @@
+# Compact account and transaction records.
+# Both use __slots__ instead of a per-object dict, and a transaction keeps
+# its type as a small integer code and its timestamp as epoch nanoseconds.
+# They still support account['balance'] / transaction['type'] style access
+# so the existing UI code keeps working unchanged.
+
+import time
+from datetime import datetime
+from enum import IntEnum
+
+
+class TxType(IntEnum):
+    DEPOSIT = 1
+    WITHDRAWAL = 2
+    TRANSFER = 3
+    TRANSFER_RECEIVED = 4
+    TRANSFER_SENT = 5
+    TRANSFER_IN = 6
+    PIN_CHANGE = 7
+    ACCOUNT_CREATION = 8
+    BALANCE_INQUIRY = 9
+    PAYROLL = 10
+    PAYROLL_RECEIVED = 11
+
+
+# code -> label shown in history and receipts
+_labels = {
+    TxType.DEPOSIT: "DEPOSIT",
+    TxType.WITHDRAWAL: "WITHDRAWAL",
+    TxType.TRANSFER: "TRANSFER",
+    TxType.TRANSFER_RECEIVED: "TRANSFER RECEIVED",
+    TxType.TRANSFER_SENT: "TRANSFER (SENT)",
+    TxType.TRANSFER_IN: "TRANSFER (RECEIVED)",
+    TxType.PIN_CHANGE: "PIN CHANGE",
+    TxType.ACCOUNT_CREATION: "ACCOUNT CREATION",
+    TxType.BALANCE_INQUIRY: "BALANCE INQUIRY",
+    TxType.PAYROLL: "PAYROLL",
+    TxType.PAYROLL_RECEIVED: "PAYROLL RECEIVED",
+}
+_codes = {label: code for code, label in _labels.items()}
+_FIRST_CUSTOM_CODE = 64
+
+# which transactions move money into or out of the account they belong to
+CREDIT_TYPES = frozenset((TxType.DEPOSIT, TxType.TRANSFER_RECEIVED, TxType.TRANSFER_IN, TxType.PAYROLL_RECEIVED))
+DEBIT_TYPES = frozenset((TxType.WITHDRAWAL, TxType.TRANSFER, TxType.TRANSFER_SENT, TxType.PAYROLL))
+
+
+def type_code(transaction_type):
+    # accepts a TxType, a code or a label; labels we haven't seen before
+    # get the next free code so callers can still pass any string
+    if isinstance(transaction_type, int):
+        return transaction_type
+    code = _codes.get(transaction_type)
+    if code is None:
+        code = max(_FIRST_CUSTOM_CODE - 1, *_labels) + 1
+        _labels[code] = transaction_type
+        _codes[transaction_type] = code
+    return code
+
+
+def type_label(code):
+    return _labels[code]
+
+
+class Record:
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        if key not in self.__slots__:
+            return default
+        return self[key]
+
+    def keys(self):
+        return self.__slots__
+
+    def __repr__(self):
+        fields = ", ".join(f"{key}={self[key]!r}" for key in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class Account(Record):
+    __slots__ = ('account_number', 'name', 'pin', 'balance', 'transaction_history')
+
+    def __init__(self, account_number, name, pin, balance, transaction_history=None):
+        self.account_number = account_number
+        self.name = name
+        self.pin = pin
+        self.balance = balance
+        self.transaction_history = [] if transaction_history is None else transaction_history
+
+
+class Transaction(Record):
+    __slots__ = ('code', 'amount', 'timestamp_ns', 'recipient', 'balance_after')
+
+    # dict-style keys that are computed from the stored fields
+    _computed = ('type', 'timestamp')
+
+    def __init__(self, transaction_type, amount, recipient=None, balance_after=0, timestamp_ns=None):
+        self.code = type_code(transaction_type)
+        self.amount = amount
+        self.timestamp_ns = time.time_ns() if timestamp_ns is None else timestamp_ns
+        self.recipient = recipient
+        self.balance_after = balance_after
+
+    @property
+    def type(self):
+        return _labels[self.code]
+
+    @property
+    def timestamp(self):
+        seconds, ns = divmod(self.timestamp_ns, 1_000_000_000)
+        return datetime.fromtimestamp(seconds).replace(microsecond=ns // 1000)
+
+    def __getitem__(self, key):
+        if key in self._computed:
+            return getattr(self, key)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        if key in self._computed:
+            return getattr(self, key)
+        return super().get(key, default)
+
+    def keys(self):
+        return ('type', 'amount', 'timestamp', 'recipient', 'balance_after')
+
+    def balance_change(self):
+        if self.code in CREDIT_TYPES:
+            return self.amount
+        if self.code in DEBIT_TYPES:
+            return -self.amount
+        return 0
@@ -0,0 +1,371 @@
+# Account registry shared by the console, TUI and GUI versions.
+# It keeps the plain accounts list (so accounts[i] still works everywhere)
+# plus an account_number -> list index map, so login and transfer don't
+# have to scan every account.
+# It also owns the account number allocator, whose check digit lets
+# lookups reject a mistyped number without touching the index.
+# With columnar_history=True every account added keeps its history in a
+# ColumnarHistory instead of a list, and with ledger_dir set it keeps it in
+# a memory-mapped ledger file in that directory (see ledger.py). Restored
+# accounts reopen the ledger an earlier run left; replaying the journal
+# then skips the rows the ledger already has, and cuts off any rows the
+# journal doesn't have.
+# Once a journal is attached, new accounts and every recorded transaction
+# are also appended to it. With snapshot_every=N a snapshot of the accounts
+# and their histories is written every N journal records, and the next
+# startup loads it and replays only the journal records written after it.
+# The journal is locked while it is attached (see journal.py), and only a
+# record torn off at the very end of the file is ever cut from it.
+# A transaction is added to the history and the journal under the registry
+# lock, so a snapshot never holds a transaction its offset doesn't cover.
+# With a storage backend attached (see storage.py) accounts missing from
+# memory are looked up in the storage, logins reload the balance and PIN
+# and pick up the transactions other programs recorded for the account,
+# and new accounts and transactions are written through to it.
+# Balances change through change_balances(); with a storage attached the
+# funds check and the update happen there, on the shared balances, so
+# programs sharing the storage can't overdraw an account between them.
+# Every account has its own lock; locked(i, j, ...) takes the locks of
+# several accounts in index order, so two threads transferring between the
+# same accounts in opposite directions can't deadlock. The locks are
+# reentrant, so a batch can lock every account it touches up front and
+# then run ordinary operations. Adding accounts and allocating numbers is
+# guarded by one registry-wide lock.
+# commit() makes everything recorded so far durable (journal fsync and
+# storage flush), so a batch of operations can share one commit.
+
+import os
+import sys
+import threading
+from bisect import bisect_right
+from contextlib import contextmanager
+
+from allocator import make_allocator
+from history import enable_columnar
+from journal import Journal, create_record, replay, torn_tail, transaction_record
+from ledger import enable_ledger
+from money import MAX_CENTAVOS, Money
+from snapshot import load_snapshot, write_snapshot
+from timeline import timestamps
+
+SNAPSHOT_EVERY = 100_000  # journal records between the front-ends' snapshots
+
+
+class AccountRegistry:
+    def __init__(self, accounts=None, allocator=None, columnar_history=False, ledger_dir=None):
+        self._accounts = []
+        self._index = {}
+        self._locks = []
+        self._lock = threading.RLock()
+        self.allocator = allocator if allocator is not None else make_allocator()
+        self.columnar_history = columnar_history
+        self.ledger_dir = ledger_dir
+        self.journal = None
+        self.storage = None
+        self.snapshot_path = None
+        self.snapshot_every = None
+        self._since_snapshot = 0
+        self.snapshot_error = None  # why the last automatic snapshot failed
+        self._ledger_rows = {}  # index -> reopened ledger rows replay hasn't reached
+        self._unrecorded = {}   # index -> balance before a change not recorded yet
+        for account in accounts or []:
+            self.append(account)
+
+    def append(self, account, log=True):
+        acc_num = account['account_number']
+        with self._lock:
+            if acc_num in self._index:
+                raise ValueError(f"Account number {acc_num} already exists")
+            # encode first: a field the journal can't hold raises ValueError
+            # before anything changes
+            record = create_record(account) if log and self.journal is not None else None
+            self._add(account, restored=not log)
+            if record is not None:
+                self.journal.append(record)
+                self._logged()
+            if log and self.storage is not None:
+                self.storage.add_account(account)
+
+    def extend(self, accounts):
+        # append() for a chunk of new accounts, with one journal write and
+        # one storage batch; nothing is added if any number is taken
+        accounts = list(accounts)
+        with self._lock:
+            numbers = set()
+            for account in accounts:
+                acc_num = account['account_number']
+                if acc_num in self._index or acc_num in numbers:
+                    raise ValueError(f"Account number {acc_num} already exists")
+                numbers.add(acc_num)
+            records = [create_record(account) for account in accounts] if self.journal is not None else None
+            for account in accounts:
+                self._add(account, restored=False)
+            if records is not None:
+                self.journal.append_many(records)
+                self._logged(len(accounts))
+            if self.storage is not None:
+                self.storage.add_accounts(accounts)
+
+    def _add(self, account, restored):
+        # caller holds self._lock
+        acc_num = account['account_number']
+        if self.ledger_dir is not None:
+            known = len(account['transaction_history'])
+            ledger = enable_ledger(account, os.path.join(self.ledger_dir, acc_num + '.ledger'), restored)
+            if len(ledger) > known:
+                self._ledger_rows[len(self._accounts)] = len(ledger) - known
+        elif self.columnar_history:
+            enable_columnar(account)
+        self._locks.append(threading.RLock())
+        self._index[acc_num] = len(self._accounts)
+        self._accounts.append(account)
+
+    @contextmanager
+    def locked(self, *indices):
+        locks = [self._locks[i] for i in sorted(set(indices))]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def change_balances(self, changes):
+        # changes: (index, amount) pairs, applied together; returns the
+        # balance after each change, or None (changing nothing) if a balance
+        # would go below zero. The caller holds the accounts' locks and
+        # records the transactions afterwards.
+        accounts = self._accounts
+        if self.storage is not None:
+            balances = self.storage.change_balances(
+                [(accounts[index]['account_number'], int(amount)) for index, amount in changes])
+            if balances is None:
+                # the balances here were stale; bring them up to date
+                for index, _ in changes:
+                    self._refresh(index)
+                return None
+            balances = [Money(balance) for balance in balances]
+            for (index, _), balance in zip(changes, balances):
+                self._unrecorded.setdefault(index, accounts[index]['balance'])
+                accounts[index]['balance'] = balance
+            return balances
+        if any(amount < 0 and accounts[index]['balance'] + amount < 0 for index, amount in changes):
+            return None
+        if any(accounts[index]['balance'] + amount > MAX_CENTAVOS for index, amount in changes):
+            raise ValueError("Balance out of range")
+        balances = []
+        for index, amount in changes:
+            self._unrecorded.setdefault(index, accounts[index]['balance'])
+            accounts[index]['balance'] += amount
+            balances.append(accounts[index]['balance'])
+        return balances
+
+    def _refresh(self, index):
+        # reloads an account from the storage, adding the transactions other
+        # programs recorded for it to its history in timestamp order; the
+        # caller holds the account's lock
+        new = self.storage.refresh(self._accounts[index])
+        if not new:
+            return
+        history = self._accounts[index]['transaction_history']
+        # rows of ours newer than the first new one are put back after it
+        keep = bisect_right(timestamps(history), new[0].timestamp_ns)
+        tail = list(history[keep:])
+        if isinstance(history, list):
+            del history[keep:]
+        else:
+            history.truncate(keep)
+        for transaction in sorted(tail + new, key=lambda transaction: transaction.timestamp_ns):
+            history.append(transaction)
+
+    def recorded_balance(self, index):
+        # the balance the recorded history accounts for: after
+        # change_balances() and until the transaction is recorded, the
+        # balance from before the change. Snapshots use it (under
+        # self._lock, which record() needs), so they never hold a balance
+        # their history and journal offset don't explain. The balance is
+        # read first: a change starting meanwhile notes the old one first.
+        balance = self._accounts[index]['balance']
+        return self._unrecorded.get(index, balance)
+
+    def restore(self, index, transaction):
+        # adds a transaction read back from the journal to the history,
+        # unless a reopened ledger has it already
+        skip = self._ledger_rows.get(index)
+        if skip:
+            self._ledger_rows[index] = skip - 1
+            return
+        self._accounts[index]['transaction_history'].append(transaction)
+
+    def record(self, index, transaction):
+        # call after the balance (or PIN) change the transaction describes,
+        # while still holding the account's lock
+        account = self._accounts[index]
+        record = transaction_record(account, transaction) if self.journal is not None else None
+        with self._lock:
+            account['transaction_history'].append(transaction)
+            self._unrecorded.pop(index, None)
+            if record is not None:
+                self.journal.append(record)
+                self._logged()
+        if self.storage is not None:
+            self.storage.record(account, transaction)
+
+    def record_many(self, entries):
+        # record() for a batch of (index, transaction) pairs, with one
+        # journal write and one storage batch; the caller holds the locks
+        # of every account involved
+        accounts = self._accounts
+        entries = list(entries)
+        pairs = [(accounts[index], transaction) for index, transaction in entries]
+        records = ([transaction_record(account, transaction) for account, transaction in pairs]
+                   if self.journal is not None else None)
+        with self._lock:
+            for account, transaction in pairs:
+                account['transaction_history'].append(transaction)
+            for index, _ in entries:
+                self._unrecorded.pop(index, None)
+            if records is not None:
+                self.journal.append_many(records)
+                self._logged(len(pairs))
+        if self.storage is not None:
+            self.storage.record_many(pairs)
+
+    def commit(self):
+        if self.journal is not None:
+            self.journal.sync()
+        if self.storage is not None:
+            self.storage.flush()
+
+    def _logged(self, count=1):
+        # runs after the journal append, so the operation has happened:
+        # a snapshot that can't be written is reported, not raised, and
+        # tried again snapshot_every records later
+        with self._lock:
+            self._since_snapshot += count
+            if self.snapshot_every and self._since_snapshot >= self.snapshot_every:
+                try:
+                    self.checkpoint()
+                except Exception as e:
+                    self._since_snapshot = 0
+                    self.snapshot_error = e
+                    print(f"Snapshot {self.snapshot_path} not written: {e}", file=sys.stderr)
+
+    def checkpoint(self):
+        self.journal.sync()
+        write_snapshot(self, self.snapshot_path, self.journal.written)
+        self._since_snapshot = 0
+        self.snapshot_error = None
+
+    def attach_journal(self, path, snapshot_every=None, **options):
+        # rebuild the accounts from the latest snapshot (if any) and the
+        # journal records after it, then keep logging to the journal
+        # the journal is opened (and locked) first, so no other program can
+        # append to it while it is read back
+        journal = Journal(path, **options)
+        try:
+            self.snapshot_path = path + '.snapshot'
+            self.snapshot_every = snapshot_every
+            offset = 0
+            if os.path.exists(self.snapshot_path):
+                offset = load_snapshot(self, self.snapshot_path)
+            end = replay(self, path, offset)
+            if journal.written > end:
+                # drop a torn record left by a crash so new records follow
+                # valid ones; damage anywhere else is left for a person
+                if not torn_tail(path, end):
+                    raise ValueError(f"{path} is damaged at offset {end}; not truncating it")
+                journal.truncate(end)
+        except BaseException:
+            journal.close()
+            raise
+        # ledger rows written after the last journal record didn't happen
+        for index, rows in self._ledger_rows.items():
+            if rows:
+                ledger = self._accounts[index]['transaction_history']
+                ledger.truncate(len(ledger) - rows)
+        self._ledger_rows.clear()
+        self.journal = journal
+        return journal
+
+    def attach_storage(self, storage):
+        self.storage = storage
+        # every program sharing the storage must use the same permutation,
+        # otherwise their account numbers could collide
+        key = getattr(self.allocator, 'key', None)
+        if key is not None:
+            shared_key = storage.shared_value('allocator_key', key)
+            if shared_key != key:
+                self.allocator = type(self.allocator)(width=self.allocator.width, key=shared_key)
+        return storage
+
+    def clear(self):
+        with self._lock:
+            self._accounts.clear()
+            self._index.clear()
+            self._locks.clear()
+
+    def new_account_number(self):
+        with self._lock:
+            return self._new_account_number()
+
+    def _new_account_number(self):
+        while True:
+            if self.storage is not None:
+                # the counter is shared by every program using the storage
+                self.allocator.counter = self.storage.next_counter('allocator_counter')
+            acc_num = self.allocator.allocate()
+            # skip numbers that were added without going through the allocator
+            if acc_num in self._index:
+                continue
+            if self.storage is not None and self.storage.get_account(acc_num) is not None:
+                continue
+            return acc_num
+
+    def exists(self, account_number):
+        return account_number in self._index
+
+    def index_of(self, account_number):
+        # lookup without the check-digit test, for numbers we wrote ourselves
+        return self._index.get(account_number)
+
+    def find(self, account_number):
+        # index of the account, or None if there is no such account
+        if not self.allocator.validate(account_number):
+            return None
+        index = self._index.get(account_number)
+        if index is None and self.storage is not None:
+            account = self.storage.get_account(account_number)
+            if account is not None:
+                with self._lock:
+                    # another thread may have loaded it meanwhile
+                    index = self._index.get(account_number)
+                    if index is None:
+                        index = len(self._accounts)
+                        self.append(account, log=False)
+        return index
+
+    def get(self, account_number):
+        index = self.find(account_number)
+        if index is None:
+            return None
+        return self._accounts[index]
+
+    def authenticate(self, account_number, pin):
+        index = self.find(account_number)
+        if index is not None and self.storage is not None:
+            with self.locked(index):
+                self._refresh(index)
+        if index is not None and self._accounts[index]['pin'] == pin:
+            return index
+        return None
+
+    def __getitem__(self, index):
+        return self._accounts[index]
+
+    def __len__(self):
+        return len(self._accounts)
+
+    def __iter__(self):
+        return iter(self._accounts)
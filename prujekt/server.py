@@ -0,0 +1,263 @@
+# Asyncio ATM server for remote terminals.
+# Each connection gets its own Session and speaks a line protocol: one
+# request per line, words separated by spaces, and one reply line per
+# request, starting with OK or ERR. HISTORY replies with "OK <n>" followed
+# by n lines of tab-separated fields.
+#
+#   CREATE <pin> <initial deposit> <name>   OK <account number>
+#   LOGIN <account number> <pin>            OK <name>
+#   BALANCE                                 OK <balance>
+#   DEPOSIT <amount>                        OK <new balance>
+#   WITHDRAW <amount>                       OK <new balance>
+#   TRANSFER <account number> <amount>      OK <new balance>
+#   HISTORY [page]                          OK <n>, then n transactions,
+#                                           newest first
+#   PIN <current pin> <new pin>             OK
+#   LOGOUT                                  OK
+#   PING                                    OK PONG
+#   QUIT                                    OK BYE, then the server closes
+#
+# A connection that sends nothing for idle_timeout seconds is closed, and
+# connections past max_connections are refused. The server handles one
+# request per connection at a time and waits for each reply to drain
+# before reading the next request, so a client that doesn't read its
+# replies stops being served instead of filling up server memory.
+#
+# Run: python server.py [--host HOST] [--port PORT] [--unix PATH]
+
+import argparse
+import asyncio
+import sys
+
+from journal import JournalInUse
+from money import Money
+from records import Account
+from registry import SNAPSHOT_EVERY, AccountRegistry
+from session import (AccountNotFound, InsufficientFunds, InvalidAmount, InvalidPin,
+                     NotLoggedIn, SameAccount, Session, SessionError, valid_amount, valid_name, valid_pin)
+
+JOURNAL_PATH = "./data/server.journal"
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def parse_amount(text):
+    try:
+        return Money.parse(text)
+    except ValueError:
+        raise ProtocolError("invalid amount") from None
+
+
+class ATMServer:
+    def __init__(self, registry, idle_timeout=300.0, max_connections=1000, max_line=1024):
+        self.registry = registry
+        self.idle_timeout = idle_timeout
+        self.max_connections = max_connections
+        self.max_line = max_line
+        self.connections = 0
+        self.requests = 0
+        self._servers = []
+        self._commands = {
+            'CREATE': self.create,
+            'LOGIN': self.login,
+            'BALANCE': self.balance,
+            'DEPOSIT': self.deposit,
+            'WITHDRAW': self.withdraw,
+            'TRANSFER': self.transfer,
+            'HISTORY': self.history,
+            'PIN': self.change_pin,
+            'LOGOUT': self.logout,
+            'PING': self.ping,
+        }
+
+    async def start_tcp(self, host='127.0.0.1', port=8023):
+        server = await asyncio.start_server(self.handle, host, port, limit=self.max_line)
+        self._servers.append(server)
+        return server
+
+    async def start_unix(self, path):
+        server = await asyncio.start_unix_server(self.handle, path, limit=self.max_line)
+        self._servers.append(server)
+        return server
+
+    async def serve_forever(self):
+        await asyncio.gather(*(server.serve_forever() for server in self._servers))
+
+    def close(self):
+        for server in self._servers:
+            server.close()
+
+    async def handle(self, reader, writer):
+        if self.connections >= self.max_connections:
+            writer.write(b"ERR server busy\n")
+            await self._close(writer)
+            return
+        self.connections += 1
+        session = Session(self.registry)
+        try:
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    writer.write(b"ERR idle timeout\n")
+                    break
+                except ValueError:  # longer than max_line
+                    writer.write(b"ERR line too long\n")
+                    break
+                if not line:
+                    break
+                words = line.decode('utf-8', 'replace').split()
+                if not words:
+                    continue
+                command = words[0].upper()
+                if command == 'QUIT':
+                    writer.write(b"OK BYE\n")
+                    break
+                writer.write(self.dispatch(session, command, words[1:]).encode('utf-8'))
+                # backpressure: don't read the next request until the
+                # client has taken this reply
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            await self._close(writer)
+
+    async def _close(self, writer):
+        try:
+            await writer.drain()
+            writer.close()
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+    def dispatch(self, session, command, args):
+        # returns the reply, one or more newline-terminated lines
+        self.requests += 1
+        handler = self._commands.get(command)
+        if handler is None:
+            return f"ERR unknown command {command}\n"
+        try:
+            return handler(session, args)
+        except ProtocolError as e:
+            return f"ERR {e}\n"
+        except NotLoggedIn:
+            return "ERR not logged in\n"
+        except InvalidAmount:
+            return "ERR invalid amount\n"
+        except InsufficientFunds:
+            return "ERR insufficient funds\n"
+        except AccountNotFound:
+            return "ERR recipient account not found\n"
+        except SameAccount:
+            return "ERR cannot transfer to your own account\n"
+        except InvalidPin:
+            return "ERR PIN must be 4 digits\n"
+        except SessionError as e:
+            return f"ERR {e}\n"
+
+    def _expect(self, args, count, usage):
+        if len(args) != count:
+            raise ProtocolError(f"usage: {usage}")
+
+    def create(self, session, args):
+        if len(args) < 3:
+            raise ProtocolError("usage: CREATE <pin> <initial deposit> <name>")
+        pin, amount, name = args[0], parse_amount(args[1]), " ".join(args[2:])
+        if not valid_pin(pin):
+            raise InvalidPin(pin)
+        if not valid_amount(amount):
+            raise InvalidAmount(amount)
+        # checked here so a name the journal can't hold gets an ERR reply
+        # instead of an exception out of append()
+        if not valid_name(name):
+            raise ProtocolError("invalid name")
+        account = Account(self.registry.new_account_number(), name, pin, amount)
+        self.registry.append(account)
+        return f"OK {account['account_number']}\n"
+
+    def login(self, session, args):
+        self._expect(args, 2, "LOGIN <account number> <pin>")
+        if not session.login(*args):
+            return "ERR invalid account number or PIN\n"
+        return f"OK {session.account['name']}\n"
+
+    def balance(self, session, args):
+        return f"OK {session.balance():.2f}\n"
+
+    def deposit(self, session, args):
+        self._expect(args, 1, "DEPOSIT <amount>")
+        return f"OK {session.deposit(parse_amount(args[0])):.2f}\n"
+
+    def withdraw(self, session, args):
+        self._expect(args, 1, "WITHDRAW <amount>")
+        return f"OK {session.withdraw(parse_amount(args[0])):.2f}\n"
+
+    def transfer(self, session, args):
+        self._expect(args, 2, "TRANSFER <account number> <amount>")
+        session.transfer(args[0], parse_amount(args[1]))
+        return f"OK {session.balance():.2f}\n"
+
+    def history(self, session, args):
+        if len(args) > 1 or (args and not args[0].isdigit()):
+            raise ProtocolError("usage: HISTORY [page]")
+        page = session.history().page(int(args[0]) if args else 0)
+        lines = [f"OK {len(page)}\n"]
+        for transaction in page:
+            lines.append(f"{transaction['type']}\t{transaction['amount']:.2f}\t"
+                         f"{transaction['timestamp']:%Y-%m-%d %H:%M:%S}\t{transaction['balance_after']:.2f}\t"
+                         f"{transaction['recipient'] or '-'}\n")
+        return "".join(lines)
+
+    def change_pin(self, session, args):
+        self._expect(args, 2, "PIN <current pin> <new pin>")
+        if args[0] != session.account['pin']:
+            return "ERR incorrect current PIN\n"
+        session.change_pin(args[1])
+        return "OK\n"
+
+    def logout(self, session, args):
+        session.logout()
+        return "OK\n"
+
+    def ping(self, session, args):
+        return "OK PONG\n"
+
+
+async def serve(registry, host, port, unix_path=None, **options):
+    server = ATMServer(registry, **options)
+    if unix_path:
+        await server.start_unix(unix_path)
+        print(f"ATM server listening on {unix_path}")
+    else:
+        await server.start_tcp(host, port)
+        print(f"ATM server listening on {host}:{port}")
+    await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ATM line-protocol server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8023)
+    parser.add_argument('--unix', help="listen on a Unix socket instead of TCP")
+    parser.add_argument('--idle-timeout', type=float, default=300.0)
+    parser.add_argument('--max-connections', type=int, default=1000)
+    parser.add_argument('--journal', default=JOURNAL_PATH)
+    args = parser.parse_args()
+
+    accounts = AccountRegistry()
+    try:
+        accounts.attach_journal(args.journal, snapshot_every=SNAPSHOT_EVERY)
+    except JournalInUse as e:
+        sys.exit(str(e))
+    try:
+        asyncio.run(serve(accounts, args.host, args.port, args.unix,
+                          idle_timeout=args.idle_timeout, max_connections=args.max_connections))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# Customer sessions.
+# A Session is one logged-in customer: the registry it works on plus the
+# index of the account that logged in. Every banking operation goes through
+# a session instead of a module-level current_account_index, so a single
+# process can serve many customers at once (threads, asyncio tasks, several
+# GUI windows), each with its own Session.
+# Operations check their input and raise a SessionError subclass when they
+# can't be done; the front-ends catch these and show their own message.
+# Each operation holds the locks of the accounts it touches (both of them,
+# for a transfer) from the balance check until the transaction is
+# recorded, so sessions on different threads can share one registry. The
+# check and the balance change itself are the registry's change_balances(),
+# which also guards balances shared with other programs through a storage.
+
+from journal import MAX_FIELD_BYTES
+from money import MAX_CENTAVOS, Money
+from records import Transaction, TxType
+from timeline import PAGE_SIZE, HistoryCursor
+
+
+class SessionError(Exception):
+    pass
+
+
+class NotLoggedIn(SessionError):
+    pass
+
+
+class InvalidAmount(SessionError):
+    pass
+
+
+class InsufficientFunds(SessionError):
+    pass
+
+
+class AccountNotFound(SessionError):
+    pass
+
+
+class SameAccount(SessionError):
+    pass
+
+
+class InvalidPin(SessionError):
+    pass
+
+
+def valid_pin(pin):
+    # four ASCII digits; str.isdigit() alone also takes '١٢٣٤' or '¹²³⁴'
+    return len(pin) == 4 and pin.isascii() and pin.isdigit()
+
+
+def valid_name(name):
+    # letters, single spaces and single dots, starting and ending with a
+    # letter (the rule the account creation screens use), and short enough
+    # for the journal
+    return (bool(name) and all(char.isalpha() or char.isspace() or char == '.' for char in name)
+            and name[0].isalpha() and name[-1].isalpha() and '..' not in name and '  ' not in name
+            and len(name.encode('utf-8')) <= MAX_FIELD_BYTES)
+
+
+def valid_amount(amount):
+    # positive and small enough to store
+    return 0 < amount <= MAX_CENTAVOS
+
+
+class Session:
+    def __init__(self, registry):
+        self.registry = registry
+        self.account_index = None
+
+    @property
+    def logged_in(self):
+        return self.account_index is not None
+
+    @property
+    def account(self):
+        if self.account_index is None:
+            raise NotLoggedIn("You are not logged in")
+        return self.registry[self.account_index]
+
+    def login(self, account_number, pin):
+        self.account_index = self.registry.authenticate(account_number, pin)
+        return self.account_index is not None
+
+    def logout(self):
+        self.account_index = None
+
+    def record(self, transaction_type, amount, recipient=None, index=None):
+        # call after the balance (or PIN) change the transaction describes;
+        # index defaults to this session's account
+        if index is None:
+            index = self.account_index
+        account = self.registry[index]
+        self.registry.record(index, Transaction(transaction_type, amount, recipient, account['balance']))
+
+    def balance(self):
+        return self.account['balance']
+
+    def deposit(self, amount):
+        account = self.account
+        if not valid_amount(amount):
+            raise InvalidAmount("Invalid amount")
+        with self.registry.locked(self.account_index):
+            if amount > MAX_CENTAVOS - account['balance']:
+                raise InvalidAmount("Amount too large")
+            self.registry.change_balances(((self.account_index, amount),))
+            self.record(TxType.DEPOSIT, amount)
+            return account['balance']
+
+    def withdraw(self, amount):
+        account = self.account
+        if not valid_amount(amount):
+            raise InvalidAmount("Invalid amount")
+        with self.registry.locked(self.account_index):
+            if self.registry.change_balances(((self.account_index, -amount),)) is None:
+                raise InsufficientFunds("Insufficient funds")
+            self.record(TxType.WITHDRAWAL, amount)
+            return account['balance']
+
+    def transfer(self, recipient_number, amount, sent_type=TxType.TRANSFER, received_type=TxType.TRANSFER_RECEIVED):
+        # returns the recipient's account
+        account = self.account
+        recipient_index = self.registry.find(recipient_number)
+        if recipient_index is None:
+            raise AccountNotFound("Recipient account not found")
+        if recipient_index == self.account_index:
+            raise SameAccount("Cannot transfer to your own account")
+        if not valid_amount(amount):
+            raise InvalidAmount("Invalid amount")
+        recipient = self.registry[recipient_index]
+        with self.registry.locked(self.account_index, recipient_index):
+            if amount > MAX_CENTAVOS - recipient['balance']:
+                raise InvalidAmount("Amount too large")
+            if self.registry.change_balances(((self.account_index, -amount), (recipient_index, amount))) is None:
+                raise InsufficientFunds("Insufficient funds")
+            self.record(sent_type, amount, recipient['account_number'])
+            self.record(received_type, amount, account['account_number'], index=recipient_index)
+        return recipient
+
+    def change_pin(self, new_pin):
+        account = self.account
+        if not valid_pin(new_pin):
+            raise InvalidPin("PIN must be 4 digits")
+        with self.registry.locked(self.account_index):
+            account['pin'] = new_pin
+            self.record(TxType.PIN_CHANGE, Money(0))
+
+    def history(self, start=None, end=None, page_size=PAGE_SIZE):
+        return HistoryCursor(self.account['transaction_history'], page_size, start, end)
@@ -0,0 +1,140 @@
+# Snapshots of the accounts table for fast startup.
+# A snapshot stores every account (number, PIN, balance, name) with its
+# whole transaction history, plus the allocator state and the journal
+# offset it covers. On startup the snapshot is loaded and only the journal
+# records after that offset are replayed. The history is stored as
+# columns, the way ColumnarHistory keeps it, so loading an account's
+# history copies a few slices of the file instead of decoding and
+# building one Transaction per journal record; accounts loaded from a
+# snapshot have a ColumnarHistory.
+#
+# File layout (little endian), read back through mmap:
+#   header   HEADER
+#   table    one fixed-width ROW per account
+#   history  the amount, balance_after and timestamp_ns columns (q), the
+#            counterparty column (i) and the code column (H) of every
+#            account's history, one after the other, each account's rows
+#            starting at its ROW's first_row; counterparty ids are indexes
+#            into the account's own run of the counterparty table
+#   parties  counterparty account numbers, 16 bytes each, zero padded
+#   heap     account names, utf-8, referenced by (offset, length) in ROW
+
+import mmap
+import os
+import struct
+from array import array
+
+from allocator import ALLOCATORS
+from history import ColumnarHistory
+from money import Money
+from records import Account
+
+MAGIC = b'ATMSNAP\x02'
+# magic, journal offset, account count, heap size,
+# allocator kind, allocator width, allocator counter, allocator key,
+# history rows, counterparties
+HEADER = struct.Struct('<8sQQQBBQQQQ')
+# account number, pin, balance (centavos), name offset, name length,
+# first history row, history rows, first counterparty, counterparties
+ROW = struct.Struct('<16s8sqQHQQQQ')
+NUMBER_BYTES, PIN_BYTES = 16, 8
+PARTY = struct.Struct('<16s')
+# history columns in file order
+COLUMNS = ('amount', 'balance_after', 'timestamp_ns', 'counterparty', 'code')
+
+_kinds = {allocator_class: code for code, allocator_class in enumerate(ALLOCATORS.values(), 1)}
+_classes = {code: allocator_class for allocator_class, code in _kinds.items()}
+
+
+def _history_columns(history):
+    # (columns, counterparties) of one account's history
+    if isinstance(history, ColumnarHistory):
+        return history.views(), history.counterparties
+    columnar = ColumnarHistory(history, capacity=len(history))
+    return columnar.views(), columnar.counterparties
+
+
+def write_snapshot(registry, path, journal_offset):
+    table = bytearray(ROW.size * len(registry))
+    heap = bytearray()
+    columns = {name: array(typecode) for name, typecode in ColumnarHistory.COLUMNS.items()}
+    parties = bytearray()
+    rows = party_count = 0
+    pack_into = ROW.pack_into
+    for i, account in enumerate(registry):
+        history, counterparties = _history_columns(account['transaction_history'])
+        name = account['name'].encode('utf-8')
+        account_number = account['account_number'].encode('ascii')
+        pin = account['pin'].encode('ascii')
+        # struct would cut a longer field short without a word
+        if len(account_number) > NUMBER_BYTES or len(pin) > PIN_BYTES:
+            raise ValueError(f"Account {account['account_number']} doesn't fit in a snapshot row")
+        pack_into(table, i * ROW.size, account_number, pin, registry.recorded_balance(i), len(heap), len(name),
+                  rows, len(history['code']), party_count, len(counterparties))
+        heap += name
+        for column, view in history.items():
+            columns[column].frombytes(view.cast('B'))
+        parties += b''.join(PARTY.pack(number.encode('ascii')) for number in counterparties)
+        rows += len(history['code'])
+        party_count += len(counterparties)
+
+    allocator = registry.allocator
+    header = HEADER.pack(MAGIC, journal_offset, len(registry), len(heap),
+                         _kinds.get(type(allocator), 0), allocator.width, allocator.counter,
+                         getattr(allocator, 'key', 0), rows, party_count)
+    # write to a temporary file and rename, so a crash never leaves a
+    # half-written snapshot in place of the last good one
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(header)
+        f.write(table)
+        for column in COLUMNS:
+            columns[column].tofile(f)
+        f.write(parties)
+        f.write(heap)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def load_snapshot(registry, path):
+    # adds the snapshot's accounts to registry, returns the journal offset
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        view = memoryview(mm)
+        try:
+            (magic, journal_offset, count, heap_size, kind, width, counter, key,
+             rows, party_count) = HEADER.unpack_from(view)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not an account snapshot")
+            pos = HEADER.size + count * ROW.size
+            # column name -> (file offset, item size)
+            columns = {}
+            for column in COLUMNS:
+                itemsize = array(ColumnarHistory.COLUMNS[column]).itemsize
+                columns[column] = pos, itemsize
+                pos += rows * itemsize
+            parties = view[pos:pos + party_count * PARTY.size]
+            heap = view[pos + len(parties):pos + len(parties) + heap_size]
+            append = registry.append
+            for (acc_num, pin, balance, name_offset, name_len, first_row, history_rows,
+                 first_party, history_parties) in ROW.iter_unpack(view[HEADER.size:HEADER.size + count * ROW.size]):
+                name = str(heap[name_offset:name_offset + name_len], 'utf-8')
+                history = ColumnarHistory.from_columns(
+                    {column: view[offset + first_row * itemsize:offset + (first_row + history_rows) * itemsize]
+                     for column, (offset, itemsize) in columns.items()},
+                    [number.rstrip(b'\0').decode('ascii') for number, in PARTY.iter_unpack(
+                        parties[first_party * PARTY.size:(first_party + history_parties) * PARTY.size])])
+                append(Account(acc_num.rstrip(b'\0').decode('ascii'), name,
+                               pin.rstrip(b'\0').decode('ascii'), Money(balance), history), log=False)
+            heap.release()
+            parties.release()
+        finally:
+            view.release()
+
+    allocator = registry.allocator
+    if _classes.get(kind) is type(allocator) and allocator.width == width:
+        allocator.counter = max(allocator.counter, counter)
+        if hasattr(allocator, 'key') and key != allocator.key:
+            # keep handing out numbers from the same permutation
+            registry.allocator = type(allocator)(width=width, start=allocator.counter, key=key)
+    return journal_offset
@@ -0,0 +1,181 @@
+# Streaming statement export to CSV or JSON Lines.
+# account_rows() and bank_rows() are generators that decode the history
+# BATCH transactions at a time (slices of a ledger or columnar history
+# only decode the rows asked for), and the writers format each batch into
+# one string and write it in one call. Only one batch is in memory at a
+# time, so a statement can be far larger than memory.
+# Every row has the columns in COLUMNS, so single-account and whole-bank
+# exports share a format.
+# journal_rows() yields the same rows straight from a journal file, in
+# journal order, keeping nothing but the account names in memory; the
+# command line exports that way instead of replaying the journal into a
+# registry first.
+#
+# Run: python statement.py <output|-> [--account NUMBER] [--format csv|jsonl]
+#                          [--from YYYY-MM-DD] [--to YYYY-MM-DD] [--journal PATH]
+# Without --account the whole bank is exported.
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from datetime import datetime
+
+from journal import OP_CREATE, read_records
+from records import Transaction
+from timeline import day_range, parse_date, range_indices, to_ns
+
+JOURNAL_PATH = "./data/atm.journal"
+STATEMENT_DIR = "./statements"
+FORMATS = ('csv', 'jsonl')
+COLUMNS = ('account_number', 'name', 'type', 'amount', 'timestamp', 'balance_after', 'recipient')
+BATCH = 4096
+BUFFER_SIZE = 1 << 20
+
+
+def _pesos(centavos):
+    # same text as f"{money:.2f}", without going through Money.__format__
+    sign = '-' if centavos < 0 else ''
+    pesos, centavos = divmod(abs(int(centavos)), 100)
+    return f"{sign}{pesos}.{centavos:02d}"
+
+
+def account_rows(account, start=None, end=None):
+    # yields one tuple of COLUMNS per transaction, oldest first
+    history = account['transaction_history']
+    if start is None and end is None:
+        first, stop = 0, len(history)
+    else:
+        first, stop = range_indices(history, start, end)
+    acc_num, name = account['account_number'], account['name']
+    for batch_start in range(first, stop, BATCH):
+        for transaction in history[batch_start:min(stop, batch_start + BATCH)]:
+            yield _row(acc_num, name, transaction)
+
+
+def _row(acc_num, name, transaction):
+    return (acc_num, name, transaction.type, _pesos(transaction.amount),
+            transaction.timestamp.isoformat(' ', 'seconds'),
+            _pesos(transaction.balance_after), transaction.recipient or '')
+
+
+def bank_rows(registry, start=None, end=None):
+    for account in registry:
+        yield from account_rows(account, start, end)
+
+
+def journal_rows(path, account_number=None, start=None, end=None, names=None):
+    # yields a row per transaction record in the journal at path (only
+    # account_number's, if given), in the order they were journaled;
+    # names, if given, is filled with account number -> name as account
+    # creations are read
+    start_ns = None if start is None else to_ns(start)
+    end_ns = None if end is None else to_ns(end)
+    names = {} if names is None else names
+    for _, (op, code, amount, balance, timestamp_ns, acc_num, counterparty, name, _) in read_records(path):
+        if op == OP_CREATE:
+            names[acc_num] = name
+            continue
+        if (account_number is not None and acc_num != account_number
+                or start_ns is not None and timestamp_ns < start_ns
+                or end_ns is not None and timestamp_ns >= end_ns):
+            continue
+        yield _row(acc_num, names.get(acc_num, ''), Transaction(code, amount, counterparty, balance, timestamp_ns))
+
+
+def _batches(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def write_csv(stream, rows):
+    # returns the number of rows written
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    stream.write(",".join(COLUMNS) + "\r\n")
+    count = 0
+    for batch in _batches(rows):
+        writer.writerows(batch)
+        stream.write(buffer.getvalue())
+        buffer.seek(0)
+        buffer.truncate()
+        count += len(batch)
+    return count
+
+
+def write_jsonl(stream, rows):
+    dumps = json.dumps
+    count = 0
+    for batch in _batches(rows):
+        stream.write("".join(dumps(dict(zip(COLUMNS, row)), ensure_ascii=False) + "\n" for row in batch))
+        count += len(batch)
+    return count
+
+
+def export(stream, rows, file_format='csv'):
+    if file_format == 'csv':
+        return write_csv(stream, rows)
+    if file_format == 'jsonl':
+        return write_jsonl(stream, rows)
+    raise ValueError(f"unknown format {file_format!r}")
+
+
+def export_file(path, rows, file_format=None):
+    # file_format defaults to the file extension; returns the row count
+    if file_format is None:
+        file_format = 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', newline='', encoding='utf-8', buffering=BUFFER_SIZE) as stream:
+        return export(stream, rows, file_format)
+
+
+def statement_path(account, file_format='csv'):
+    # default file name for an account's statement
+    return os.path.join(STATEMENT_DIR, f"{account['account_number']}_{datetime.now():%Y%m%d_%H%M%S}.{file_format}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export transaction history as CSV or JSON Lines")
+    parser.add_argument('output', help="output file, or - for stdout")
+    parser.add_argument('--account', help="export only this account")
+    parser.add_argument('--format', choices=FORMATS, help="default: from the file extension, csv for stdout")
+    parser.add_argument('--from', dest='start', default='', help="first day (YYYY-MM-DD)")
+    parser.add_argument('--to', dest='end', default='', help="last day (YYYY-MM-DD)")
+    parser.add_argument('--journal', default=JOURNAL_PATH)
+    args = parser.parse_args()
+
+    try:
+        start, end = day_range(parse_date(args.start), parse_date(args.end))
+    except ValueError:
+        sys.exit("Invalid date. Please use YYYY-MM-DD.")
+    if not os.path.exists(args.journal):
+        sys.exit(f"No journal at {args.journal}")
+    # the journal holds every transaction (snapshots don't trim it), so the
+    # rows are streamed from it one record at a time
+    names = {}
+    rows = journal_rows(args.journal, args.account, start, end, names)
+
+    if args.output == '-':
+        count = export(sys.stdout, rows, args.format or 'csv')
+    else:
+        count = export_file(args.output, rows, args.format)
+    if args.account and args.account not in names:
+        if args.output != '-':
+            os.remove(args.output)
+        sys.exit("Account not found.")
+    if args.output != '-':
+        print(f"Exported {count:,} transaction(s) to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+# Storage backends for the account registry.
+# A registry with a storage attached reads accounts it hasn't seen yet from
+# the storage and writes every new account and transaction through to it,
+# so several ATM programs can share one set of accounts.
+# Balances are only changed through change_balances(), which checks and
+# updates the shared balances in one storage transaction, so two programs
+# can't both spend the same money; the transactions recorded afterwards
+# carry the balances it returned.
+#
+# Storage is the interface; SQLiteStorage keeps everything in one SQLite
+# file in WAL mode, so many processes can use it at once. Each thread gets
+# its own pooled connection, the SQL strings are fixed so sqlite3's
+# statement cache reuses the prepared statements, and transaction rows are
+# buffered and written with executemany() once batch_size of them are
+# pending (batch_size=1 writes each one straight away). Balance changes are
+# never buffered.
+# refresh() also returns the transactions other programs have written for
+# the account since this one last looked: it remembers the highest
+# transaction id each account's history reflects, and the ids of the rows
+# it inserted itself, which are already in memory.
+
+import os
+import sqlite3
+import threading
+
+from money import Money
+from records import Account, Transaction, TxType
+
+
+class Storage:
+    def add_account(self, account):
+        raise NotImplementedError
+
+    def add_accounts(self, accounts):
+        for account in accounts:
+            self.add_account(account)
+
+    def get_account(self, account_number):
+        # Account with its history, or None
+        raise NotImplementedError
+
+    def refresh(self, account):
+        # reload balance and PIN, which another program may have changed;
+        # returns the transactions other programs recorded for the account
+        # that its history doesn't have yet, oldest first
+        raise NotImplementedError
+
+    def change_balances(self, changes):
+        # changes: (account number, centavos) pairs, applied together;
+        # returns the balance after each change, or None (changing
+        # nothing) if a balance would go below zero
+        raise NotImplementedError
+
+    def record(self, account, transaction):
+        raise NotImplementedError
+
+    def record_many(self, entries):
+        # entries: (account, transaction) pairs
+        for account, transaction in entries:
+            self.record(account, transaction)
+
+    def transactions(self, account_number, start_ns=None, end_ns=None):
+        raise NotImplementedError
+
+    def shared_value(self, name, default):
+        # value stored under name, storing default first if there is none
+        raise NotImplementedError
+
+    def next_counter(self, name):
+        # atomically increments a counter and returns the value before it
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    account_number TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    pin TEXT NOT NULL,
+    balance INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    account_number TEXT NOT NULL,
+    code INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    timestamp_ns INTEGER NOT NULL,
+    recipient TEXT,
+    balance_after INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_account_time
+    ON transactions (account_number, timestamp_ns);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+INSERT_ACCOUNT = "INSERT INTO accounts (account_number, name, pin, balance) VALUES (?, ?, ?, ?)"
+SELECT_ACCOUNT = "SELECT name, pin, balance FROM accounts WHERE account_number = ?"
+# a debit only applies if the balance covers it
+CHANGE_BALANCE = ("UPDATE accounts SET balance = balance + ?1 "
+                  "WHERE account_number = ?2 AND (?1 >= 0 OR balance + ?1 >= 0)")
+SELECT_BALANCE = "SELECT balance FROM accounts WHERE account_number = ?"
+UPDATE_PIN = "UPDATE accounts SET pin = ? WHERE account_number = ?"
+INSERT_TRANSACTION = ("INSERT INTO transactions (account_number, code, amount, timestamp_ns, recipient, balance_after) "
+                      "VALUES (?, ?, ?, ?, ?, ?)")
+SELECT_TRANSACTIONS = ("SELECT code, amount, recipient, balance_after, timestamp_ns FROM transactions "
+                       "WHERE account_number = ? AND timestamp_ns >= ? AND timestamp_ns < ? ORDER BY timestamp_ns, id")
+SELECT_NEW_TRANSACTIONS = ("SELECT id, code, amount, recipient, balance_after, timestamp_ns FROM transactions "
+                           "WHERE account_number = ? AND id > ? ORDER BY timestamp_ns, id")
+SELECT_LAST_ID = "SELECT coalesce(max(id), 0) FROM transactions WHERE account_number = ?"
+SELECT_META = "SELECT value FROM meta WHERE name = ?"
+INSERT_META = "INSERT OR IGNORE INTO meta (name, value) VALUES (?, ?)"
+INCREMENT_META = "UPDATE meta SET value = value + 1 WHERE name = ?"
+
+MAX_NS = 2 ** 63 - 1
+
+
+class SQLiteStorage(Storage):
+    def __init__(self, path, batch_size=1, timeout=30.0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._pending_pins = []
+        self._pending_transactions = []
+        self._seen = {}     # account number -> highest transaction id its history reflects
+        self._written = {}  # account number -> ids of rows inserted here, above _seen
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+
+    def _connection(self):
+        # one connection per thread, created on first use and kept open
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                   check_same_thread=False, cached_statements=64)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def add_account(self, account):
+        self._connection().execute(INSERT_ACCOUNT, (account['account_number'], account['name'],
+                                                    account['pin'], int(account['balance'])))
+
+    def add_accounts(self, accounts):
+        # one SQLite transaction for the whole chunk
+        rows = [(account['account_number'], account['name'], account['pin'], int(account['balance']))
+                for account in accounts]
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(INSERT_ACCOUNT, rows)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def get_account(self, account_number):
+        conn = self._connection()
+        # one read transaction, so the history and its last id agree
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute(SELECT_ACCOUNT, (account_number,)).fetchone()
+            if row is not None:
+                history = self.transactions(account_number)
+                last_id = conn.execute(SELECT_LAST_ID, (account_number,)).fetchone()[0]
+        finally:
+            conn.execute("COMMIT")
+        if row is None:
+            return None
+        name, pin, balance = row
+        with self._lock:
+            self._seen[account_number] = last_id
+        return Account(account_number, name, pin, Money(balance), history)
+
+    def refresh(self, account):
+        self.flush()
+        acc_num = account['account_number']
+        with self._lock:
+            seen = self._seen.get(acc_num, 0)
+        conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute(SELECT_ACCOUNT, (acc_num,)).fetchone()
+            rows = conn.execute(SELECT_NEW_TRANSACTIONS, (acc_num, seen)).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        if row is not None:
+            account['pin'] = row[1]
+            account['balance'] = Money(row[2])
+        if not rows:
+            return []
+        last_id = max(row[0] for row in rows)
+        with self._lock:
+            written = self._written.get(acc_num, set())
+            new = [Transaction(code, Money(amount), recipient, Money(balance_after), timestamp_ns)
+                   for row_id, code, amount, recipient, balance_after, timestamp_ns in rows if row_id not in written]
+            # rows another thread inserts meanwhile get higher ids; keep those
+            self._written[acc_num] = {row_id for row_id in written if row_id > last_id}
+            self._seen[acc_num] = max(seen, last_id)
+        return new
+
+    def change_balances(self, changes):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            balances = []
+            for acc_num, change in changes:
+                if conn.execute(CHANGE_BALANCE, (change, acc_num)).rowcount != 1:
+                    conn.execute("ROLLBACK")
+                    return None
+                balances.append(conn.execute(SELECT_BALANCE, (acc_num,)).fetchone()[0])
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return balances
+
+    def record(self, account, transaction):
+        self.record_many(((account, transaction),))
+
+    def record_many(self, entries):
+        # a batch is buffered as a whole, so it is written in one SQLite
+        # transaction however small batch_size is
+        with self._lock:
+            for account, transaction in entries:
+                acc_num = account['account_number']
+                if transaction.code == TxType.PIN_CHANGE:
+                    self._pending_pins.append((account['pin'], acc_num))
+                self._pending_transactions.append((acc_num, transaction.code, int(transaction.amount),
+                                                   transaction.timestamp_ns, transaction.recipient,
+                                                   int(transaction.balance_after)))
+            full = len(self._pending_transactions) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pins, self._pending_pins = self._pending_pins, []
+            rows, self._pending_transactions = self._pending_transactions, []
+        if not rows:
+            return
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(UPDATE_PIN, pins)
+            conn.executemany(INSERT_TRANSACTION, rows)
+            # nobody else can write inside BEGIN IMMEDIATE, so the rows got
+            # consecutive ids ending at the last one inserted
+            last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        with self._lock:
+            for row_id, row in enumerate(rows, last_id - len(rows) + 1):
+                self._written.setdefault(row[0], set()).add(row_id)
+
+    def transactions(self, account_number, start_ns=None, end_ns=None):
+        cursor = self._connection().execute(SELECT_TRANSACTIONS, (
+            account_number, 0 if start_ns is None else start_ns, MAX_NS if end_ns is None else end_ns))
+        return [Transaction(code, Money(amount), recipient, Money(balance_after), timestamp_ns)
+                for code, amount, recipient, balance_after, timestamp_ns in cursor]
+
+    def shared_value(self, name, default):
+        conn = self._connection()
+        conn.execute(INSERT_META, (name, default))
+        return conn.execute(SELECT_META, (name,)).fetchone()[0]
+
+    def next_counter(self, name):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(INSERT_META, (name, 0))
+            value = conn.execute(SELECT_META, (name,)).fetchone()[0]
+            conn.execute(INCREMENT_META, (name,))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return value
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
@@ -3,21 +3,47 @@ from datetime import datetime
 import io
 from unittest.mock import patch
 import random
+import os
+import threading
+import asyncio
 
 # Your ATM code (atm.py)
 # Global lists to store data
 from datetime import datetime
-import random
+from registry import AccountRegistry
+from money import Money
+from records import Account, Transaction, TxType
+from session import InsufficientFunds, InvalidAmount, SameAccount, Session, valid_pin
+from history import ColumnarHistory
+from ledger import Ledger
+import ledger as ledger_module
+import journal as journal_module
+import snapshot as snapshot_module
+from journal import JournalInUse
+from timeline import HistoryCursor, balance_at, day_range, parse_date, to_ns, transactions_between
+from storage import SQLiteStorage
+from server import ATMServer
+from http_api import make_server
+from payroll import PayrollRejected, pay, read_payroll
+from importer import ErrorReport, import_accounts
+import statement
+import receipt
+from archive import DAY_NS, RECORD, ReceiptArchive
+import zlib
+from statement import FORMATS, account_rows, bank_rows, export, export_file, statement_path
+import http.client
+import json
+from allocator import AllocatorExhausted, make_allocator
+from latency import LatencyLog
+from money import MAX_CENTAVOS
+from receipt_model import Receipt, ReceiptPrinter, TextSink, latest
 
 # Global lists to store data
-accounts = []
-current_account_index = None
+accounts = AccountRegistry()
+receipts = ReceiptPrinter(TextSink())
 
 def generate_account_number():
-    while True:
-        acc_num = str(random.randint(1, 99))
-        if not any(account['account_number'] == acc_num for account in accounts):
-            return acc_num
+    return accounts.new_account_number()
 
 def create_account():
     print("\n=== Create New Account ===")
@@ -29,15 +55,9 @@ def create_account():
             break
         print("Invalid PIN. Please enter 4 digits.")
 
-    initial_deposit = float(input("Enter initial deposit amount: ₱"))
+    initial_deposit = Money.parse(input("Enter initial deposit amount: ₱"))
 
-    account = {
-        'account_number': generate_account_number(),
-        'name': name,
-        'pin': pin,
-        'balance': initial_deposit,
-        'transaction_history': []
-    }
+    account = Account(generate_account_number(), name, pin, initial_deposit)
 
     accounts.append(account)
 
@@ -46,145 +66,160 @@ def create_account():
 
     return
 
-def add_transaction(account_index, transaction_type, amount, recipient=None):
-    timestamp = datetime.now()
-    transaction = {
-        'type': transaction_type,
-        'amount': amount,
-        'timestamp': timestamp,
-        'recipient': recipient,
-        'balance_after': accounts[account_index]['balance']
-    }
-    accounts[account_index]['transaction_history'].append(transaction)
-
 def login():
-    global current_account_index
+    # returns the new Session, or None if the login failed
     print("\n=== Login ===")
     account_number = input("Enter account number: ")
     pin = input("Enter PIN: ")
 
-    for i, account in enumerate(accounts):
-        if account['account_number'] == account_number and account['pin'] == pin:
-            current_account_index = i
-            print(f"\nWelcome, {account['name']}!")
-            return True
+    session = Session(accounts)
+    if session.login(account_number, pin):
+        print(f"\nWelcome, {session.account['name']}!")
+        return session
     print("Invalid account number or PIN.")
-    current_account_index = None  # Explicitly set to None on failed login
-    return False
+    return None
 
-def check_balance():
-    if current_account_index is None:
+def check_balance(session):
+    if not session.logged_in:
         print("You are not logged in.")
         return
 
-    account = accounts[current_account_index]
+    account = session.account
     print(f"\nCurrent Balance: ₱{account['balance']:.2f}")
     generate_receipt("BALANCE INQUIRY", account)
 
-def deposit():
-    if current_account_index is None:
+def deposit(session):
+    if not session.logged_in:
         print("You are not logged in.")
         return
 
-    amount = float(input("\nEnter deposit amount: ₱"))
-    if amount <= 0:
+    amount = Money.parse(input("\nEnter deposit amount: ₱"))
+    try:
+        balance = session.deposit(amount)
+    except InvalidAmount:
         print("Invalid amount.")
         return
 
-    accounts[current_account_index]['balance'] += amount
-    add_transaction(current_account_index, "DEPOSIT", amount)
-    print(f"Deposit successful. New balance: ₱{accounts[current_account_index]['balance']:.2f}")
-    generate_receipt("DEPOSIT", accounts[current_account_index], amount)
+    print(f"Deposit successful. New balance: ₱{balance:.2f}")
+    generate_receipt("DEPOSIT", session.account, amount, transaction=latest(session.account))
 
-def withdraw():
-    if current_account_index is None:
+def withdraw(session):
+    if not session.logged_in:
         print("You are not logged in.")
         return
 
-    amount = float(input("\nEnter withdrawal amount: ₱"))
-    if amount <= 0:
+    amount = Money.parse(input("\nEnter withdrawal amount: ₱"))
+    try:
+        balance = session.withdraw(amount)
+    except InvalidAmount:
         print("Invalid amount.")
         return
-    if amount > accounts[current_account_index]['balance']:
+    except InsufficientFunds:
         print("Insufficient funds.")
         return
 
-    accounts[current_account_index]['balance'] -= amount
-    add_transaction(current_account_index, "WITHDRAWAL", amount)
-    print(f"Withdrawal successful. New balance: ₱{accounts[current_account_index]['balance']:.2f}")
-    generate_receipt("WITHDRAWAL", accounts[current_account_index], amount)
+    print(f"Withdrawal successful. New balance: ₱{balance:.2f}")
+    generate_receipt("WITHDRAWAL", session.account, amount, transaction=latest(session.account))
 
-def transfer():
-    if current_account_index is None:
+def transfer(session):
+    if not session.logged_in:
         print("You are not logged in.")
         return
 
     recipient_acc = input("\nEnter recipient's account number: ")
-    recipient_index = None
-
-    for i, account in enumerate(accounts):
-        if account['account_number'] == recipient_acc:
-            recipient_index = i
-            break
-
-    if recipient_index is None:
+    if accounts.find(recipient_acc) is None:
         print("Recipient account not found.")
         return
 
-    amount = float(input("Enter transfer amount: ₱"))
-    if amount <= 0:
+    amount = Money.parse(input("Enter transfer amount: ₱"))
+    try:
+        recipient = session.transfer(recipient_acc, amount)
+    except InvalidAmount:
         print("Invalid amount.")
         return
-    if amount > accounts[current_account_index]['balance']:
+    except InsufficientFunds:
         print("Insufficient funds.")
         return
+    except SameAccount:
+        print("Cannot transfer to your own account.")
+        return
 
-    # Perform transfer
-    accounts[current_account_index]['balance'] -= amount
-    accounts[recipient_index]['balance'] += amount
+    print(f"Transfer successful. New balance: ₱{session.account['balance']:.2f}")
+    generate_receipt("TRANSFER", session.account, amount, recipient, transaction=latest(session.account))
 
-    # Record transactions for both accounts
-    add_transaction(current_account_index, "TRANSFER", amount, recipient_acc)
-    add_transaction(recipient_index, "TRANSFER RECEIVED", amount, accounts[current_account_index]['account_number'])
+def view_transaction_history(session):
+    if not session.logged_in:
+        print("You are not logged in.")
+        return
 
-    print(f"Transfer successful. New balance: ₱{accounts[current_account_index]['balance']:.2f}")
-    generate_receipt("TRANSFER", accounts[current_account_index], amount, accounts[recipient_index])
+    account = session.account
+    print("\n=== Transaction History ===")
+    print("Enter a date range (YYYY-MM-DD), or leave blank to show everything.")
+    try:
+        start_date = parse_date(input("From date: "))
+        end_date = parse_date(input("To date: "))
+    except ValueError:
+        print("Invalid date. Please use YYYY-MM-DD.")
+        return
+    start, end = day_range(start_date, end_date)
+    if end is not None:
+        print(f"Balance at end of {end_date}: ₱{balance_at(account, to_ns(end) - 1):.2f}")
 
-def view_transaction_history():
-    if current_account_index is None:
+    # newest first, one page at a time
+    cursor = session.history(start, end)
+    while True:
+        for transaction in cursor.page():
+            print(f"\nType: {transaction['type']}")
+            print(f"Amount: ₱{transaction['amount']:.2f}")
+            print(f"Date: {transaction['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}")
+            print(f"Balance After: ₱{transaction['balance_after']:.2f}")
+            if transaction['recipient']:
+                print(f"Recipient: {transaction['recipient']}")
+            print("-" * 40)
+
+        if cursor.page_count == 1:
+            break
+        print(f"Page {cursor.page_number + 1} of {cursor.page_count}")
+        choice = input("N = next page, P = previous page, Enter = back: ").strip().upper()
+        if choice == "N" and cursor.has_next():
+            cursor.next()
+        elif choice == "P" and cursor.has_previous():
+            cursor.previous()
+        elif choice == "":
+            break
+        else:
+            print("No such page.")
+
+def export_statement(session):
+    if not session.logged_in:
         print("You are not logged in.")
         return
 
-    print("\n=== Transaction History ===")
-    for transaction in accounts[current_account_index]['transaction_history']:
-        print(f"\nType: {transaction['type']}")
-        print(f"Amount: ₱{transaction['amount']:.2f}")
-        print(f"Date: {transaction['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"Balance After: ₱{transaction['balance_after']:.2f}")
-        if transaction['recipient']:
-            print(f"Recipient: {transaction['recipient']}")
-        print("-" * 40)
-
-def generate_receipt(transaction_type, account, amount=None, recipient=None):
-    print("\n" + "=" * 40)
-    print(f"{'TRANSACTION RECEIPT':^40}")
-    print("=" * 40)
-    print(f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"Transaction Type: {transaction_type}")
-    print(f"Account Number: {account['account_number']}")
-    print(f"Account Holder: {account['name']}")
-
-    if amount is not None:
-        print(f"Amount: ₱{amount:.2f}")
-
-    if recipient:
-        print(f"Recipient Account: {recipient['account_number']}")
-        print(f"Recipient Name: {recipient['name']}")
-
-    print(f"Current Balance: ₱{account['balance']:.2f}")
-    print("=" * 40)
-    print("Thank you for banking with us!")
-    print("=" * 40 + "\n")
+    account = session.account
+    print("\n=== Export Statement ===")
+    print("Enter a date range (YYYY-MM-DD), or leave blank to export everything.")
+    try:
+        start_date = parse_date(input("From date: "))
+        end_date = parse_date(input("To date: "))
+    except ValueError:
+        print("Invalid date. Please use YYYY-MM-DD.")
+        return
+    file_format = input("Format (csv/jsonl) [csv]: ").strip().lower() or "csv"
+    if file_format not in FORMATS:
+        print("Invalid format. Please enter csv or jsonl.")
+        return
+    start, end = day_range(start_date, end_date)
+    path = statement_path(account, file_format)
+    try:
+        count = export_file(path, account_rows(account, start, end), file_format)
+    except OSError as e:
+        print(f"Could not write the statement: {e}")
+        return
+    print(f"Exported {count} transaction(s) to {path}")
+
+def generate_receipt(transaction_type, account, amount=None, recipient=None, transaction=None):
+    # transaction: the one the operation just committed, if any
+    receipts.print(transaction_type, account, amount, recipient, transaction)
 
 def main():
     while True:
@@ -198,7 +233,8 @@ def main():
         if choice == "1":
             create_account()
         elif choice == "2":
-            if login():
+            session = login()
+            if session:
                 while True:
                     print("\n=== Main Menu ===")
                     print("1. Check Balance")
@@ -211,18 +247,17 @@ def main():
                     operation = input("Enter your choice (1-6): ")
 
                     if operation == "1":
-                        check_balance()
+                        check_balance(session)
                     elif operation == "2":
-                        deposit()
+                        deposit(session)
                     elif operation == "3":
-                        withdraw()
+                        withdraw(session)
                     elif operation == "4":
-                        transfer()
+                        transfer(session)
                     elif operation == "5":
-                        view_transaction_history()
+                        view_transaction_history(session)
                     elif operation == "6":
-                        global current_account_index
-                        current_account_index = None
+                        session.logout()
                         print("Logged out successfully.")
                         break
                     else:
@@ -238,22 +273,26 @@ def main():
 @pytest.fixture
 def test_account():
     global accounts
-    accounts = [] #Clear accounts before each test
+    accounts = AccountRegistry() #Clear accounts before each test
     account = {
-        'account_number': '12',
+        'account_number': '0000125',
         'name': 'Test User',
         'pin': '1234',
-        'balance': 1000.0,
+        'balance': Money(100000),
         'transaction_history': []
     }
     accounts.append(account)
-    global current_account_index
-    current_account_index = 0
     return account
 
+@pytest.fixture
+def session(test_account):
+    session = Session(accounts)
+    session.account_index = 0
+    return session
+
 def test_generate_account_number():
     global accounts
-    accounts = []
+    accounts = AccountRegistry()
     num1 = generate_account_number()
     assert num1 is not None
     accounts.append({'account_number': num1})
@@ -268,7 +307,7 @@ def test_create_account(monkeypatch):
     assert len(accounts) == 1
     assert accounts[0]['name'] == 'Test User'
     assert accounts[0]['pin'] == '1234'
-    assert accounts[0]['balance'] == 1000.0
+    assert accounts[0]['balance'] == Money(100000)
 
 def test_create_account_invalid_pin(monkeypatch):
     inputs = iter(['Test User', '123', '12345', '1234', '1000'])
@@ -277,96 +316,121 @@ def test_create_account_invalid_pin(monkeypatch):
     assert len(accounts) == 1
 
 def test_login_success(test_account):
-    inputs = iter(['12', '1234'])
+    inputs = iter(['0000125', '1234'])
     with patch('builtins.input', lambda _: next(inputs)):
-        assert login() is True
-        assert current_account_index == 0
+        session = login()
+        assert session is not None
+        assert session.account_index == 0
 
 def test_login_fail_account_number():
-    inputs = iter(['99', '1234'])
+    inputs = iter(['0000992', '1234'])
     with patch('builtins.input', lambda _: next(inputs)):
-        assert login() is False
-        assert current_account_index is None
+        assert login() is None
 
 def test_login_fail_pin():
-    inputs = iter(['12', '0000'])
+    inputs = iter(['0000125', '0000'])
     with patch('builtins.input', lambda _: next(inputs)):
-        assert login() is False
-        assert current_account_index is None
+        assert login() is None
 
-def test_check_balance(test_account, capsys):
-    check_balance()
+def test_check_balance(session, capsys):
+    check_balance(session)
     captured = capsys.readouterr()
     assert "Current Balance: ₱1000.00" in captured.out
 
-def test_deposit(test_account):
+def test_deposit(session):
     inputs = iter(['500'])
     with patch('builtins.input', lambda _: next(inputs)):
-        deposit()
-    assert accounts[0]['balance'] == 1500.0
+        deposit(session)
+    assert accounts[0]['balance'] == Money(150000)
 
-def test_deposit_invalid(test_account, capsys):
+def test_deposit_invalid(session, capsys):
     inputs = iter(['-500'])
     with patch('builtins.input', lambda _: next(inputs)):
-        deposit()
+        deposit(session)
     captured = capsys.readouterr()
     assert "Invalid amount." in captured.out
-    assert accounts[0]['balance'] == 1000.0
+    assert accounts[0]['balance'] == Money(100000)
 
-def test_withdraw_sufficient_funds(test_account):
+def test_withdraw_sufficient_funds(session):
     inputs = iter(['500'])
     with patch('builtins.input', lambda _: next(inputs)):
-        withdraw()
-    assert accounts[0]['balance'] == 500.0
+        withdraw(session)
+    assert accounts[0]['balance'] == Money(50000)
 
-def test_withdraw_insufficient_funds(test_account, capsys):
+def test_withdraw_insufficient_funds(session, capsys):
     inputs = iter(['1500'])
     with patch('builtins.input', lambda _: next(inputs)):
-        withdraw()
+        withdraw(session)
     captured = capsys.readouterr()
     assert "Insufficient funds." in captured.out
-    assert accounts[0]['balance'] == 1000.0
+    assert accounts[0]['balance'] == Money(100000)
 
-def test_withdraw_invalid_amount(test_account, capsys):
+def test_withdraw_invalid_amount(session, capsys):
     inputs = iter(['-500'])
     with patch('builtins.input', lambda _: next(inputs)):
-        withdraw()
+        withdraw(session)
     captured = capsys.readouterr()
     assert "Invalid amount." in captured.out
-    assert accounts[0]['balance'] == 1000.0
+    assert accounts[0]['balance'] == Money(100000)
 
-def test_transfer_success(test_account):
-    accounts.append({'account_number': '13', 'name': 'Recipient', 'pin': '5678', 'balance': 500, 'transaction_history': []})
-    inputs = iter(['13', '500'])
+def test_transfer_success(session):
+    accounts.append({'account_number': '0000133', 'name': 'Recipient', 'pin': '5678', 'balance': Money(50000), 'transaction_history': []})
+    inputs = iter(['0000133', '500'])
     with patch('builtins.input', lambda _: next(inputs)):
-        transfer()
-    assert accounts[0]['balance'] == 500.0
-    assert accounts[1]['balance'] == 1000.0
+        transfer(session)
+    assert accounts[0]['balance'] == Money(50000)
+    assert accounts[1]['balance'] == Money(100000)
 
-def test_transfer_recipient_not_found(test_account, capsys):
-    inputs = iter(['99', '500'])
+def test_transfer_recipient_not_found(session, capsys):
+    inputs = iter(['0000992', '500'])
     with patch('builtins.input', lambda _: next(inputs)):
-        transfer()
+        transfer(session)
     captured = capsys.readouterr()
     assert "Recipient account not found." in captured.out
-    assert accounts[0]['balance'] == 1000.0
+    assert accounts[0]['balance'] == Money(100000)
 
-def test_transfer_insufficient_funds(test_account, capsys):
-    accounts.append({'account_number': '13', 'name': 'Recipient', 'pin': '5678', 'balance': 500, 'transaction_history': []})
-    inputs = iter(['13', '1500'])
+def test_transfer_insufficient_funds(session, capsys):
+    accounts.append({'account_number': '0000133', 'name': 'Recipient', 'pin': '5678', 'balance': Money(50000), 'transaction_history': []})
+    inputs = iter(['0000133', '1500'])
     with patch('builtins.input', lambda _: next(inputs)):
-        transfer()
+        transfer(session)
     captured = capsys.readouterr()
     assert "Insufficient funds." in captured.out
-    assert accounts[0]['balance'] == 1000.0
+    assert accounts[0]['balance'] == Money(100000)
 
-def test_view_transaction_history(test_account, capsys):
-    add_transaction(0, "TEST", 100)
-    view_transaction_history()
+def test_view_transaction_history(session, capsys):
+    session.record("TEST", 100)
+    with patch('builtins.input', side_effect=['', '']):
+        view_transaction_history(session)
     captured = capsys.readouterr()
     assert "Type: TEST" in captured.out
     assert "Amount: ₱100.00" in captured.out
 
+def test_view_transaction_history_date_range(session, capsys):
+    history = accounts[0]['transaction_history']
+    history.append(Transaction(TxType.DEPOSIT, Money(500), None, Money(100500),
+                               timestamp_ns=to_ns(datetime(2024, 3, 1, 9, 30))))
+    history.append(Transaction(TxType.WITHDRAWAL, Money(200), None, Money(100300),
+                               timestamp_ns=to_ns(datetime(2024, 3, 5, 14, 0))))
+    with patch('builtins.input', side_effect=['2024-03-01', '2024-03-02']):
+        view_transaction_history(session)
+    captured = capsys.readouterr()
+    assert "Type: DEPOSIT" in captured.out
+    assert "Type: WITHDRAWAL" not in captured.out
+    assert "Balance at end of 2024-03-02: ₱1005.00" in captured.out
+
+def test_view_transaction_history_pages(session, capsys):
+    for i in range(12):
+        session.record("DEPOSIT", Money(10000 * (i + 1)))
+    with patch('builtins.input', side_effect=['', '', 'N', '']):
+        view_transaction_history(session)
+    captured = capsys.readouterr()
+    first_page, second_page = captured.out.split("Page 1 of 2")
+    # newest first: 12 down to 3 on page one, then 2 and 1
+    assert "Amount: ₱1200.00" in first_page and "Amount: ₱300.00" in first_page
+    assert "Amount: ₱200.00" not in first_page
+    assert "Amount: ₱200.00" in second_page and "Amount: ₱100.00" in second_page
+
 def test_generate_receipt(test_account, capsys):
     generate_receipt("TEST", test_account, 500)
     captured = capsys.readouterr()
@@ -374,8 +438,892 @@ def test_generate_receipt(test_account, capsys):
     assert "Amount: ₱500.00" in captured.out
 
 def test_generate_receipt_transfer(test_account, capsys):
-    recipient = {'account_number': '13', 'name': 'Recipient', 'balance': 500}
+    recipient = {'account_number': '0000133', 'name': 'Recipient', 'balance': Money(50000)}
     generate_receipt("TRANSFER", test_account, 500, recipient)
     captured = capsys.readouterr()
-    assert "Recipient Account: 13" in captured.out
-    assert "Recipient Name: Recipient" in captured.out
\ No newline at end of file
+    assert "Recipient Account: 0000133" in captured.out
+    assert "Recipient Name: Recipient" in captured.out
+def test_registry_lookup(test_account):
+    accounts.append({'account_number': '0000133', 'name': 'Recipient', 'pin': '5678', 'balance': Money(50000), 'transaction_history': []})
+    assert accounts.find('0000133') == 1
+    assert accounts.find('0000992') is None
+    assert accounts.find('0000126') is None  # bad check digit
+    assert accounts.authenticate('0000125', '1234') == 0
+    assert accounts.authenticate('0000125', '0000') is None
+    with pytest.raises(ValueError):
+        accounts.append({'account_number': '0000133'})
+
+def test_allocator_unique_and_valid():
+    allocator = make_allocator(width=4, key=42)
+    numbers = [allocator.allocate() for _ in range(10_000)]
+    assert len(set(numbers)) == 10_000
+    assert all(len(n) == 5 and allocator.validate(n) for n in numbers)
+    with pytest.raises(AllocatorExhausted):
+        allocator.allocate()
+
+def test_allocator_rejects_typo():
+    allocator = make_allocator('sequential', width=6)
+    acc_num = allocator.allocate()
+    typo = acc_num[:2] + str((int(acc_num[2]) + 1) % 10) + acc_num[3:]
+    assert allocator.validate(acc_num)
+    assert not allocator.validate(typo)
+    assert not allocator.validate(acc_num[:-1])
+
+def test_records_dict_access():
+    account = Account('0000125', 'Test User', '1234', Money(100000))
+    account['balance'] += Money(50000)
+    assert account['balance'] == Money(150000)
+    transaction = Transaction("TRANSFER RECEIVED", Money(50000), '0000133', account['balance'])
+    assert transaction['type'] == "TRANSFER RECEIVED"
+    assert transaction.code == TxType.TRANSFER_RECEIVED
+    assert transaction['recipient'] == '0000133'
+    assert isinstance(transaction['timestamp'], datetime)
+    with pytest.raises(KeyError):
+        account['missing']
+
+def test_columnar_history():
+    history = ColumnarHistory(capacity=2)
+    for i in range(100):
+        history.append(Transaction("DEPOSIT" if i % 2 else "WITHDRAWAL", Money(1000), None if i % 3 else '0000133', Money(i)))
+    assert len(history) == 100
+    assert history[-1]['balance_after'] == Money(99)
+    assert history[0]['recipient'] == '0000133'
+    assert history[1]['recipient'] is None
+    amounts = history.view('amount')
+    assert sum(amounts[10:20]) == 10000
+    assert history.totals_by_type() == {TxType.DEPOSIT: Money(50000), TxType.WITHDRAWAL: Money(50000)}
+    assert [t['type'] for t in history[:2]] == ["WITHDRAWAL", "DEPOSIT"]
+
+def test_registry_columnar_history(test_account):
+    columnar = AccountRegistry(columnar_history=True)
+    columnar.append(Account('0000133', 'Recipient', '5678', Money(50000)))
+    assert isinstance(columnar[0]['transaction_history'], ColumnarHistory)
+
+def test_money_parse_and_format():
+    assert Money.parse("1,500.5") == 150050
+    assert Money.parse("₱0.05") == 5
+    assert Money("-12") == -1200
+    for bad in ["", "abc", "1.234", "1.2.3", "--1"]:
+        with pytest.raises(ValueError):
+            Money.parse(bad)
+    assert f"{Money(123456789):,.2f}" == "1,234,567.89"
+    assert f"{Money(-5):.2f}" == "-0.05"
+    total = Money(0)
+    for _ in range(1000):
+        total += Money.parse("0.10")
+    assert total == Money(10000)
+    with pytest.raises(TypeError):
+        Money(100) + 0.1
+
+def test_journal_replay(tmp_path):
+    path = str(tmp_path / "atm.journal")
+    registry = AccountRegistry(allocator=make_allocator('sequential'))
+    journal = registry.attach_journal(path, sync='group')
+    registry.append(Account(registry.new_account_number(), 'Test User', '1234', Money(100000)))
+    registry.append(Account(registry.new_account_number(), 'Recipient', '5678', Money(50000)))
+    registry[0]['balance'] -= Money(25000)
+    registry.record(0, Transaction(TxType.TRANSFER, Money(25000), registry[1]['account_number'], registry[0]['balance']))
+    registry[1]['balance'] += Money(25000)
+    registry.record(1, Transaction(TxType.TRANSFER_RECEIVED, Money(25000), registry[0]['account_number'], registry[1]['balance']))
+    registry[0]['pin'] = '4321'
+    registry.record(0, Transaction(TxType.PIN_CHANGE, 0, None, registry[0]['balance']))
+    journal.close()
+
+    # a half-written record at the end (crash mid-append) is ignored
+    with open(path, 'ab') as f:
+        f.write(b'\x20\x00\x00\x00garbage')
+
+    restored = AccountRegistry(allocator=make_allocator('sequential'))
+    journal = restored.attach_journal(path)
+    restored[1]['balance'] += Money(100)
+    restored.record(1, Transaction(TxType.DEPOSIT, Money(100), None, restored[1]['balance']))
+    journal.close()
+    restored = AccountRegistry(allocator=make_allocator('sequential'))
+    restored.attach_journal(path).close()
+    assert len(restored) == 2
+    assert restored[0]['balance'] == Money(75000)
+    assert restored[1]['balance'] == Money(75100)
+    assert restored.authenticate(restored[0]['account_number'], '4321') == 0
+    assert [t['type'] for t in restored[0]['transaction_history']] == ["TRANSFER", "PIN CHANGE"]
+    assert restored[1]['transaction_history'][0]['recipient'] == registry[0]['account_number']
+
+def test_console_create_account_validates(monkeypatch, capsys):
+    import main_console
+    answers = iter(['A' * 300, 'Ana Cruz', '1234', str(2 ** 63), '0', 'abc', '500'])
+    monkeypatch.setattr('builtins.input', lambda prompt='': next(answers))
+    monkeypatch.setattr(main_console, 'accounts', AccountRegistry())
+    main_console.create_account()
+    out = capsys.readouterr().out
+    assert "Invalid name" in out and "too large" in out and "must be positive" in out
+    assert [(a['name'], a['balance']) for a in main_console.accounts] == [('Ana Cruz', Money(50000))]
+
+def test_journal_single_writer(tmp_path):
+    path = str(tmp_path / "atm.journal")
+    registry = AccountRegistry()
+    journal = registry.attach_journal(path, snapshot_every=2)
+    for name in ['Ana', 'Ben', 'Cy']:
+        registry.append(Account(registry.new_account_number(), name, '1234', Money(100000)))
+    # a second program can't attach the journal while it is in use
+    with pytest.raises(JournalInUse):
+        AccountRegistry().attach_journal(path)
+    journal.close()
+
+    # damage in the middle of the tail is reported, not truncated away
+    size = os.path.getsize(path)
+    with open(path, 'r+b') as f:
+        f.seek(size - 3)
+        f.write(b'???')
+    with open(path, 'ab') as f:
+        f.write(journal_module.create_record(Account('0000000', 'Dee', '1234', Money(0))))
+    with pytest.raises(ValueError):
+        AccountRegistry().attach_journal(path)
+    assert os.path.getsize(path) > size
+    # the failed attach let go of the lock
+    with open(path, 'r+b') as f:
+        f.truncate(size - 3)
+    restored = AccountRegistry()
+    restored.attach_journal(path).close()
+    assert [a['name'] for a in restored] == ['Ana', 'Ben']
+    assert os.path.getsize(path) < size
+
+def test_journal_rejects_before_changing(tmp_path):
+    path = str(tmp_path / "atm.journal")
+    registry = AccountRegistry()
+    journal = registry.attach_journal(path)
+    registry.append(Account(registry.new_account_number(), 'Ana', '1234', Money(100000)))
+    with pytest.raises(ValueError):
+        registry.append(Account(registry.new_account_number(), 'A' * 300, '1234', Money(0)))
+    with pytest.raises(ValueError):
+        registry.extend([Account(registry.new_account_number(), 'Ben', '1234', Money(2 ** 63))])
+    with pytest.raises(ValueError):
+        registry.record(0, Transaction(TxType.DEPOSIT, Money(2 ** 64), None, Money(100000)))
+    session = Session(registry)
+    session.account_index = 0
+    with pytest.raises(InvalidAmount):
+        session.deposit(Money(2 ** 63))
+    # nothing was half applied, so memory and the journal still agree
+    assert len(registry) == 1 and len(registry[0]['transaction_history']) == 0
+    assert registry[0]['balance'] == Money(100000)
+    journal.close()
+    restored = AccountRegistry()
+    restored.attach_journal(path).close()
+    assert [(a['name'], a['balance']) for a in restored] == [('Ana', Money(100000))]
+
+def test_empty_name_round_trip(tmp_path):
+    # the screens accept an empty name; it must come back as '', not None
+    path = str(tmp_path / "atm.journal")
+    registry = AccountRegistry()
+    journal = registry.attach_journal(path)
+    registry.append(Account(registry.new_account_number(), '', '1234', Money(0)))
+    journal.close()
+    restored = AccountRegistry()
+    journal = restored.attach_journal(path)
+    assert restored[0]['name'] == ''
+    restored.checkpoint()
+    journal.close()
+    restored = AccountRegistry()
+    restored.attach_journal(path).close()
+    assert restored[0]['name'] == ''
+
+def test_snapshot_and_tail_replay(tmp_path):
+    path = str(tmp_path / "atm.journal")
+    registry = AccountRegistry()
+    journal = registry.attach_journal(path, snapshot_every=3)
+    for name in ['Ana', 'Ben', 'Cy']:
+        registry.append(Account(registry.new_account_number(), name, '1234', Money(100000)))
+    # the third record triggered a snapshot, and so does the sixth; the
+    # last two deposits are only in the tail
+    session = Session(registry)
+    session.account_index = 2
+    for _ in range(5):
+        session.deposit(Money(500))
+    session.account_index = 0
+    session.transfer(registry[1]['account_number'], Money(2500))
+    journal.close()
+    assert os.path.exists(path + '.snapshot')
+
+    restored = AccountRegistry()
+    restored.attach_journal(path).close()
+    assert [a['name'] for a in restored] == ['Ana', 'Ben', 'Cy']
+    assert restored[2]['balance'] == Money(102500)
+    # the history survives the restart, from the snapshot and the tail
+    for before, after in zip(registry, restored):
+        assert [(t.code, t.amount, t.recipient, t.balance_after, t.timestamp_ns)
+                for t in after['transaction_history']] == [
+            (t.code, t.amount, t.recipient, t.balance_after, t.timestamp_ns)
+            for t in before['transaction_history']]
+    assert len(restored[2]['transaction_history']) == 5
+    assert restored[1]['transaction_history'][0]['recipient'] == restored[0]['account_number']
+    assert restored.new_account_number() not in [a['account_number'] for a in restored]
+
+def test_snapshot_skips_unrecorded_balance_changes(tmp_path):
+    path = str(tmp_path / "atm.journal")
+    registry = AccountRegistry()
+    journal = registry.attach_journal(path)
+    registry.append(Account(registry.new_account_number(), 'Ana', '1234', Money(100000)))
+    registry.append(Account(registry.new_account_number(), 'Ben', '1234', Money(0)))
+    # a checkpoint lands between a transfer's balance change and its records,
+    # then the program dies before the records are written
+    with registry.locked(0, 1):
+        registry.change_balances(((0, -Money(2500)), (1, Money(2500))))
+        registry.checkpoint()
+    journal.close()
+    restored = AccountRegistry()
+    restored.attach_journal(path).close()
+    assert [a['balance'] for a in restored] == [Money(100000), Money(0)]
+    # once recorded, the new balances are what a snapshot holds
+    registry = AccountRegistry()
+    journal = registry.attach_journal(path)
+    session = Session(registry)
+    session.account_index = 0
+    session.transfer(registry[1]['account_number'], Money(2500))
+    assert [registry.recorded_balance(i) for i in range(2)] == [Money(97500), Money(2500)]
+    journal.close()
+
+def test_failed_snapshot_doesnt_fail_the_operation(tmp_path, capsys):
+    assert not valid_pin('١٢٣٤') and not valid_pin('¹²³⁴') and valid_pin('1234')
+    path = str(tmp_path / "atm.journal")
+    registry = AccountRegistry()
+    journal = registry.attach_journal(path, snapshot_every=1)
+    # a PIN that got past older validation can't go into a snapshot row
+    registry.append(Account(registry.new_account_number(), 'Ana', '١٢٣٤', Money(100000)))
+    assert isinstance(registry.snapshot_error, UnicodeEncodeError)
+    session = Session(registry)
+    session.account_index = 0
+    assert session.deposit(Money(500)) == Money(100500)
+    assert "not written" in capsys.readouterr().err
+    with pytest.raises(ValueError):
+        snapshot_module.write_snapshot(AccountRegistry([Account('1' * 17, 'Ben', '1234', Money(0))]),
+                                       str(tmp_path / "long.snapshot"), 0)
+    journal.close()
+    restored = AccountRegistry()
+    restored.attach_journal(path).close()
+    assert restored[0]['balance'] == Money(100500)
+
+def test_sqlite_storage_shared(tmp_path):
+    path = str(tmp_path / "atm.sqlite3")
+    first = AccountRegistry()
+    first.attach_storage(SQLiteStorage(path))
+    second = AccountRegistry()
+    second.attach_storage(SQLiteStorage(path, batch_size=10))
+    assert second.allocator.key == first.allocator.key
+
+    first.append(Account(first.new_account_number(), 'Test User', '1234', Money(100000)))
+    acc_num = first[0]['account_number']
+    assert second.new_account_number() != acc_num
+
+    # the second program sees the account and deposits into it
+    index = second.find(acc_num)
+    assert index is not None
+    balance, = second.change_balances(((index, Money(2500)),))
+    second.record(index, Transaction(TxType.DEPOSIT, Money(2500), None, balance))
+    second.storage.flush()
+
+    # logging in again in the first program picks up the new balance and
+    # the transaction behind it
+    assert first.authenticate(acc_num, '1234') == 0
+    assert first[0]['balance'] == Money(102500)
+    history = first.storage.transactions(acc_num)
+    assert [t['type'] for t in history] == ["DEPOSIT"]
+    assert [t['type'] for t in first[0]['transaction_history']] == ["DEPOSIT"]
+
+    # a deposit from the second program, then one from the first: the next
+    # login puts the second's before the first's, without repeating the
+    # first's own
+    session = Session(first)
+    assert session.login(acc_num, '1234')
+    balance, = second.change_balances(((index, Money(1000)),))
+    second.record(index, Transaction(TxType.DEPOSIT, Money(1000), None, balance))
+    second.storage.flush()
+    session.deposit(Money(500))
+    assert [t.amount for t in first[0]['transaction_history']] == [Money(2500), Money(500)]
+    assert first.authenticate(acc_num, '1234') == 0
+    stored = [(t.amount, t.balance_after, t.timestamp_ns) for t in first.storage.transactions(acc_num)]
+    assert [(t.amount, t.balance_after, t.timestamp_ns) for t in first[0]['transaction_history']] == stored
+    assert [amount for amount, _, _ in stored] == [Money(2500), Money(1000), Money(500)]
+    assert balance_at(first[0], stored[1][2]) == Money(103500)
+    # nothing new: the history stays as it is
+    assert first.authenticate(acc_num, '1234') == 0
+    assert len(first[0]['transaction_history']) == 3
+    first.storage.close()
+    second.storage.close()
+
+def test_sqlite_storage_no_overdraft(tmp_path):
+    # two programs withdrawing the whole balance: only one of them gets it
+    path = str(tmp_path / "atm.sqlite3")
+    first = AccountRegistry()
+    first.attach_storage(SQLiteStorage(path))
+    second = AccountRegistry()
+    second.attach_storage(SQLiteStorage(path))
+    first.append(Account(first.new_account_number(), 'Test User', '1234', Money(100000)))
+    acc_num = first[0]['account_number']
+    sessions = [Session(first), Session(second)]
+    for session in sessions:
+        assert session.login(acc_num, '1234')
+    assert sessions[0].withdraw(Money(100000)) == Money(0)
+    with pytest.raises(InsufficientFunds):
+        sessions[1].withdraw(Money(100000))
+    # the failed withdrawal still brought the second program up to date
+    assert second.get(acc_num)['balance'] == Money(0)
+    sessions[1].deposit(Money(500))
+    first.storage.flush()
+    history = first.storage.transactions(acc_num)
+    assert [(t['type'], t['balance_after']) for t in history] == [("WITHDRAWAL", Money(0)), ("DEPOSIT", Money(500))]
+    assert first.storage.get_account(acc_num)['balance'] == Money(500)
+    first.storage.close()
+    second.storage.close()
+
+def test_ledger_pages(tmp_path):
+    path = str(tmp_path / "0000125.ledger")
+    ledger = Ledger(path)
+    for i in range(25):
+        ledger.append(Transaction(TxType.DEPOSIT, Money(100), '0000133' if i % 2 else None,
+                                  Money(100 * (i + 1)), timestamp_ns=i))
+    assert len(ledger) == 25
+    page = ledger.page(2, size=10)
+    assert [t['balance_after'] for t in page] == [Money(2100 + 100 * i) for i in range(5)]
+    assert ledger[-1]['recipient'] is None and ledger[1]['recipient'] == '0000133'
+    ledger.close()
+
+    # reopened, the rows are read back from the file
+    with Ledger(path) as reopened:
+        assert len(reopened) == 25
+        assert reopened.timestamp_ns(7) == 7
+        assert sum(t['amount'] for t in reopened) == Money(2500)
+
+def test_registry_ledger_history(tmp_path):
+    registry = AccountRegistry(ledger_dir=str(tmp_path))
+    registry.append(Account('0000125', 'Test User', '1234', Money(100000)))
+    registry.record(0, Transaction(TxType.DEPOSIT, Money(500), None, Money(100500)))
+    history = registry[0]['transaction_history']
+    assert isinstance(history, Ledger)
+    assert history[0]['type'] == 'DEPOSIT'
+    assert history[0]['amount'] == Money(500)
+
+def test_ledger_history_survives_restart(tmp_path, monkeypatch):
+    # five accounts but room for two open ledgers
+    monkeypatch.setattr(ledger_module, 'MAX_OPEN', 2)
+    path = str(tmp_path / "atm.journal")
+    registry = AccountRegistry(ledger_dir=str(tmp_path / "ledgers"))
+    journal = registry.attach_journal(path, snapshot_every=7)
+    session = Session(registry)
+    for i in range(5):
+        registry.append(Account(registry.new_account_number(), 'Test User', '1234', Money(100000)))
+        session.account_index = i
+        session.deposit(Money(100 * (i + 1)))
+        session.withdraw(Money(50))
+    assert sum(a['transaction_history']._file is not None for a in registry) <= 2
+    journal.close()
+    expected = [[(t.code, t.amount, t.balance_after) for t in a['transaction_history']] for a in registry]
+
+    for _ in range(2):
+        restored = AccountRegistry(ledger_dir=str(tmp_path / "ledgers"))
+        restored.attach_journal(path).close()
+        assert [[(t.code, t.amount, t.balance_after) for t in a['transaction_history']]
+                for a in restored] == expected
+        assert all(len(a['transaction_history']) == 2 for a in restored)
+
+@pytest.mark.parametrize('make_history', [list, ColumnarHistory, 'ledger'])
+def test_timeline_queries(make_history, tmp_path):
+    transactions = [Transaction(TxType.DEPOSIT, Money(100), None, Money(100 * (i + 2)),
+                                timestamp_ns=1000 * (i + 1)) for i in range(10)]
+    if make_history == 'ledger':
+        history = Ledger(str(tmp_path / "0000125.ledger"))
+        for transaction in transactions:
+            history.append(transaction)
+    else:
+        history = make_history(transactions)
+    account = Account('0000125', 'Test User', '1234', Money(1100), history)
+
+    assert [t['timestamp_ns'] for t in transactions_between(history, 3000, 6000)] == [3000, 4000, 5000]
+    assert len(transactions_between(history, end=1000)) == 0
+    assert len(transactions_between(history, start=9500)) == 1
+    assert balance_at(account, 999) == Money(100)  # before the first deposit
+    assert balance_at(account, 3000) == Money(400)
+    assert balance_at(account, 3999) == Money(400)
+    assert balance_at(account, 10 ** 12) == Money(1100)
+
+def test_history_cursor():
+    history = [Transaction(TxType.DEPOSIT, Money(100), None, Money(100 * i), timestamp_ns=i) for i in range(25)]
+    cursor = HistoryCursor(history, page_size=10)
+    assert cursor.page_count == 3
+    assert [t['timestamp_ns'] for t in cursor.page()] == list(range(24, 14, -1))
+    assert not cursor.has_previous()
+    cursor.next()
+    assert [t['timestamp_ns'] for t in cursor.next()] == [4, 3, 2, 1, 0]
+    assert not cursor.has_next()
+    assert cursor.next() == cursor.page()
+    assert cursor.previous()[0]['timestamp_ns'] == 14
+    # new transactions don't shift an open cursor
+    history.append(Transaction(TxType.DEPOSIT, Money(100), None, Money(2500), timestamp_ns=25))
+    assert cursor.page(0)[0]['timestamp_ns'] == 24
+
+    ranged = HistoryCursor(history, page_size=10, start=5, end=8)
+    assert ranged.page_count == 1
+    assert [t['timestamp_ns'] for t in ranged.page()] == [7, 6, 5]
+    assert HistoryCursor([], page_size=10).page() == []
+
+def test_sessions_are_independent(test_account):
+    accounts.append(Account('0000133', 'Recipient', '5678', Money(50000)))
+    first, second = Session(accounts), Session(accounts)
+    assert first.login('0000125', '1234')
+    assert second.login('0000133', '5678')
+    first.transfer('0000133', Money(20000))
+    second.withdraw(Money(10000))
+    assert first.balance() == Money(80000)
+    assert second.balance() == Money(60000)
+    with pytest.raises(InsufficientFunds):
+        second.withdraw(Money(1000000))
+    with pytest.raises(SameAccount):
+        first.transfer('0000125', Money(100))
+    second.logout()
+    assert not second.logged_in and first.logged_in
+
+def test_concurrent_transfers_conserve_money():
+    registry = AccountRegistry(allocator=make_allocator('sequential'))
+    for _ in range(10):
+        registry.append(Account(registry.new_account_number(), 'Test User', '1234', Money(100000)))
+    sessions = [Session(registry) for _ in registry]
+    for session, account in zip(sessions, registry):
+        session.login(account['account_number'], '1234')
+    numbers = [account['account_number'] for account in registry]
+
+    def worker(seed):
+        rng = random.Random(seed)
+        for _ in range(2000):
+            session = rng.choice(sessions)
+            recipient = rng.choice(numbers)
+            if recipient != session.account['account_number']:
+                try:
+                    session.transfer(recipient, Money(rng.randrange(1, 50000)))
+                except InsufficientFunds:
+                    pass
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(account['balance'] for account in registry) == Money(1000000)
+    assert all(account['balance'] >= 0 for account in registry)
+
+def test_server_line_protocol(tmp_path):
+    path = str(tmp_path / "atm.sock")
+
+    registry = AccountRegistry()
+    registry.attach_journal(str(tmp_path / "server.journal"))
+
+    async def scenario():
+        server = ATMServer(registry, idle_timeout=0.2)
+        await server.start_unix(path)
+        reader, writer = await asyncio.open_unix_connection(path)
+
+        async def ask(line):
+            writer.write(line.encode() + b"\n")
+            await writer.drain()
+            return (await reader.readline()).decode().strip()
+
+        assert await ask("BALANCE") == "ERR not logged in"
+        # bad input gets an ERR reply and leaves no account behind
+        assert await ask("CREATE 1234 100 " + "A" * 300) == "ERR invalid name"
+        assert await ask("CREATE 1234 100000000000000000000 Test User") == "ERR invalid amount"
+        assert await ask("CREATE 1234 0 Test User") == "ERR invalid amount"
+        assert len(registry) == 0
+        acc_num = (await ask("CREATE 1234 1000 Test User")).split()[1]
+        assert await ask(f"LOGIN {acc_num} 9999") == "ERR invalid account number or PIN"
+        assert await ask(f"LOGIN {acc_num} 1234") == "OK Test User"
+        assert await ask("DEPOSIT 250.50") == "OK 1250.50"
+        assert await ask("WITHDRAW 5000") == "ERR insufficient funds"
+        assert await ask("DEPOSIT abc") == "ERR invalid amount"
+        assert await ask("HISTORY") == "OK 1"
+        assert (await reader.readline()).decode().startswith("DEPOSIT\t250.50\t")
+        # the server hangs up on a terminal that goes quiet
+        assert (await reader.readline()).decode().strip() == "ERR idle timeout"
+        assert await reader.readline() == b""
+        writer.close()
+        server.close()
+
+    asyncio.run(scenario())
+
+
+def test_http_api_batch(tmp_path):
+    registry = AccountRegistry()
+    registry.attach_journal(str(tmp_path / "api.journal"))
+    server = make_server(registry, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_port)
+
+    def call(method, path, body=None, token=None):
+        headers = {'Authorization': f"Bearer {token}"} if token else {}
+        conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+
+    try:
+        assert call('GET', '/balance') == (401, {'error': "not logged in"})
+        _, alice = call('POST', '/accounts', {'name': "Alice", 'pin': "1234", 'initial_deposit': "100"})
+        _, bob = call('POST', '/accounts', {'name': "Bob", 'pin': "4321", 'initial_deposit': 1})
+        # rejected with a reply, before anything is added
+        assert call('POST', '/accounts', {'name': "A" * 300, 'pin': "1234", 'initial_deposit': 1}) == (
+            400, {'error': "invalid name"})
+        assert call('POST', '/accounts', {'name': "Cy", 'pin': "1234", 'initial_deposit': 0}) == (
+            400, {'error': "invalid amount"})
+        assert call('POST', '/accounts', {'name': "Cy", 'pin': "1234", 'initial_deposit': "1" * 20}) == (
+            400, {'error': "invalid amount"})
+        assert len(registry) == 2
+        status, login = call('POST', '/login', {'account_number': alice['account_number'], 'pin': "1234"})
+        assert status == 200 and login['name'] == "Alice"
+        token = login['token']
+        assert call('POST', '/deposit', {'amount': 12.5}, token) == (200, {'balance': "112.50"})
+        status, reply = call('POST', '/batch', [
+            {'op': 'withdraw', 'amount': "500"},
+            {'op': 'transfer', 'recipient': bob['account_number'], 'amount': "40"},
+            {'op': 'deposit', 'amount': "-1"},
+            {'op': 'balance'},
+        ], token)
+        assert status == 200
+        assert reply['results'] == [{'error': "insufficient funds"}, {'balance': "72.50"},
+                                    {'error': "invalid amount"}, {'balance': "72.50"}]
+        _, history = call('GET', '/history?page=0', token=token)
+        assert [t['type'] for t in history['transactions']] == ["TRANSFER", "DEPOSIT"]
+        assert registry.journal.durable == registry.journal.written
+        call('POST', '/logout', token=token)
+        assert call('GET', '/balance', token=token)[0] == 401
+    finally:
+        conn.close()
+        server.shutdown()
+        server.server_close()
+
+
+def test_payroll_batch(tmp_path):
+    registry = AccountRegistry()
+    registry.attach_journal(str(tmp_path / "atm.journal"))
+    source, first, second = (registry.new_account_number() for _ in range(3))
+    for number, balance in ((source, 100000), (first, 0), (second, 0)):
+        registry.append(Account(number, f"Holder {number}", "1234", Money(balance)))
+    rows = f"recipient,amount\n{first},300\n9999,5\n{second},abc\n{second},200.50\n"
+
+    with pytest.raises(PayrollRejected) as rejected:
+        pay(registry, source, read_payroll(io.StringIO(rows)), all_or_nothing=True)
+    assert [r.reason for r in rejected.value.result.rejected] == ["recipient account not found", "invalid amount"]
+    assert registry[0]['balance'] == Money(100000)
+
+    receipts = io.StringIO()
+    result = pay(registry, source, read_payroll(io.StringIO(rows)), receipts=receipts)
+    assert result.paid == 2 and result.total == Money(50050)
+    assert [r.line for r in result.rejected] == [3, 4]
+    assert [a['balance'] for a in registry] == [Money(49950), Money(30000), Money(20050)]
+    assert len(registry[0]['transaction_history']) == 1
+    assert registry[0]['transaction_history'][0]['type'] == "PAYROLL"
+    assert registry[2]['transaction_history'][0]['type'] == "PAYROLL RECEIVED"
+    # dated with the batch's own timestamp, the source's receipt first
+    text = receipts.getvalue()
+    when = registry[0]['transaction_history'][0].timestamp
+    assert text.count("TRANSACTION RECEIPT") == 3 and text.count(f"Date: {when:%Y-%m-%d %H:%M:%S}") == 3
+    assert text.index("Transaction Type: PAYROLL\n") < text.index("Transaction Type: PAYROLL RECEIVED")
+    assert f"From Account: {source}" in text and f"From Name: Holder {source}" in text
+
+    # more than the source can cover: pay in file order while money lasts
+    result = pay(registry, source, read_payroll(io.StringIO(f"{first},400\n{second},200\n")))
+    assert result.paid == 1 and result.rejected[0].reason == "insufficient funds"
+    registry.journal.close()
+
+    restored = AccountRegistry()
+    restored.attach_journal(str(tmp_path / "atm.journal"))
+    assert [a['balance'] for a in restored] == [a['balance'] for a in registry]
+    restored.journal.close()
+
+
+@pytest.mark.parametrize("file_format, data, bad_lines", [
+    ("csv", "name,pin,initial_deposit\nJuan Cruz,1234,500\nBad1,1234,5\nAna Reyes,12a4,1\n"
+            "Li Mei,1234,-3\nMa. Santos,0000,1.50\n", ["3", "4", "5"]),
+    ("jsonl", '{"name": "Juan Cruz", "pin": "1234", "initial_deposit": 500}\nnot json\n'
+              '{"name": "Ana Reyes", "pin": "12a4", "initial_deposit": "1"}\n{"name": "Li Mei", "pin": "1234"}\n'
+              '{"name": "Ma. Santos", "pin": "0000", "initial_deposit": 1.50}\n', ["2", "3", "4"]),
+])
+def test_import_accounts(tmp_path, file_format, data, bad_lines):
+    registry = AccountRegistry()
+    registry.attach_journal(str(tmp_path / "atm.journal"))
+    report = io.StringIO()
+    result = import_accounts(registry, io.StringIO(data), file_format, ErrorReport(report), chunk_size=1)
+    assert (result.imported, result.rejected) == (2, 3)
+    assert [(a['name'], a['pin'], a['balance']) for a in registry] == [
+        ("Juan Cruz", "1234", Money(50000)), ("Ma. Santos", "0000", Money(150))]
+    assert [line.split(',')[0] for line in report.getvalue().splitlines()[1:]] == bad_lines
+    registry.journal.close()
+
+    restored = AccountRegistry()
+    restored.attach_journal(str(tmp_path / "atm.journal"))
+    assert [a['account_number'] for a in restored] == [a['account_number'] for a in registry]
+    restored.journal.close()
+
+
+def test_import_rejects_what_the_journal_cant_hold(tmp_path):
+    registry = AccountRegistry()
+    registry.attach_journal(str(tmp_path / "atm.journal"))
+    data = (f"name,pin,initial_deposit\nJuan Cruz,1234,500\n{'A' * 300},1234,5\n"
+            f"Ana Reyes,1234,{'9' * 20}\nLi Mei,1234,1\n")
+    report = io.StringIO()
+    result = import_accounts(registry, io.StringIO(data), 'csv', ErrorReport(report))
+    assert (result.imported, result.rejected) == (2, 2)
+    assert [line.split(',')[:2] for line in report.getvalue().splitlines()[1:]] == [
+        ["3", "name too long"], ["4", "initial deposit too large"]]
+    registry.journal.close()
+    restored = AccountRegistry()
+    restored.attach_journal(str(tmp_path / "atm.journal")).close()
+    assert [a['name'] for a in restored] == ["Juan Cruz", "Li Mei"]
+
+
+def test_export_statement(session, tmp_path, monkeypatch, capsys):
+    session.deposit(Money(50000))
+    session.withdraw(Money(12345))
+    monkeypatch.setattr(statement, 'STATEMENT_DIR', str(tmp_path))
+    with patch('builtins.input', side_effect=['', '', 'jsonl']):
+        export_statement(session)
+    path = capsys.readouterr().out.strip().split(" to ")[-1]
+    with open(path, encoding='utf-8') as f:
+        rows = [json.loads(line) for line in f]
+    assert [(row['type'], row['amount'], row['balance_after']) for row in rows] == [
+        ("DEPOSIT", "500.00", "1500.00"), ("WITHDRAWAL", "123.45", "1376.55")]
+
+    buffer = io.StringIO()
+    assert export(buffer, bank_rows([session.account, session.account]), 'csv') == 4
+    lines = buffer.getvalue().splitlines()
+    assert lines[0] == ",".join(statement.COLUMNS) and lines[2].endswith("WITHDRAWAL,123.45,%s,1376.55," % rows[1]['timestamp'])
+
+
+def test_journal_statement_rows(tmp_path):
+    # the command line streams rows from the journal; they must match the
+    # rows of the replayed registry
+    path = str(tmp_path / "atm.journal")
+    registry = AccountRegistry()
+    journal = registry.attach_journal(path)
+    for name in ("Ana Cruz", "Ben Reyes"):
+        registry.append(Account(registry.new_account_number(), name, "1234", Money(100000)))
+    session = Session(registry)
+    session.account_index = 0
+    session.deposit(Money(2500))
+    session.transfer(registry[1]['account_number'], Money(1000))
+    journal.close()
+    assert sorted(statement.journal_rows(path)) == sorted(bank_rows(registry))
+    ben = registry[1]['account_number']
+    names = {}
+    assert list(statement.journal_rows(path, ben, names=names)) == list(account_rows(registry[1]))
+    assert names[ben] == "Ben Reyes"
+
+
+def test_receipt_rendering(test_account, tmp_path):
+    assert receipt.font(16) is receipt.font(16)
+    recipient = Account("7654321", "Maria Santos", "1234", Money(0))
+    lines = receipt.receipt_lines("TRANSFER", test_account, Money(2500), recipient)
+    assert [label for label, _ in lines][-3:] == ["Recipient Account: ", "Recipient Name: ", "Current Balance: "]
+    image = receipt.render_receipt(lines)
+    assert image.size == (receipt.WIDTH, receipt.HEIGHT)
+    # the template is drawn once per layout and never drawn on
+    template, _ = receipt.template(tuple(label for label, _ in lines))
+    assert receipt.render_receipt(lines).tobytes() == image.tobytes() != template.tobytes()
+    path = receipt.save_receipt("DEPOSIT", test_account, Money(100), directory=str(tmp_path))
+    assert path.startswith(str(tmp_path)) and path.endswith(".png")
+
+
+def test_receipt_worker(session, tmp_path):
+    worker = receipt.ReceiptWorker(str(tmp_path))
+    saved = []
+    session.deposit(Money(100))
+    filename = worker.submit("DEPOSIT", session.account, Money(100), callback=lambda *result: saved.append(result))
+    assert worker.pending == 1
+    worker.close()
+    assert saved == [(filename, None)] and worker.pending == 0
+    assert os.path.exists(filename)
+
+    # a failing render is reported and doesn't stop the worker
+    def broken():
+        raise KeyError("no such receipt")
+    worker = receipt.ReceiptWorker(str(tmp_path))
+    saved = []
+    worker.save(str(tmp_path / "broken.png"), broken, callback=lambda *result: saved.append(result))
+    worker.save(str(tmp_path / "fine.png"), lambda: b"png", callback=lambda *result: saved.append(result))
+    worker.close()
+    assert isinstance(saved[0][1], KeyError) and saved[1] == (str(tmp_path / "fine.png"), None)
+    assert worker.pending == 0
+
+
+def test_receipt_cache(session):
+    session.deposit(Money(100))
+    session.change_pin("4321")
+    account = session.account
+    deposit, pin_change = account['transaction_history']
+    lines = receipt.transaction_lines(account, deposit)
+    assert lines[0] == ("Date: ", f"{deposit.timestamp:%Y-%m-%d %H:%M:%S}")
+    assert ("Amount: ", "₱1.00") in lines
+    assert "Amount: " not in dict(receipt.transaction_lines(account, pin_change))
+    cursor = HistoryCursor(account['transaction_history'], page_size=1)
+    assert list(cursor.page_indices()) == [1] and list(cursor.page_indices(1)) == [0]
+
+    cache = receipt.ReceiptCache(maxsize=1)
+    png = cache.png(account, 0)
+    assert png.startswith(b"\x89PNG") and cache.png(account, 0) is png
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.png(account, 1)
+    assert len(cache) == 1 and cache.png(account, 0) is not png
+    assert cache.misses == 3
+
+
+def test_receipt_archive(session, tmp_path):
+    directory = str(tmp_path)
+    archive = ReceiptArchive(directory, segment_size=1000)
+    for i in range(20):
+        archive.put("0000125", i, bytes([i]) * 100, timestamp_ns=i * DAY_NS)
+    archive.put("0000125", 3, b"reprinted")
+    assert isinstance(archive.get("0000125", 3), memoryview)
+    assert bytes(archive.get("0000125", 3)) == b"reprinted" and archive.get("0000125", 99) is None
+    assert len(archive.segments()) > 1
+    archive.close()
+
+    # a record that missed the index is picked up again, a torn one is cut off
+    last = os.path.join(directory, f"{archive.segments()[-1]:08d}.seg")
+    with open(last, 'ab') as f:
+        f.write(archive_record("0000125", 20, b"late"))
+        f.write(archive_record("0000125", 21, b"torn")[:-2])
+    archive = ReceiptArchive(directory, segment_size=1000, retention_days=10)
+    assert len(archive) == 21 and bytes(archive.get("0000125", 20)) == b"late"
+    dropped, deleted, _ = archive.compact(now_ns=15 * DAY_NS)
+    assert dropped == 4 and deleted >= 1
+    assert archive.get("0000125", 4) is None and bytes(archive.get("0000125", 3)) == b"reprinted"
+    archive.close()
+    # a record written after compact() and missing from the index is still
+    # picked up
+    last = os.path.join(directory, f"{archive.segments()[-1]:08d}.seg")
+    with open(last, 'ab') as f:
+        f.write(archive_record("0000125", 22, b"later"))
+    archive = ReceiptArchive(directory)
+    assert bytes(archive.get("0000125", 22)) == b"later"
+    assert len(archive) == 18 and archive.get("0000125", 10)[0] == 10
+
+    # an old transaction's receipt viewed last sits at the end of the active
+    # segment; once expired it stays expired
+    with ReceiptArchive(str(tmp_path / "tail"), retention_days=10) as tail:
+        tail.put("0000125", 1, b"new", timestamp_ns=14 * DAY_NS)
+        tail.put("0000126", 0, b"old", timestamp_ns=0)
+        assert tail.compact(now_ns=15 * DAY_NS)[0] == 1
+    with ReceiptArchive(str(tmp_path / "tail")) as tail:
+        assert ("0000126", 0) not in tail and len(tail) == 1
+
+    # the cache renders a receipt once and serves misses from the archive
+    session.deposit(Money(100))
+    cache = receipt.ReceiptCache(archive=archive)
+    png = bytes(cache.png(session.account, 0))
+    assert ("0000125", 0) in archive
+    assert bytes(receipt.ReceiptCache(archive=archive).png(session.account, 0)) == png
+    # a receipt archived for whatever transaction used to sit at that index
+    # is rendered again instead of served
+    archive.put("0000125", 0, b"stale", timestamp_ns=1)
+    fresh = receipt.ReceiptCache(archive=archive)
+    assert bytes(fresh.png(session.account, 0)) == png and fresh.misses == 1
+    assert bytes(archive.get("0000125", 0)) == png
+    assert archive.get("0000125", 0, timestamp_ns=1) is None
+    archive.close()
+
+
+def archive_record(account_number, transaction_id, data):
+    return RECORD.pack(len(data), zlib.crc32(data), transaction_id * DAY_NS,
+                       account_number.encode('ascii'), transaction_id) + data
+
+
+def test_receipt_profiles(session, tmp_path):
+    from PIL import Image
+    image = receipt.render_receipt(receipt.receipt_lines("DEPOSIT", session.account, Money(100)))
+    sizes = {}
+    for profile, (mode, _) in receipt.PROFILES.items():
+        data = receipt.png_bytes(image, profile)
+        assert Image.open(io.BytesIO(data)).mode == mode
+        sizes[profile] = len(data)
+    assert sizes['mono'] < sizes['palette'] < sizes['rgb']
+    assert len(receipt.png_bytes(image, 'mono', level=0)) > sizes['mono']
+
+    session.deposit(Money(100))
+    session.withdraw(Money(50))
+    path = str(tmp_path / "day.pdf")
+    assert receipt.day_pdf(path, accounts, datetime.now().date()) == 2
+    with open(path, 'rb') as f:
+        pdf = f.read()
+    assert pdf.startswith(b"%PDF") and b"/Count 2" in pdf
+    from PIL import PdfParser
+    assert len(PdfParser.PdfParser(path).pages) == 2
+
+
+def test_receipt_model(session, tmp_path):
+    from rich.console import Console
+    from receipt_model import RichSink
+    session.deposit(Money(2500))
+    transaction = latest(session.account)
+    session.account['balance'] += Money(1)  # the receipt shows the balance the transaction left
+    built = Receipt.of("DEPOSIT", session.account, Money(2500), transaction=transaction)
+    assert built.when == transaction.timestamp
+    assert dict(built.rows)["Current Balance"] == f"₱{transaction.balance_after:.2f}"
+
+    class Stream(io.StringIO):
+        writes = 0
+
+        def write(self, text):
+            self.writes += 1
+            return super().write(text)
+
+    text, rich_output = Stream(), io.StringIO()
+    worker = receipt.ReceiptWorker(str(tmp_path))
+    saved = []
+    printer = ReceiptPrinter(TextSink(text), RichSink(Console(file=rich_output, width=80)),
+                             receipt.ImageSink(worker, lambda *result: saved.append(result)), batch=False)
+    printed = printer.print("DEPOSIT", session.account, Money(2500), transaction=transaction)
+    worker.close()
+    assert text.writes == 1 and text.getvalue() == printed.text()
+    assert "Amount: ₱25.00" in text.getvalue() and "₱25.00" in rich_output.getvalue()
+    assert len(saved) == 1 and saved[0][1] is None and os.path.exists(saved[0][0])
+
+    batch = ReceiptPrinter(TextSink(text), batch=True)
+    assert not batch.enabled and batch.print("DEPOSIT", session.account, Money(2500)) is None
+    assert text.writes == 1
+
+
+@pytest.mark.parametrize("module", ["main_gui", "main"])
+def test_gui_reports_invalid_amounts(module, session, monkeypatch):
+    # no window needed: the action methods only touch the session and dialogs
+    gui_module = __import__(module)
+    errors = []
+    monkeypatch.setattr(gui_module.messagebox, 'showerror', lambda title, message: errors.append(message))
+    monkeypatch.setattr(gui_module.messagebox, 'showinfo', lambda title, message: None)
+    gui = object.__new__(gui_module.ATMGui)
+    gui.session, gui.latency = session, LatencyLog()
+    accounts.append(Account('0000133', 'Rich Person', '1234', Money(MAX_CENTAVOS)))
+    gui.deposit(Money(MAX_CENTAVOS))
+    assert gui.withdraw(Money(0)) is False
+    gui.transfer(Money(1), '0000133')
+    assert errors == ["Amount too large", "Invalid amount", "Amount too large"]
+    assert session.account['balance'] == Money(100000)
+
+
+@pytest.mark.skipif(not os.environ.get('DISPLAY'), reason="needs a display")
+def test_gui_screens_are_reused():
+    import tkinter as tk
+    import main_gui
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        pytest.skip("no display")
+    gui = main_gui.ATMGui(root)
+    try:
+        gui.show_login()
+        login = gui.current_screen
+        fields = gui.screen_fields['login']
+        assert len(fields) == 2
+        for field in fields:
+            field.set("1234")
+        gui.show_main_menu()
+        root.update_idletasks()
+        assert gui.current_screen is not login and not login.winfo_ismapped()
+        gui.show_login()
+        assert gui.current_screen is login and gui.screens['login'] is login
+        assert [field.get() for field in fields] == ["", ""]
+    finally:
+        gui.receipts.close()
+        root.destroy()
@@ -0,0 +1,154 @@
+# Time-based queries on a transaction history.
+# History is appended in time order, so the timestamps are sorted and the
+# questions "what was the balance at time T" and "which transactions
+# happened between T1 and T2" can be answered with a binary search over
+# the timestamp column instead of a scan. Works with a plain list of
+# Transaction records, a ColumnarHistory and a Ledger.
+# Times can be given as datetime objects or as epoch nanoseconds.
+# HistoryCursor pages through a history (or a time range of it) newest
+# first, page_size transactions at a time, decoding only the page shown.
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time as day_time, timedelta
+
+from history import ColumnarHistory
+from ledger import Ledger
+
+
+class _LedgerTimestamps:
+    # sequence view of a ledger's timestamp field, read one row at a time
+    def __init__(self, ledger):
+        self._ledger = ledger
+
+    def __len__(self):
+        return len(self._ledger)
+
+    def __getitem__(self, index):
+        return self._ledger.timestamp_ns(index)
+
+
+class _ListTimestamps:
+    def __init__(self, history):
+        self._history = history
+
+    def __len__(self):
+        return len(self._history)
+
+    def __getitem__(self, index):
+        return self._history[index].timestamp_ns
+
+
+def timestamps(history):
+    # sorted sequence of the history's timestamps in nanoseconds
+    if isinstance(history, ColumnarHistory):
+        return history.view('timestamp_ns')
+    if isinstance(history, Ledger):
+        return _LedgerTimestamps(history)
+    return _ListTimestamps(history)
+
+
+def to_ns(when):
+    if isinstance(when, datetime):
+        return int(when.timestamp()) * 1_000_000_000 + when.microsecond * 1000
+    return when
+
+
+def day_range(start_date=None, end_date=None):
+    # (start, end) datetimes covering whole days, for date-range filters:
+    # from the start of start_date up to the end of end_date
+    start = datetime.combine(start_date, day_time.min) if start_date else None
+    end = datetime.combine(end_date + timedelta(days=1), day_time.min) if end_date else None
+    return start, end
+
+
+def parse_date(text):
+    # 'YYYY-MM-DD' -> date, '' -> None; raises ValueError otherwise
+    text = text.strip()
+    if not text:
+        return None
+    return datetime.strptime(text, '%Y-%m-%d').date()
+
+
+def range_indices(history, start=None, end=None):
+    # (first, stop) so history[first:stop] holds start <= timestamp < end
+    stamps = timestamps(history)
+    first = 0 if start is None else bisect_left(stamps, to_ns(start))
+    stop = len(stamps) if end is None else bisect_left(stamps, to_ns(end), first)
+    return first, stop
+
+
+def transactions_between(history, start=None, end=None):
+    first, stop = range_indices(history, start, end)
+    return history[first:stop]
+
+
+def balance_at(account, when):
+    # balance right after the last transaction at or before `when`; before
+    # the first transaction this is the balance the account opened with
+    history = account['transaction_history']
+    if not len(history):
+        return account['balance']
+    i = bisect_right(timestamps(history), to_ns(when))
+    if i == 0:
+        first = history[0]
+        return first.balance_after - first.balance_change()
+    return history[i - 1].balance_after
+
+
+PAGE_SIZE = 10
+
+
+class HistoryCursor:
+    # The cursor is pinned to the history length when it is created, so
+    # transactions recorded while paging don't shift the pages.
+    def __init__(self, history, page_size=PAGE_SIZE, start=None, end=None):
+        if page_size < 1:
+            raise ValueError("page_size must be at least 1")
+        self.history = history
+        self.page_size = page_size
+        if start is None and end is None:
+            self._first, self._stop = 0, len(history)
+        else:
+            self._first, self._stop = range_indices(history, start, end)
+        self.page_number = 0
+
+    def __len__(self):
+        return self._stop - self._first
+
+    @property
+    def page_count(self):
+        return max(1, -(-len(self) // self.page_size))
+
+    def page(self, number=None):
+        # transactions on page `number` (default: the current page), newest first
+        first, stop = self._page_bounds(number)
+        if stop <= first:
+            return []
+        return self.history[first:stop][::-1]
+
+    def page_indices(self, number=None):
+        # history indices of the transactions page() returns, in the same order
+        first, stop = self._page_bounds(number)
+        return range(stop - 1, first - 1, -1)
+
+    def _page_bounds(self, number):
+        if number is None:
+            number = self.page_number
+        stop = self._stop - number * self.page_size
+        return max(self._first, stop - self.page_size), stop
+
+    def has_next(self):
+        return self.page_number + 1 < self.page_count
+
+    def has_previous(self):
+        return self.page_number > 0
+
+    def next(self):
+        if self.has_next():
+            self.page_number += 1
+        return self.page()
+
+    def previous(self):
+        if self.has_previous():
+            self.page_number -= 1
+        return self.page()